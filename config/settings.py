@@ -14,6 +14,33 @@ class Settings:
     
     # Qdrant
     QDRANT_URL: str = os.getenv("QDRANT_URL", "http://localhost:6333")
+    QDRANT_POOL_SIZE: int = int(os.getenv("QDRANT_POOL_SIZE", "32"))
+    QDRANT_PREFER_GRPC: bool = os.getenv("QDRANT_PREFER_GRPC", "false").lower() in ("1", "true", "yes")
+    QDRANT_TIMEOUT: int = int(os.getenv("QDRANT_TIMEOUT", "30"))
+    QDRANT_UPSERT_BATCH_SIZE: int = int(os.getenv("QDRANT_UPSERT_BATCH_SIZE", "256"))
+    QDRANT_UPSERT_PARALLELISM: int = int(os.getenv("QDRANT_UPSERT_PARALLELISM", "4"))
+    # "qdrant" or "local" (in-process NumPy/HNSW index, persisted under
+    # LOCAL_VECTOR_STORE_PATH; empty path keeps it in memory only)
+    VECTOR_STORE_BACKEND: str = os.getenv("VECTOR_STORE_BACKEND", "qdrant")
+    LOCAL_VECTOR_STORE_PATH: str = os.getenv("LOCAL_VECTOR_STORE_PATH", "data/vectors")
+    # Mutations are written to disk in the background this long after the
+    # first change, batching the writes of one upload
+    LOCAL_VECTOR_STORE_FLUSH_SECONDS: float = float(os.getenv("LOCAL_VECTOR_STORE_FLUSH_SECONDS", "1.0"))
+    LOCAL_HNSW_MIN_POINTS: int = int(os.getenv("LOCAL_HNSW_MIN_POINTS", "20000"))
+    HNSW_M: int = int(os.getenv("HNSW_M", "16"))
+    HNSW_EF_CONSTRUCTION: int = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+    HNSW_EF_SEARCH: int = int(os.getenv("HNSW_EF_SEARCH", "64"))
+    # Compression for newly created collections: none | scalar (int8) | binary.
+    # Searches scan the compressed vectors, then rescore the top
+    # limit * QUANTIZATION_OVERSAMPLING candidates with the originals, which
+    # stay on disk (Qdrant on_disk vectors, or the local store's memory-mapped
+    # row files; an in-memory local store keeps them in RAM).
+    VECTOR_QUANTIZATION: str = os.getenv("VECTOR_QUANTIZATION", "none")
+    QUANTIZATION_OVERSAMPLING: float = float(os.getenv("QUANTIZATION_OVERSAMPLING", "3.0"))
+    # In-process BM25 index for lexical/hybrid search. Each worker process keeps
+    # its own copy, built at startup, so run a single worker with it enabled.
+    LEXICAL_INDEX_ENABLED: bool = os.getenv("LEXICAL_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")
+    RRF_K: int = int(os.getenv("RRF_K", "60"))
     
     # OpenAI
     OPENAI_API_KEY: Optional[str] = os.getenv("OPENAI_API_KEY")
@@ -26,14 +53,76 @@ class Settings:
     EMAIL_FROM: Optional[str] = os.getenv("EMAIL_FROM")
     EMAIL_TO: Optional[str] = os.getenv("EMAIL_TO")
     
+    # Local models
+    SENTENCE_TRANSFORMER_MODEL: str = os.getenv("SENTENCE_TRANSFORMER_MODEL", "all-MiniLM-L6-v2")
+    SENTENCE_TRANSFORMER_DEVICE: str = os.getenv("SENTENCE_TRANSFORMER_DEVICE", "cpu")
+    # "torch" or "onnx"; ONNX_QUANTIZATION picks an int8 dynamic quantization
+    # profile for the ONNX backend (arm64 | avx2 | avx512 | avx512_vnni)
+    SENTENCE_TRANSFORMER_BACKEND: str = os.getenv("SENTENCE_TRANSFORMER_BACKEND", "torch")
+    ONNX_QUANTIZATION: str = os.getenv("ONNX_QUANTIZATION", "")
+    ONNX_EXPORT_DIR: str = os.getenv("ONNX_EXPORT_DIR", "models/onnx")
+    MODEL_WARMUP: bool = os.getenv("MODEL_WARMUP", "false").lower() in ("1", "true", "yes")
+    
+    # Remote embedding providers
+    OPENAI_EMBEDDING_BATCH_SIZE: int = int(os.getenv("OPENAI_EMBEDDING_BATCH_SIZE", "512"))
+    GEMINI_EMBEDDING_BATCH_SIZE: int = int(os.getenv("GEMINI_EMBEDDING_BATCH_SIZE", "100"))
+    EMBEDDING_MAX_IN_FLIGHT: int = int(os.getenv("EMBEDDING_MAX_IN_FLIGHT", "4"))
+    EMBEDDING_MAX_RETRIES: int = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))
+    EMBEDDING_RETRY_BASE_DELAY: float = float(os.getenv("EMBEDDING_RETRY_BASE_DELAY", "0.5"))
+    EMBEDDING_RETRY_MAX_DELAY: float = float(os.getenv("EMBEDDING_RETRY_MAX_DELAY", "20"))
+    
+    # Embedding cache
+    EMBEDDING_CACHE_ENABLED: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    EMBEDDING_CACHE_USE_REDIS: bool = os.getenv("EMBEDDING_CACHE_USE_REDIS", "true").lower() in ("1", "true", "yes")
+    # Point this at a Redis of its own with an allkeys eviction policy; the
+    # main Redis holds conversations and must not evict
+    EMBEDDING_CACHE_REDIS_URL: str = os.getenv("EMBEDDING_CACHE_REDIS_URL", os.getenv("REDIS_URL", "redis://localhost:6379"))
+    EMBEDDING_CACHE_MAX_BYTES: int = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    EMBEDDING_CACHE_TTL_SECONDS: int = int(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    
     # Chunking
     DEFAULT_CHUNK_SIZE: int = 1000
     DEFAULT_CHUNK_OVERLAP: int = 200
     SEMANTIC_SIMILARITY_THRESHOLD: float = 0.7
+    SEMANTIC_BREAKPOINT_MODE: str = os.getenv("SEMANTIC_BREAKPOINT_MODE", "threshold")  # threshold | percentile | window
+    SEMANTIC_BREAKPOINT_PERCENTILE: float = float(os.getenv("SEMANTIC_BREAKPOINT_PERCENTILE", "95"))
+    SEMANTIC_WINDOW_SIZE: int = int(os.getenv("SEMANTIC_WINDOW_SIZE", "3"))
+    FUSED_SEMANTIC_EMBEDDINGS: bool = os.getenv("FUSED_SEMANTIC_EMBEDDINGS", "true").lower() in ("1", "true", "yes")
+    SENTENCE_ENCODE_BATCH_SIZE: int = int(os.getenv("SENTENCE_ENCODE_BATCH_SIZE", "128"))
+    # Concurrent encode calls arriving within the window share one forward pass
+    ENCODER_MAX_BATCH_SIZE: int = int(os.getenv("ENCODER_MAX_BATCH_SIZE", "256"))
+    ENCODER_MAX_WAIT_MS: float = float(os.getenv("ENCODER_MAX_WAIT_MS", "5"))
+    # Token chunks are counted with the SENTENCE_TRANSFORMER_MODEL tokenizer and
+    # sized for its window (minus [CLS]/[SEP]); remote models' windows are larger.
+    CHUNK_MAX_TOKENS: int = int(os.getenv("CHUNK_MAX_TOKENS", "254"))
+    CHUNK_OVERLAP_TOKENS: int = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+    
+    # PDF extraction
+    PDF_EXTRACTION_WORKERS: int = int(os.getenv("PDF_EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+    PDF_PARALLEL_MIN_PAGES: int = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "8"))
+    
+    # Streaming ingestion
+    STREAM_TEXT_WINDOW_SIZE: int = int(os.getenv("STREAM_TEXT_WINDOW_SIZE", "65536"))
+    STREAM_CHUNK_WINDOW_SIZE: int = int(os.getenv("STREAM_CHUNK_WINDOW_SIZE", "8000"))
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+    INGESTION_EMBED_CONCURRENCY: int = int(os.getenv("INGESTION_EMBED_CONCURRENCY", "2"))
+    
+    # Ingestion jobs
+    INGESTION_MAX_CONCURRENCY: int = int(os.getenv("INGESTION_MAX_CONCURRENCY", "2"))
+    INGESTION_QUEUE_SIZE: int = int(os.getenv("INGESTION_QUEUE_SIZE", "100"))
+    INGESTION_JOB_RETENTION: int = int(os.getenv("INGESTION_JOB_RETENTION", "1000"))
+    BATCH_UPLOAD_MAX_FILES: int = int(os.getenv("BATCH_UPLOAD_MAX_FILES", "500"))
     
     # Vector Search
     DEFAULT_SEARCH_LIMIT: int = 5
     
+    # Semantic answer cache
+    ANSWER_CACHE_ENABLED: bool = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    ANSWER_CACHE_EMBEDDING_MODEL: str = os.getenv("ANSWER_CACHE_EMBEDDING_MODEL", "sentence-transformer")
+    ANSWER_CACHE_THRESHOLD: float = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+    ANSWER_CACHE_TTL_SECONDS: int = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(24 * 3600)))
+    ANSWER_CACHE_MAX_ENTRIES: int = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "500"))  # per scope
+    
     # Memory
     CONVERSATION_HISTORY_LIMIT: int = 20
     MEMORY_EXPIRY_HOURS: int = 24
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -20,6 +20,53 @@ def get_db():
     finally:
         db.close()
 
+# Columns added to existing tables since their first release, with their DDL
+# type. create_all only creates missing tables, so upgrade_schema adds these
+# to tables created by an older version.
+ADDED_COLUMNS = {
+    "files": [
+        # NULL for files stored before content hashing (their raw bytes are
+        # not kept); such rows simply never match as duplicates.
+        ("content_hash", "VARCHAR(64)"),
+        ("version", "INTEGER NOT NULL DEFAULT 1"),
+        ("updated_at", "TIMESTAMP WITH TIME ZONE"),
+    ],
+}
+
+ADDED_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_files_content_hash ON files (content_hash)",
+]
+
+# Values added to Postgres enum types (SQLAlchemy stores member names).
+ADDED_ENUM_VALUES = [
+    ("chunkingmethod", "TOKEN"),
+]
+
+def upgrade_schema(bind=engine):
+    """Bring tables created by an older version up to the current models.
+    Every step is idempotent, so this runs on each startup."""
+    with bind.begin() as conn:
+        tables = set(inspect(conn).get_table_names())
+        for table, columns in ADDED_COLUMNS.items():
+            if table not in tables:
+                continue
+            present = {column["name"] for column in inspect(conn).get_columns(table)}
+            for name, ddl in columns:
+                if name not in present:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+        for statement in ADDED_INDEXES:
+            conn.execute(text(statement))
+
+    if bind.dialect.name == "postgresql":
+        # ALTER TYPE ... ADD VALUE cannot run inside a transaction block
+        # before Postgres 12.
+        with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            types = {name for (name,) in conn.execute(text("SELECT typname FROM pg_type WHERE typtype = 'e'"))}
+            for type_name, value in ADDED_ENUM_VALUES:
+                if type_name in types:
+                    conn.execute(text(f"ALTER TYPE {type_name} ADD VALUE IF NOT EXISTS '{value}'"))
+
 async def init_db():
     from models import FileModel, InterviewBooking
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema()
@@ -1,18 +1,21 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 import uvicorn
 from typing import List, Optional
 import asyncio
+import json
 import os
 from dotenv import load_dotenv
 
-from database import get_db, init_db
+from database import get_db, init_db, SessionLocal
 from models import FileModel, InterviewBooking
 from schemas import (
-    FileUploadResponse, ChunkingMethod, EmbeddingModel,
+    FileUploadResponse, FileUpdateResponse, ChunkingMethod, EmbeddingModel,
     QueryRequest, QueryResponse, InterviewBookingRequest, InterviewBookingResponse,
-    LLMModel
+    LLMModel, JobStatus, JobSubmitResponse, JobStatusResponse,
+    BatchUploadResponse, BatchUploadFailure, IngestionStage, StageStatus
 )
 from services.file_service import FileService
 from services.chunking_service import ChunkingService
@@ -20,7 +23,12 @@ from services.embedding_service import EmbeddingService
 from services.vector_service import VectorService
 from services.rag_service import RAGService
 from services.email_service import EmailService
+from services.ingestion_service import IngestionService
+from services.job_service import JobService, IngestionJob
+from services.model_registry import model_registry
+from services.encoder_service import sentence_encoder
 from utils.logger import get_logger
+from config.settings import settings
 
 load_dotenv()
 
@@ -41,66 +49,184 @@ file_service = FileService()
 chunking_service = ChunkingService()
 embedding_service = EmbeddingService()
 vector_service = VectorService()
-rag_service = RAGService()
+rag_service = RAGService(vector_service, embedding_service)
 email_service = EmailService()
+ingestion_service = IngestionService(file_service, chunking_service, embedding_service, vector_service)
+job_service = JobService()
+
+async def run_ingestion_job(job: IngestionJob, content: bytes):
+    db = SessionLocal()
+    try:
+        file_record = ingestion_service.find_duplicate(content, job.chunking_method, job.embedding_model, db)
+        if file_record is not None:
+            for stage in IngestionStage:
+                job.report(stage, StageStatus.DONE)
+        else:
+            file_record = await ingestion_service.ingest(
+                content, job.filename, job.chunking_method, job.embedding_model, db, job=job
+            )
+        job.file_id = file_record.id
+        job.chunk_count = file_record.chunk_count
+        logger.info(f"Job {job.job_id}: file {job.filename} processed with {file_record.chunk_count} chunks")
+    finally:
+        db.close()
 
 @app.on_event("startup")
 async def startup_event():
     await init_db()
     await vector_service.initialize()
+    await job_service.start(run_ingestion_job)
+    if settings.MODEL_WARMUP:
+        await asyncio.to_thread(model_registry.warm_up)
+        logger.info(f"Warmed up models: {model_registry.loaded_models()}")
+        try:
+            rag_service.warm_up()
+        except Exception as e:
+            logger.warning(f"Could not prebuild the default agent: {e}")
     logger.info("Application started successfully")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await job_service.stop()
+    file_service.shutdown()
+    sentence_encoder.shutdown()
+    await vector_service.close()
+
+def validate_upload(file: UploadFile):
+    if not file.filename.lower().endswith(('.pdf', '.txt')):
+        raise HTTPException(status_code=400, detail="Only PDF and TXT files are allowed")
+
 @app.post("/api/v1/upload", response_model=FileUploadResponse)
 async def upload_file(
     file: UploadFile = File(...),
-    chunking_method: ChunkingMethod = ChunkingMethod.RECURSIVE,
-    embedding_model: EmbeddingModel = EmbeddingModel.SENTENCE_TRANSFORMER,
+    chunking_method: Optional[ChunkingMethod] = None,
+    embedding_model: Optional[EmbeddingModel] = None,
+    replace: bool = False,
     db: Session = Depends(get_db)
 ):
     try:
-        if not file.filename.lower().endswith(('.pdf', '.txt')):
-            raise HTTPException(status_code=400, detail="Only PDF and TXT files are allowed")
+        validate_upload(file)
         content = await file.read()
-        text = await file_service.extract_text(content, file.filename)
-        
-        if not text.strip():
-            raise HTTPException(status_code=400, detail="No text content found in file")
 
-        chunks = await chunking_service.chunk_text(text, chunking_method)
-        
-        embeddings = await embedding_service.generate_embeddings(chunks, embedding_model)
-        
-        vector_ids = await vector_service.store_embeddings(
-            embeddings, chunks, file.filename, chunking_method, embedding_model
-        )
-        
-        file_record = FileModel(
-            filename=file.filename,
-            original_text=text,
-            chunking_method=chunking_method,
-            embedding_model=embedding_model,
-            chunk_count=len(chunks),
-            vector_ids=vector_ids
+        if replace:
+            previous = ingestion_service.find_latest_by_filename(file.filename, db)
+            if previous is not None:
+                response = await ingestion_service.reingest(
+                    previous,
+                    content,
+                    file.filename,
+                    chunking_method or previous.chunking_method,
+                    embedding_model or previous.embedding_model,
+                    db
+                )
+                logger.info(
+                    f"File {file.filename} replaced (version {response.version}): "
+                    f"{response.chunks_added} chunks added, {response.chunks_removed} removed"
+                )
+                return response
+
+        chunking_method = chunking_method or ChunkingMethod.RECURSIVE
+        embedding_model = embedding_model or EmbeddingModel.SENTENCE_TRANSFORMER
+        existing = ingestion_service.find_duplicate(content, chunking_method, embedding_model, db)
+        if existing is not None:
+            logger.info(f"File {file.filename} matches already processed file {existing.id}")
+            return FileUploadResponse(
+                file_id=existing.id,
+                filename=file.filename,
+                chunk_count=existing.chunk_count,
+                chunking_method=chunking_method,
+                embedding_model=embedding_model,
+                message="File already processed, returning existing record",
+                version=existing.version
+            )
+
+        file_record = await ingestion_service.ingest(
+            content, file.filename, chunking_method, embedding_model, db
         )
         
-        db.add(file_record)
-        db.commit()
-        db.refresh(file_record)
-        
-        logger.info(f"File {file.filename} processed successfully with {len(chunks)} chunks")
+        logger.info(f"File {file.filename} processed successfully with {file_record.chunk_count} chunks")
         
         return FileUploadResponse(
             file_id=file_record.id,
             filename=file.filename,
-            chunk_count=len(chunks),
+            chunk_count=file_record.chunk_count,
             chunking_method=chunking_method,
             embedding_model=embedding_model,
-            message="File uploaded and processed successfully"
+            message="File uploaded and processed successfully",
+            version=file_record.version
         )
         
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error processing file {file.filename}: {str(e)}")
-        raise Exception(status_code=500, detail=f"Error processing file: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+
+@app.post("/api/v1/upload/batch", response_model=BatchUploadResponse)
+async def upload_files_batch(
+    files: List[UploadFile] = File(...),
+    chunking_method: ChunkingMethod = ChunkingMethod.RECURSIVE,
+    embedding_model: EmbeddingModel = EmbeddingModel.SENTENCE_TRANSFORMER,
+    db: Session = Depends(get_db)
+):
+    if len(files) > settings.BATCH_UPLOAD_MAX_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.BATCH_UPLOAD_MAX_FILES} files can be uploaded per batch"
+        )
+    try:
+        accepted = []
+        rejected = []
+        for file in files:
+            if file.filename.lower().endswith(('.pdf', '.txt')):
+                accepted.append((file.filename, await file.read()))
+            else:
+                rejected.append(BatchUploadFailure(filename=file.filename, error="Only PDF and TXT files are allowed"))
+
+        response = await ingestion_service.ingest_batch(accepted, chunking_method, embedding_model, db)
+        response.failed = rejected + response.failed
+
+        logger.info(
+            f"Batch of {len(files)} files processed: {len(response.files)} stored "
+            f"with {response.total_chunks} chunks, {len(response.failed)} failed"
+        )
+        return response
+
+    except Exception as e:
+        logger.error(f"Error processing batch upload: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error processing batch upload: {str(e)}")
+
+@app.post("/api/v1/upload/async", response_model=JobSubmitResponse, status_code=202)
+async def upload_file_async(
+    file: UploadFile = File(...),
+    chunking_method: ChunkingMethod = ChunkingMethod.RECURSIVE,
+    embedding_model: EmbeddingModel = EmbeddingModel.SENTENCE_TRANSFORMER,
+):
+    validate_upload(file)
+    content = await file.read()
+    job = IngestionJob(file.filename, chunking_method, embedding_model)
+    try:
+        job_service.submit(job, content=content)
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=503, detail="Ingestion queue is full, retry later")
+
+    logger.info(f"Queued ingestion job {job.job_id} for file {file.filename}")
+
+    return JobSubmitResponse(
+        job_id=job.job_id,
+        filename=file.filename,
+        status=JobStatus.QUEUED,
+        message="File accepted for processing"
+    )
+
+@app.get("/api/v1/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job_status(job_id: str):
+    job = job_service.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_response()
 
 
 @app.post("/api/v1/query", response_model=QueryResponse)
@@ -114,7 +240,11 @@ async def query_documents(
             query=request.query,
             session_id=request.session_id,
             use_memory=request.use_memory,
-            similarity_algorithm=request.similarity_algorithm
+            similarity_algorithm=request.similarity_algorithm,
+            llm_model=llm_model,
+            search_mode=request.search_mode,
+            filters=request.filters.to_payload_filters() if request.filters else None,
+            mode=request.mode
         )
         
         logger.info(f"Query processed successfully for session {request.session_id}")
@@ -123,13 +253,45 @@ async def query_documents(
             answer=response["answer"],
             sources=response.get("sources", []),
             session_id=request.session_id,
-            similarity_algorithm=request.similarity_algorithm
+            similarity_algorithm=request.similarity_algorithm,
+            llm_model=llm_model,
+            search_mode=request.search_mode,
+            filters=request.filters.to_payload_filters() if request.filters else None
         )
         
     except Exception as e:
         logger.error(f"Error processing query: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
 
+@app.post("/api/v1/query/stream")
+async def stream_query(
+    request: QueryRequest,
+    llm_model: LLMModel = LLMModel.GEMINI_FLASH_LARGE,
+):
+    async def events():
+        try:
+            async for event, data in rag_service.stream_query(
+                query=request.query,
+                session_id=request.session_id,
+                use_memory=request.use_memory,
+                similarity_algorithm=request.similarity_algorithm,
+                llm_model=llm_model,
+                search_mode=request.search_mode,
+                filters=request.filters.to_payload_filters() if request.filters else None,
+                mode=request.mode
+            ):
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+            logger.info(f"Streamed query processed successfully for session {request.session_id}")
+        except Exception as e:
+            logger.error(f"Error streaming query: {str(e)}")
+            yield f"event: error\ndata: {json.dumps({'detail': f'Error processing query: {e}'})}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/api/v1/book-interview", response_model=InterviewBookingResponse)
 async def book_interview(
     request: InterviewBookingRequest,
@@ -182,11 +344,52 @@ async def list_files(db: Session = Depends(get_db)):
             "chunking_method": f.chunking_method,
             "embedding_model": f.embedding_model,
             "chunk_count": f.chunk_count,
-            "uploaded_at": f.uploaded_at
+            "version": f.version,
+            "uploaded_at": f.uploaded_at,
+            "updated_at": f.updated_at
         }
         for f in files
     ]
 
+@app.put("/api/v1/files/{file_id}", response_model=FileUpdateResponse)
+async def update_file(
+    file_id: int,
+    file: UploadFile = File(...),
+    chunking_method: Optional[ChunkingMethod] = None,
+    embedding_model: Optional[EmbeddingModel] = None,
+    db: Session = Depends(get_db)
+):
+    try:
+        validate_upload(file)
+        file_record = db.query(FileModel).filter(FileModel.id == file_id).first()
+        if file_record is None:
+            raise HTTPException(status_code=404, detail="File not found")
+
+        content = await file.read()
+        response = await ingestion_service.reingest(
+            file_record,
+            content,
+            file.filename,
+            chunking_method or file_record.chunking_method,
+            embedding_model or file_record.embedding_model,
+            db
+        )
+
+        logger.info(
+            f"File {file_id} updated to version {response.version}: "
+            f"{response.chunks_added} chunks added, {response.chunks_removed} removed, "
+            f"{response.chunks_unchanged} unchanged"
+        )
+        return response
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error updating file {file_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error updating file: {str(e)}")
+
 @app.get("/api/v1/bookings")
 async def list_bookings(db: Session = Depends(get_db)):
     bookings = db.query(InterviewBooking).all()
@@ -203,6 +406,14 @@ async def list_bookings(db: Session = Depends(get_db)):
         for b in bookings
     ]
 
+@app.get("/api/v1/embeddings/cache-stats")
+async def embedding_cache_stats():
+    return embedding_service.cache_stats()
+
+@app.get("/api/v1/query/cache-stats")
+async def answer_cache_stats():
+    return rag_service.answer_cache_stats()
+
 @app.get("/api/v1/health")
 async def health_check():
     return {"status": "healthy", "message": "RAG Backend System is running"}
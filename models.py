@@ -9,12 +9,15 @@ class FileModel(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String, nullable=False)
+    content_hash = Column(String(64), index=True)
     original_text = Column(Text, nullable=False)
     chunking_method = Column(SQLEnum(ChunkingMethod), nullable=False)
     embedding_model = Column(SQLEnum(EmbeddingModel), nullable=False)
     chunk_count = Column(Integer, nullable=False)
     vector_ids = Column(JSON, nullable=False)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     uploaded_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
 class InterviewBooking(Base):
     __tablename__ = "interview_bookings"
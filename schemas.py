@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import List, Optional
+from typing import List, Optional, Dict
 from datetime import datetime
 from enum import Enum
 
@@ -7,6 +7,7 @@ class ChunkingMethod(str, Enum):
     RECURSIVE = "recursive"
     SEMANTIC = "semantic"
     CUSTOM = "custom"
+    TOKEN = "token"
 
 class EmbeddingModel(str, Enum):
     SENTENCE_TRANSFORMER = "sentence-transformer"
@@ -17,6 +18,16 @@ class SimilarityAlgorithm(str, Enum):
     COSINE = "cosine"
     EUCLIDEAN = "euclidean"
 
+class SearchMode(str, Enum):
+    DENSE = "dense"
+    LEXICAL = "lexical"
+    HYBRID = "hybrid"
+
+class QueryMode(str, Enum):
+    AGENT = "agent"
+    DIRECT = "direct"
+    AUTO = "auto"
+
 class BookingStatus(str, Enum):
     CONFIRMED = "confirmed"
     CANCELLED = "cancelled"
@@ -27,6 +38,24 @@ class LLMModel(str, Enum):
     GEMINI_FLASH_SMALL = "gemini-1.5-flash"
     GEMINI_FLASH_LARGE = "gemini-2.5-flash"
 
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class IngestionStage(str, Enum):
+    EXTRACTING = "extracting"
+    CHUNKING = "chunking"
+    EMBEDDING = "embedding"
+    STORING = "storing"
+    SAVING = "saving"
+
+class StageStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+
 class FileUploadResponse(BaseModel):
     file_id: int
     filename: str
@@ -34,18 +63,79 @@ class FileUploadResponse(BaseModel):
     chunking_method: ChunkingMethod
     embedding_model: EmbeddingModel
     message: str
+    version: int = 1
+
+class FileUpdateResponse(FileUploadResponse):
+    chunks_added: int
+    chunks_removed: int
+    chunks_unchanged: int
+
+class BatchUploadFailure(BaseModel):
+    filename: str
+    error: str
+
+class BatchUploadResponse(BaseModel):
+    files: List[FileUploadResponse]
+    failed: List[BatchUploadFailure]
+    total_chunks: int
+
+class StageProgress(BaseModel):
+    status: StageStatus = StageStatus.PENDING
+    completed: int = 0
+    total: Optional[int] = None
+
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    filename: str
+    status: JobStatus
+    message: str
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    filename: str
+    status: JobStatus
+    current_stage: Optional[IngestionStage] = None
+    stages: Dict[IngestionStage, StageProgress]
+    chunking_method: ChunkingMethod
+    embedding_model: EmbeddingModel
+    file_id: Optional[int] = None
+    chunk_count: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+class SearchFilters(BaseModel):
+    filenames: Optional[List[str]] = None
+    file_ids: Optional[List[int]] = None
+    embedding_models: Optional[List[EmbeddingModel]] = None
+    chunking_methods: Optional[List[ChunkingMethod]] = None
+
+    def to_payload_filters(self) -> Dict[str, List]:
+        fields = {
+            "filename": self.filenames,
+            "file_id": self.file_ids,
+            "embedding_model": [m.value for m in self.embedding_models or []],
+            "chunking_method": [m.value for m in self.chunking_methods or []],
+        }
+        return {field: values for field, values in fields.items() if values}
 
 class QueryRequest(BaseModel):
     query: str
     session_id: Optional[str] = None
     use_memory: bool = True
     similarity_algorithm: SimilarityAlgorithm = SimilarityAlgorithm.COSINE
+    search_mode: SearchMode = SearchMode.DENSE
+    filters: Optional[SearchFilters] = None
+    mode: QueryMode = QueryMode.AGENT
 
 class QueryResponse(BaseModel):
     answer: str
     sources: List[str]
     session_id: Optional[str]
     similarity_algorithm: SimilarityAlgorithm
+    llm_model: Optional[LLMModel] = None
+    search_mode: SearchMode = SearchMode.DENSE
+    filters: Optional[Dict[str, List]] = None
 
 class InterviewBookingRequest(BaseModel):
     full_name: str
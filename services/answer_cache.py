@@ -0,0 +1,115 @@
+from typing import Any, Dict, List, Optional
+import base64
+import hashlib
+import json
+import time
+import numpy as np
+from config.settings import settings
+
+
+class AnswerCache:
+    """Redis cache of answers, looked up by similarity of query embeddings.
+
+    Entries live in one Redis list per scope (LLM, similarity algorithm,
+    search settings...), newest first and capped at `max_entries`, so a
+    lookup fetches the scope's list and compares the query embedding with
+    every cached one; the best match at or above `threshold` cosine
+    similarity is a hit. Entries older than `ttl_seconds` are ignored and
+    whole lists expire after it.
+
+    Every key includes a corpus version stored in Redis; invalidate() bumps
+    it, so answers given before the documents changed are never returned
+    again (their keys simply expire). Redis errors degrade to cache misses.
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        threshold: float = settings.ANSWER_CACHE_THRESHOLD,
+        ttl_seconds: int = settings.ANSWER_CACHE_TTL_SECONDS,
+        max_entries: int = settings.ANSWER_CACHE_MAX_ENTRIES,
+        key_prefix: str = "answer",
+    ):
+        self.redis_client = redis_client
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.key_prefix = key_prefix
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_scope(**parts: Any) -> str:
+        """A scope id for the settings an answer depends on."""
+        encoded = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:32]
+
+    async def get(self, scope: str, embedding: List[float]) -> Optional[Dict[str, Any]]:
+        """The cached entry (query, answer, sources, similarity) closest to
+        `embedding`, or None when none is similar enough."""
+        try:
+            key = await self._key(scope)
+            raw_entries = await self.redis_client.lrange(key, 0, -1)
+        except Exception as e:
+            print(f"[WARN] Answer cache lookup failed: {e}")
+            raw_entries = []
+
+        oldest = time.time() - self.ttl_seconds
+        entries = [entry for entry in map(json.loads, raw_entries) if entry["created"] >= oldest]
+        if not entries:
+            self.misses += 1
+            return None
+
+        cached = np.stack([np.frombuffer(base64.b64decode(entry["embedding"]), dtype=np.float32) for entry in entries])
+        query = np.asarray(embedding, dtype=np.float32)
+        similarities = cached @ query / np.maximum(np.linalg.norm(cached, axis=1) * np.linalg.norm(query), 1e-12)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        entry = entries[best]
+        return {
+            "query": entry["query"],
+            "answer": entry["answer"],
+            "sources": entry["sources"],
+            "similarity": float(similarities[best]),
+        }
+
+    async def set(self, scope: str, query: str, embedding: List[float], answer: str, sources: List[str]):
+        entry = json.dumps({
+            "query": query,
+            "embedding": base64.b64encode(np.asarray(embedding, dtype=np.float32).tobytes()).decode("ascii"),
+            "answer": answer,
+            "sources": sources,
+            "created": time.time(),
+        })
+        try:
+            key = await self._key(scope)
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.lpush(key, entry)
+                pipe.ltrim(key, 0, self.max_entries - 1)
+                pipe.expire(key, self.ttl_seconds)
+                await pipe.execute()
+        except Exception as e:
+            print(f"[WARN] Answer cache write failed: {e}")
+
+    async def invalidate(self):
+        """Drop every cached answer, e.g. after the documents changed."""
+        try:
+            await self.redis_client.incr(f"{self.key_prefix}:version")
+        except Exception as e:
+            print(f"[WARN] Answer cache invalidation failed: {e}")
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    async def _key(self, scope: str) -> str:
+        version = await self.redis_client.get(f"{self.key_prefix}:version")
+        return f"{self.key_prefix}:{int(version or 0)}:{scope}"
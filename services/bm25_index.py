@@ -0,0 +1,154 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from collections import Counter
+import heapq
+import math
+import re
+import threading
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """In-memory inverted index with Okapi BM25 ranking.
+
+    Documents (chunks) are added and removed one at a time, so the index is
+    maintained incrementally as chunks are stored and deleted. Postings map
+    each term to {doc_id: term frequency}; a query only touches the postings
+    of its own terms. The text itself is not kept: removing a document takes
+    its text again, and callers fetch the text of the hits they return.
+
+    Searches may run in a worker thread; a lock keeps them from reading the
+    postings while they are being changed.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.payloads: Dict[str, Dict[str, Any]] = {}
+        self.total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, doc_id: str, text: str, payload: Optional[Dict[str, Any]] = None):
+        """Index `text` under `doc_id`. Re-adding an id replaces it; ids are
+        expected to identify their text (as content-hash point ids do), so
+        the old postings are found from the new text."""
+        with self._lock:
+            self._add(doc_id, text, payload)
+
+    def add_many(self, documents: Iterable[Tuple[str, str, Dict[str, Any]]]):
+        with self._lock:
+            for doc_id, text, payload in documents:
+                self._add(doc_id, text, payload)
+
+    def _add(self, doc_id: str, text: str, payload: Optional[Dict[str, Any]]):
+        if doc_id in self.doc_lengths:
+            self._remove(doc_id, text)
+        terms = Counter(tokenize(text))
+        for term, frequency in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = frequency
+        length = sum(terms.values())
+        self.doc_lengths[doc_id] = length
+        self.payloads[doc_id] = dict(payload or {})
+        self.total_length += length
+
+    def remove(self, doc_id: str, text: str):
+        """Remove a document; `text` is the text it was added with."""
+        with self._lock:
+            self._remove(doc_id, text)
+
+    def _remove(self, doc_id: str, text: str):
+        length = self.doc_lengths.pop(doc_id, None)
+        if length is None:
+            return
+        self.payloads.pop(doc_id)
+        self.total_length -= length
+        for term in set(tokenize(text)):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+
+    def update_payload(self, doc_id: str, fields: Dict[str, Any]):
+        with self._lock:
+            payload = self.payloads.get(doc_id)
+            if payload is not None:
+                self.payloads[doc_id] = {**payload, **fields}
+
+    def search(
+        self,
+        query: str,
+        limit: int = 5,
+        predicate: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    ) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """Top-`limit` (doc_id, score, payload) by BM25 score, among documents
+        whose payload satisfies `predicate` when one is given.
+
+        Query terms are scored rarest first with MaxScore pruning: once
+        `limit` documents score at least what the remaining, more common
+        terms could add at most, those terms only update documents already
+        found instead of walking their whole postings.
+        """
+        with self._lock:
+            count = len(self.doc_lengths)
+            if not count or limit <= 0:
+                return []
+            average_length = self.total_length / count
+
+            terms = []
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if postings:
+                    idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    terms.append((idf, postings))
+            # A term adds less than idf * (k1 + 1) to any document's score.
+            terms.sort(key=lambda term: term[0], reverse=True)
+            remaining = sum(idf for idf, _ in terms) * (self.k1 + 1)
+
+            scores: Dict[str, float] = {}
+            rejected = set()
+            for idf, postings in terms:
+                if len(scores) >= limit and heapq.nlargest(limit, scores.values())[-1] >= remaining:
+                    candidates = [(doc_id, postings[doc_id]) for doc_id in scores if doc_id in postings]
+                else:
+                    candidates = postings.items()
+                for doc_id, frequency in candidates:
+                    if doc_id in rejected:
+                        continue
+                    if predicate is not None and doc_id not in scores and not predicate(self.payloads[doc_id]):
+                        rejected.add(doc_id)
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+                remaining -= idf * (self.k1 + 1)
+
+            top = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            return [(doc_id, score, self.payloads[doc_id]) for doc_id, score in top]
+
+
+def reciprocal_rank_fusion(rankings: List[List[Dict[str, Any]]], limit: int = 5, k: int = 60) -> List[Dict[str, Any]]:
+    """Merge ranked hit lists by reciprocal rank fusion.
+
+    Hits are matched across lists by `chunk_hash` (falling back to `id`), so
+    the same chunk found by BM25 and by any embedding model counts once. The
+    returned hits keep their first-seen fields with `score` replaced by the
+    fused score, sum of 1 / (k + rank).
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking, start=1):
+            key = hit.get("chunk_hash") or str(hit["id"])
+            entry = fused.get(key)
+            if entry is None:
+                entry = fused[key] = {**hit, "score": 0.0}
+            entry["score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda hit: hit["score"], reverse=True)[:limit]
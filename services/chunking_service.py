@@ -1,91 +1,310 @@
 import re
-from typing import List
+from typing import AsyncIterator, List, Optional, Tuple
+from config.settings import settings
 from schemas import ChunkingMethod
 from sentence_transformers import SentenceTransformer
+from services.model_registry import model_registry
+from services.encoder_service import sentence_encoder
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+
+
+class ChunkSpan:
+    """A chunk as a [start, end) character range over its source text.
+
+    Chunkers work on spans so no substrings are built while boundaries are
+    being decided; call `text(source)` when the chunk string is needed.
+    Semantic chunking can also attach a pooled `embedding` for the chunk.
+    """
+    __slots__ = ("start", "end", "token_count", "embedding")
+
+    def __init__(
+        self,
+        start: int,
+        end: int,
+        token_count: Optional[int] = None,
+        embedding: Optional[np.ndarray] = None,
+    ):
+        self.start = start
+        self.end = end
+        self.token_count = token_count
+        self.embedding = embedding
+
+    def text(self, source: str) -> str:
+        return source[self.start:self.end]
+
+    def shifted(self, offset: int) -> "ChunkSpan":
+        return ChunkSpan(self.start + offset, self.end + offset, self.token_count, self.embedding)
+
+    def __eq__(self, other):
+        return isinstance(other, ChunkSpan) and (self.start, self.end) == (other.start, other.end)
+
+    def __repr__(self):
+        return f"ChunkSpan({self.start}, {self.end}, token_count={self.token_count})"
+
+
+def _strip_span(text: str, start: int, end: int) -> Optional[ChunkSpan]:
+    """Narrow [start, end) to exclude surrounding whitespace, like str.strip()."""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return ChunkSpan(start, end) if start < end else None
+
+
+class _WhitespaceTokenizer:
+    """Fallback tokenizer used when the model tokenizer cannot be loaded."""
+
+    def __call__(self, text: str, **kwargs):
+        return {"offset_mapping": [(m.start(), m.end()) for m in re.finditer(r"\S+", text)]}
+
+
+def semantic_breakpoints(
+    embeddings: np.ndarray,
+    mode: str = settings.SEMANTIC_BREAKPOINT_MODE,
+    threshold: float = settings.SEMANTIC_SIMILARITY_THRESHOLD,
+    percentile: float = settings.SEMANTIC_BREAKPOINT_PERCENTILE,
+    window: int = settings.SEMANTIC_WINDOW_SIZE,
+) -> np.ndarray:
+    """Indices of the sentences that start a new semantic chunk.
+
+    All similarities are computed in one vectorized pass over the row-normalized
+    sentence embedding matrix:
+      - "threshold": break where adjacent cosine similarity < `threshold`
+      - "percentile": break where adjacent cosine distance is above its
+        `percentile`-th percentile within the document
+      - "window": break where a sentence's similarity to the mean of the
+        previous `window` sentences is < `threshold`
+    """
+    if len(embeddings) < 2:
+        return np.empty(0, dtype=np.int64)
+
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = matrix / np.maximum(norms, 1e-12)
+
+    if mode == "threshold":
+        similarities = np.einsum("ij,ij->i", matrix[:-1], matrix[1:])
+        breaks = similarities < threshold
+    elif mode == "percentile":
+        distances = 1.0 - np.einsum("ij,ij->i", matrix[:-1], matrix[1:])
+        breaks = distances > np.percentile(distances, percentile)
+    elif mode == "window":
+        # Mean of rows [i - window, i) for every i >= 1 via a prefix sum.
+        prefix = np.vstack([np.zeros((1, matrix.shape[1]), dtype=np.float32), np.cumsum(matrix, axis=0)])
+        ends = np.arange(1, len(matrix))
+        starts = np.maximum(ends - window, 0)
+        context = (prefix[ends] - prefix[starts]) / (ends - starts)[:, None]
+        context /= np.maximum(np.linalg.norm(context, axis=1, keepdims=True), 1e-12)
+        similarities = np.einsum("ij,ij->i", context, matrix[1:])
+        breaks = similarities < threshold
+    else:
+        raise ValueError(f"Unsupported semantic breakpoint mode: {mode}")
+
+    return np.flatnonzero(breaks) + 1
+
+
+def get_tokenizer():
+    """The local SentenceTransformer's tokenizer, shared through the model
+    registry. While the model cannot be loaded, whitespace tokens are counted
+    instead; the failure is not cached, so the next call tries again."""
+    try:
+        return model_registry.get_sentence_transformer().tokenizer
+    except Exception as e:
+        print(f"[WARN] Could not load the SentenceTransformer tokenizer, counting whitespace tokens instead: {e}")
+        return _WhitespaceTokenizer()
+
 
 class ChunkingService:
-    def __init__(self):
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
-    
+    @property
+    def model(self) -> SentenceTransformer:
+        return model_registry.get_sentence_transformer()
+
     async def chunk_text(self, text: str, method: ChunkingMethod) -> List[str]:
+        spans = await self.chunk_spans(text, method)
+        return [span.text(text) for span in spans]
+
+    async def chunk_spans(
+        self,
+        text: str,
+        method: ChunkingMethod,
+        with_embeddings: bool = False,
+    ) -> List[ChunkSpan]:
+        """Chunk `text` into spans. With `with_embeddings`, semantic chunking
+        also attaches each chunk's embedding pooled from its sentence
+        embeddings; other methods ignore the flag."""
         if method == ChunkingMethod.RECURSIVE:
             return await self._recursive_chunking(text)
         elif method == ChunkingMethod.SEMANTIC:
-            return await self._semantic_chunking(text)
+            return await self._semantic_chunking(text, pool_embeddings=with_embeddings)
         elif method == ChunkingMethod.CUSTOM:
             return await self._custom_chunking(text)
+        elif method == ChunkingMethod.TOKEN:
+            return await self._token_chunking(text)
         else:
             raise ValueError(f"Unsupported chunking method: {method}")
-    
-    async def _recursive_chunking(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
-        chunks = []
+
+    async def iter_chunks(
+        self,
+        pieces: AsyncIterator[str],
+        method: ChunkingMethod,
+        window_size: int = settings.STREAM_CHUNK_WINDOW_SIZE,
+        with_embeddings: bool = False,
+    ) -> AsyncIterator[Tuple[List[str], List[ChunkSpan]]]:
+        """Chunk a stream of text pieces incrementally.
+
+        Yields batches of (chunk strings, spans), with span offsets relative
+        to the concatenation of all pieces. Text is buffered until it reaches
+        `window_size` characters and then chunked with `method`. Every chunk
+        except the last is final; the last one may continue into the next
+        piece, so the buffer restarts at its start offset.
+        """
+        buffer = ""
+        base = 0
+        async for piece in pieces:
+            buffer += piece
+            if len(buffer) < window_size:
+                continue
+
+            spans = await self.chunk_spans(buffer, method, with_embeddings)
+            if len(spans) < 2:
+                continue
+
+            carry_start = spans[-1].start
+            final = spans[:-1]
+            yield [span.text(buffer) for span in final], [span.shifted(base) for span in final]
+            buffer = buffer[carry_start:]
+            base += carry_start
+
+        if buffer.strip():
+            spans = await self.chunk_spans(buffer, method, with_embeddings)
+            if spans:
+                yield [span.text(buffer) for span in spans], [span.shifted(base) for span in spans]
+
+    async def _recursive_chunking(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[ChunkSpan]:
+        spans = []
         start = 0
-        
+
         while start < len(text):
             end = start + chunk_size
-            
+
             if end < len(text):
                 last_period = text.rfind('.', start, end)
                 if last_period != -1 and last_period > start + chunk_size // 2:
                     end = last_period + 1
-            
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
-            
+
+            span = _strip_span(text, start, min(end, len(text)))
+            if span:
+                spans.append(span)
+
             start = end - overlap
-        
-        return chunks
-    
-    async def _semantic_chunking(self, text: str, similarity_threshold: float = 0.7) -> List[str]:
-        sentences = re.split(r'[.!?]+', text)
-        sentences = [s.strip() for s in sentences if s.strip()]
-        
-        if not sentences:
-            return [text]
-        
-        embeddings = self.model.encode(sentences)
-        chunks = []
-        current_chunk = [sentences[0]]
-        
-        for i in range(1, len(sentences)):
-            current_embedding = embeddings[i]
-            prev_embedding = embeddings[i-1]
-            
-            similarity = cosine_similarity([current_embedding], [prev_embedding])[0][0]
-            
-            if similarity >= similarity_threshold:
-                current_chunk.append(sentences[i])
-            else:
-                chunks.append(' '.join(current_chunk))
-                current_chunk = [sentences[i]]
-        
-        if current_chunk:
-            chunks.append(' '.join(current_chunk))
-        
-        return chunks
-    
-    async def _custom_chunking(self, text: str) -> List[str]:
-        paragraphs = text.split('\n\n')
-        chunks = []
-        current_chunk = ""
-        max_chunk_size = 800
-        
-        for paragraph in paragraphs:
-            paragraph = paragraph.strip()
-            if not paragraph:
-                continue
-            
-            if len(current_chunk) + len(paragraph) > max_chunk_size:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                current_chunk = paragraph
+
+        return spans
+
+    async def _semantic_chunking(
+        self,
+        text: str,
+        similarity_threshold: float = settings.SEMANTIC_SIMILARITY_THRESHOLD,
+        pool_embeddings: bool = False
+    ) -> List[ChunkSpan]:
+        sentence_spans = [
+            span for span in (_strip_span(text, m.start(), m.end()) for m in re.finditer(r'[^.!?]+', text))
+            if span
+        ]
+
+        if not sentence_spans:
+            span = ChunkSpan(0, len(text))
+            if pool_embeddings:
+                span.embedding = (await self._encode([text]))[0]
+            return [span]
+
+        embeddings = await self._encode([span.text(text) for span in sentence_spans])
+        breakpoints = semantic_breakpoints(embeddings, threshold=similarity_threshold)
+        first_sentences = np.concatenate(([0], breakpoints)).astype(np.int64)
+        last_sentences = np.concatenate((breakpoints - 1, [len(sentence_spans) - 1])).astype(np.int64)
+
+        spans = [
+            ChunkSpan(sentence_spans[first].start, sentence_spans[last].end)
+            for first, last in zip(first_sentences, last_sentences)
+        ]
+
+        if pool_embeddings:
+            # Mean-pool each chunk's normalized sentence embeddings, then
+            # re-normalize, so the chunk needs no second encoder pass.
+            sums = np.add.reduceat(embeddings, first_sentences, axis=0)
+            pooled = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+            for span, embedding in zip(spans, pooled):
+                span.embedding = embedding
+
+        return spans
+
+    async def _encode(self, sentences: List[str]) -> np.ndarray:
+        return await sentence_encoder.encode(sentences, normalize=True)
+
+    async def _custom_chunking(self, text: str, max_chunk_size: int = 800) -> List[ChunkSpan]:
+        spans = []
+        current: Optional[ChunkSpan] = None
+
+        for paragraph in self._paragraph_spans(text):
+            if current is None:
+                current = paragraph
+            elif (current.end - current.start) + (paragraph.end - paragraph.start) > max_chunk_size:
+                spans.append(current)
+                current = paragraph
             else:
-                current_chunk += "\n\n" + paragraph if current_chunk else paragraph
-        
-        if current_chunk:
-            chunks.append(current_chunk.strip())
-        
-        return chunks
+                current = ChunkSpan(current.start, paragraph.end)
+
+        if current:
+            spans.append(current)
+
+        return spans
+
+    async def _token_chunking(
+        self,
+        text: str,
+        max_tokens: int = settings.CHUNK_MAX_TOKENS,
+        overlap_tokens: int = settings.CHUNK_OVERLAP_TOKENS,
+    ) -> List[ChunkSpan]:
+        """Size chunks by tokenizer tokens so each fills, but never exceeds, the
+        embedding model's input window. Windows end on a sentence boundary when
+        one falls in their second half.
+
+        Chunks are sized for the local SentenceTransformer, whose window is
+        the smallest of the embedding models; Gemini and OpenAI accept them
+        unchanged. This keeps one chunking per document whatever the target
+        model."""
+        offsets = [
+            (start, end) for start, end in
+            get_tokenizer()(text, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+            if end > start
+        ]
+        spans = []
+        first = 0
+
+        while first < len(offsets):
+            last = min(first + max_tokens, len(offsets))
+            if last < len(offsets):
+                for i in range(last - 1, first + max_tokens // 2, -1):
+                    if text[offsets[i][1] - 1] in ".!?":
+                        last = i + 1
+                        break
+
+            spans.append(ChunkSpan(offsets[first][0], offsets[last - 1][1], token_count=last - first))
+            if last == len(offsets):
+                break
+            first = max(last - overlap_tokens, first + 1)
+
+        return spans
+
+    @staticmethod
+    def _paragraph_spans(text: str) -> List[ChunkSpan]:
+        paragraphs = []
+        start = 0
+        for separator in re.finditer(r'\n\n', text):
+            span = _strip_span(text, start, separator.start())
+            if span:
+                paragraphs.append(span)
+            start = separator.end()
+        span = _strip_span(text, start, len(text))
+        if span:
+            paragraphs.append(span)
+        return paragraphs
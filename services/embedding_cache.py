@@ -0,0 +1,103 @@
+from typing import Dict, List, Optional
+from collections import OrderedDict
+import numpy as np
+from config.settings import settings
+from utils.hashing import chunk_hash
+
+
+class EmbeddingCache:
+    """Two-tier embedding cache: a bounded in-process LRU in front of Redis.
+
+    Entries are keyed by (model, hash of whitespace-normalized text) and stored
+    as raw float32 bytes. The LRU is bounded by total bytes; Redis entries
+    expire after `ttl_seconds`, and the cache's own Redis
+    (EMBEDDING_CACHE_REDIS_URL) can also evict them under memory pressure.
+    Redis errors degrade to cache misses.
+    """
+
+    def __init__(
+        self,
+        redis_client=None,
+        max_bytes: int = settings.EMBEDDING_CACHE_MAX_BYTES,
+        ttl_seconds: int = settings.EMBEDDING_CACHE_TTL_SECONDS,
+        key_prefix: str = "embedding",
+    ):
+        self.redis_client = redis_client
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.key_prefix = key_prefix
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self.memory_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def make_key(self, model: str, text: str) -> str:
+        return f"{self.key_prefix}:{model}:{chunk_hash(text)}"
+
+    async def get_many(self, model: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        keys = [self.make_key(model, text) for text in texts]
+        results: List[Optional[np.ndarray]] = [None] * len(texts)
+
+        remote_positions = []
+        for i, key in enumerate(keys):
+            raw = self._memory.get(key)
+            if raw is not None:
+                self._memory.move_to_end(key)
+                results[i] = np.frombuffer(raw, dtype=np.float32)
+                self.memory_hits += 1
+            else:
+                remote_positions.append(i)
+
+        if remote_positions and self.redis_client is not None:
+            try:
+                values = await self.redis_client.mget([keys[i] for i in remote_positions])
+            except Exception as e:
+                print(f"[WARN] Embedding cache lookup failed: {e}")
+                values = [None] * len(remote_positions)
+            for i, raw in zip(remote_positions, values):
+                if raw is not None:
+                    self._remember(keys[i], raw)
+                    results[i] = np.frombuffer(raw, dtype=np.float32)
+                    self.redis_hits += 1
+
+        self.misses += sum(1 for result in results if result is None)
+        return results
+
+    async def set_many(self, model: str, texts: List[str], embeddings: List[List[float]]):
+        items = [
+            (self.make_key(model, text), np.asarray(embedding, dtype=np.float32).tobytes())
+            for text, embedding in zip(texts, embeddings)
+        ]
+        for key, raw in items:
+            self._remember(key, raw)
+
+        if items and self.redis_client is not None:
+            try:
+                async with self.redis_client.pipeline(transaction=False) as pipe:
+                    for key, raw in items:
+                        pipe.set(key, raw, ex=self.ttl_seconds)
+                    await pipe.execute()
+            except Exception as e:
+                print(f"[WARN] Embedding cache write failed: {e}")
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.memory_hits + self.redis_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.redis_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+        }
+
+    def _remember(self, key: str, raw: bytes):
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = raw
+        self._memory_bytes += len(raw)
+        while self._memory_bytes > self.max_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
@@ -0,0 +1,95 @@
+from typing import Awaitable, Callable, List, Optional
+import asyncio
+import random
+from config.settings import settings
+
+EmbedBatchFn = Callable[[List[str]], Awaitable[List[List[float]]]]
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    for attr in ("status_code", "code", "status"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(error, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limits, timeouts and transient server errors are worth retrying."""
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = _status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    message = str(error).lower()
+    return "rate limit" in message or "resource_exhausted" in message or "429" in message
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class EmbeddingDispatcher:
+    """Splits texts into provider-sized batches and embeds them concurrently.
+
+    At most `max_in_flight` batches are outstanding at once. A batch that fails
+    with a retryable error (see `is_retryable`) is retried with jittered
+    exponential backoff, honouring Retry-After when the provider sends it.
+    Results come back in input order.
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        max_in_flight: int = settings.EMBEDDING_MAX_IN_FLIGHT,
+        max_retries: int = settings.EMBEDDING_MAX_RETRIES,
+        base_delay: float = settings.EMBEDDING_RETRY_BASE_DELAY,
+        max_delay: float = settings.EMBEDDING_RETRY_MAX_DELAY,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ):
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._sleep = sleep
+
+    async def dispatch(self, texts: List[str], embed_batch: EmbedBatchFn) -> List[List[float]]:
+        if not texts:
+            return []
+
+        slots = asyncio.Semaphore(self.max_in_flight)
+
+        async def run(batch: List[str]) -> List[List[float]]:
+            async with slots:
+                return await self._embed_with_retries(batch, embed_batch)
+
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(*(run(batch) for batch in batches))
+        return [embedding for batch_result in results for embedding in batch_result]
+
+    async def _embed_with_retries(self, batch: List[str], embed_batch: EmbedBatchFn) -> List[List[float]]:
+        attempt = 0
+        while True:
+            try:
+                embeddings = await embed_batch(batch)
+                if len(embeddings) != len(batch):
+                    raise ValueError(f"Expected {len(batch)} embeddings, got {len(embeddings)}")
+                return embeddings
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = min(self.max_delay, self.base_delay * (2 ** attempt)) * random.uniform(0.5, 1.0)
+                attempt += 1
+                print(f"[WARN] Embedding batch of {len(batch)} failed ({e}); retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                await self._sleep(delay)
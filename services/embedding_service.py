@@ -1,18 +1,78 @@
-from typing import List
+from typing import Dict, List
 import numpy as np
 from sentence_transformers import SentenceTransformer
+from config.settings import settings
 from schemas import EmbeddingModel
+from services.model_registry import model_registry
+from services.encoder_service import sentence_encoder
+from services.embedding_cache import EmbeddingCache
+from services.embedding_dispatcher import EmbeddingDispatcher
 from google import genai
 import openai
+import redis.asyncio as aioredis
 import os
 
+GEMINI_EMBEDDING_MODEL = "models/embedding-001"
+OPENAI_EMBEDDING_MODEL = "text-embedding-ada-002"
+
 class EmbeddingService:
-    def __init__(self):
-        self.sentence_transformer = SentenceTransformer("all-MiniLM-L6-v2", device='cpu')
-        openai.api_key = os.getenv("OPENAI_API_KEY")
+    def __init__(self, cache: EmbeddingCache = None):
+        self._openai_client = None
         self.gemini_client = genai.Client(api_key=os.getenv('GEMINI_API_KEY'))
+        self.openai_dispatcher = EmbeddingDispatcher(batch_size=settings.OPENAI_EMBEDDING_BATCH_SIZE)
+        self.gemini_dispatcher = EmbeddingDispatcher(batch_size=settings.GEMINI_EMBEDDING_BATCH_SIZE)
+        if cache is None and settings.EMBEDDING_CACHE_ENABLED:
+            redis_client = aioredis.from_url(settings.EMBEDDING_CACHE_REDIS_URL) if settings.EMBEDDING_CACHE_USE_REDIS else None
+            cache = EmbeddingCache(redis_client)
+        self.cache = cache
+
+    @property
+    def sentence_transformer(self) -> SentenceTransformer:
+        return model_registry.get_sentence_transformer()
     
     async def generate_embeddings(self, chunks: List[str], model: EmbeddingModel) -> List[List[float]]:
+        if self.cache is None or not chunks:
+            return await self._generate_uncached(chunks, model)
+
+        namespace = self._cache_namespace(model)
+        cached = await self.cache.get_many(namespace, chunks)
+
+        # Embed each distinct missing text once.
+        missing: Dict[str, List[int]] = {}
+        for i, (chunk, embedding) in enumerate(zip(chunks, cached)):
+            if embedding is None:
+                missing.setdefault(chunk, []).append(i)
+
+        results: List[List[float]] = [embedding.tolist() if embedding is not None else None for embedding in cached]
+        if missing:
+            texts = list(missing.keys())
+            computed = await self._generate_uncached(texts, model)
+            if len(computed) != len(texts):
+                raise ValueError(f"Expected {len(texts)} embeddings from {model.value}, got {len(computed)}")
+            await self.cache.set_many(namespace, texts, computed)
+            for text, embedding in zip(texts, computed):
+                for i in missing[text]:
+                    results[i] = list(embedding)
+        return results
+
+    def cache_stats(self) -> Dict[str, float]:
+        return self.cache.stats() if self.cache is not None else {}
+
+    @staticmethod
+    def _cache_namespace(model: EmbeddingModel) -> str:
+        if model == EmbeddingModel.SENTENCE_TRANSFORMER:
+            # Quantized/ONNX vectors differ slightly from PyTorch ones.
+            backend = settings.SENTENCE_TRANSFORMER_BACKEND
+            if backend == "onnx" and settings.ONNX_QUANTIZATION:
+                backend = f"onnx-qint8-{settings.ONNX_QUANTIZATION}"
+            return f"{model.value}/{settings.SENTENCE_TRANSFORMER_MODEL}/{backend}"
+        elif model == EmbeddingModel.OPENAI:
+            return f"{model.value}/{OPENAI_EMBEDDING_MODEL}"
+        elif model == EmbeddingModel.GEMINI:
+            return f"{model.value}/{GEMINI_EMBEDDING_MODEL}"
+        return model.value
+
+    async def _generate_uncached(self, chunks: List[str], model: EmbeddingModel) -> List[List[float]]:
         if model == EmbeddingModel.SENTENCE_TRANSFORMER:
             return await self._generate_sentence_transformer_embeddings(chunks)
         elif model == EmbeddingModel.OPENAI:
@@ -24,35 +84,29 @@ class EmbeddingService:
         
     async def _generate_gemini_embeddings(self, chunks: List[str]) -> List[List[float]]:
         print(f"Embedding {len(chunks)} chunks of sentences using Gemini...")
-        all_embeddings: List[List[float]] = [] 
         try:
-            response = self.gemini_client.models.embed_content(
-                model="models/embedding-001", 
-                contents=chunks,
-            )
-
-            if response and hasattr(response, 'embeddings'):
-                for embedding_obj in response.embeddings:
-                    if hasattr(embedding_obj, 'values') and isinstance(embedding_obj.values, list):
-                        all_embeddings.append(embedding_obj.values)
-                    else:
-                        print(f"Warning: Gemini embedding object missing or invalid 'values' attribute: {embedding_obj}")
-            else:
-                print(f"Warning: Gemini API response did not contain 'embeddings' attribute or it's empty: {response}")
-
+            embeddings = await self.gemini_dispatcher.dispatch(chunks, self._embed_gemini_batch)
             print("Gemini embeddings generated successfully.")
-            return all_embeddings
+            return embeddings
         except Exception as e:
             print(f"Error during Gemini embedding: {e}")
             import traceback
             traceback.print_exc()
             raise
 
+    async def _embed_gemini_batch(self, batch: List[str]) -> List[List[float]]:
+        response = await self.gemini_client.aio.models.embed_content(
+            model=GEMINI_EMBEDDING_MODEL,
+            contents=batch,
+        )
+        if not response or not getattr(response, 'embeddings', None):
+            raise ValueError(f"Gemini API response did not contain embeddings: {response}")
+        return [embedding_obj.values for embedding_obj in response.embeddings]
 
     async def _generate_sentence_transformer_embeddings(self, chunks: List[str]) -> List[List[float]]:
         try:
             print(f"Embedding {len(chunks)} chunks of sentences...")
-            embeddings = self.sentence_transformer.encode(chunks)
+            embeddings = await sentence_encoder.encode(chunks)
             print("Embeddings generated successfully.")
             return embeddings.tolist()
         except Exception as e:
@@ -62,11 +116,18 @@ class EmbeddingService:
             raise
     
     async def _generate_openai_embeddings(self, chunks: List[str]) -> List[List[float]]:
-        embeddings = []
-        for chunk in chunks:
-            response = openai.embeddings.create(
-                input=chunk,
-                model="text-embedding-ada-002"
-            )
-            embeddings.append(response['data'][0]['embedding'])
-        return embeddings
+        return await self.openai_dispatcher.dispatch(chunks, self._embed_openai_batch)
+
+    async def _embed_openai_batch(self, batch: List[str]) -> List[List[float]]:
+        response = await self.openai_client.embeddings.create(
+            input=batch,
+            model=OPENAI_EMBEDDING_MODEL
+        )
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    @property
+    def openai_client(self) -> openai.AsyncOpenAI:
+        # Created on first use: the client refuses to construct without a key.
+        if self._openai_client is None:
+            self._openai_client = openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return self._openai_client
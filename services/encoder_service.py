@@ -0,0 +1,114 @@
+from typing import Any, Callable, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import numpy as np
+from config.settings import settings
+from services.model_registry import model_registry
+
+
+class _EncodeRequest:
+    __slots__ = ("texts", "normalize", "future")
+
+    def __init__(self, texts: List[str], normalize: bool, future: asyncio.Future):
+        self.texts = texts
+        self.normalize = normalize
+        self.future = future
+
+
+class MicroBatchEncoder:
+    """Runs SentenceTransformer inference off the event loop with dynamic batching.
+
+    Concurrent `encode` calls are queued; a collector task takes the first
+    waiting request, gathers whatever else arrives within `max_wait_ms` (up to
+    `max_batch_size` texts), runs a single `model.encode` on a dedicated worker
+    thread and fans the rows back out to each caller. While the worker is busy,
+    new requests keep accumulating, so batches grow with load.
+    """
+
+    def __init__(
+        self,
+        model_getter: Callable[[], Any] = lambda: model_registry.get_sentence_transformer(),
+        max_batch_size: int = settings.ENCODER_MAX_BATCH_SIZE,
+        max_wait_ms: float = settings.ENCODER_MAX_WAIT_MS,
+    ):
+        self.model_getter = model_getter
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="encoder")
+        self._queue: Optional[asyncio.Queue] = None
+        self._collector: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.batches_run = 0
+
+    async def encode(self, texts: List[str], normalize: bool = False) -> np.ndarray:
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        self._ensure_started()
+        future = self._loop.create_future()
+        await self._queue.put(_EncodeRequest(list(texts), normalize, future))
+        return await future
+
+    def shutdown(self):
+        if self._collector is not None:
+            self._collector.cancel()
+            self._collector = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._collector is None or self._collector.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._collector = loop.create_task(self._collect())
+
+    async def _collect(self):
+        while True:
+            batch = [await self._queue.get()]
+            size = len(batch[0].texts)
+            deadline = self._loop.time() + self.max_wait
+            while size < self.max_batch_size:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    request = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(request)
+                size += len(request.texts)
+            await self._run_batch(batch)
+
+    async def _run_batch(self, batch: List[_EncodeRequest]):
+        groups: Dict[bool, List[_EncodeRequest]] = {}
+        for request in batch:
+            if not request.future.cancelled():
+                groups.setdefault(request.normalize, []).append(request)
+
+        for normalize, requests in groups.items():
+            texts = [text for request in requests for text in request.texts]
+            try:
+                embeddings = await self._loop.run_in_executor(self._executor, self._encode, texts, normalize)
+            except Exception as e:
+                for request in requests:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                continue
+            self.batches_run += 1
+
+            offset = 0
+            for request in requests:
+                rows = embeddings[offset:offset + len(request.texts)]
+                offset += len(request.texts)
+                if not request.future.done():
+                    request.future.set_result(rows)
+
+    def _encode(self, texts: List[str], normalize: bool) -> np.ndarray:
+        return self.model_getter().encode(
+            texts,
+            batch_size=settings.SENTENCE_ENCODE_BATCH_SIZE,
+            convert_to_numpy=True,
+            normalize_embeddings=normalize,
+        )
+
+
+sentence_encoder = MicroBatchEncoder()
@@ -1,7 +1,22 @@
 import PyPDF2
 import io
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, List, Optional
+from config.settings import settings
+
+
+def _extract_page_range(content: bytes, start: int, end: int) -> List[str]:
+    """Extract pages [start, end) of a PDF. Runs inside a worker process."""
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(content))
+    return [pdf_reader.pages[i].extract_text() for i in range(start, end)]
+
 
 class FileService:
+    def __init__(self, max_workers: int = settings.PDF_EXTRACTION_WORKERS):
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+
     async def extract_text(self, content: bytes, filename: str) -> str:
         if filename.lower().endswith('.pdf'):
             return await self._extract_from_pdf(content)
@@ -9,10 +24,62 @@ class FileService:
             return content.decode('utf-8')
         else:
             raise ValueError("Unsupported file format")
-    
+
+    async def iter_pages(self, content: bytes, filename: str) -> AsyncIterator[str]:
+        """Yield the document's text incrementally: one item per PDF page, or
+        fixed-size windows for plain text, so consumers can start chunking
+        before the whole file has been parsed. Concatenating the items gives
+        the same text as `extract_text` (before stripping)."""
+        if filename.lower().endswith('.pdf'):
+            async for page_text in self._iter_pdf_pages(content):
+                yield page_text + "\n"
+        elif filename.lower().endswith('.txt'):
+            text = content.decode('utf-8')
+            window = settings.STREAM_TEXT_WINDOW_SIZE
+            for start in range(0, len(text), window):
+                yield text[start:start + window]
+        else:
+            raise ValueError("Unsupported file format")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
     async def _extract_from_pdf(self, content: bytes) -> str:
+        pages = [page_text async for page_text in self._iter_pdf_pages(content)]
+        return "\n".join(pages).strip()
+
+    async def _iter_pdf_pages(self, content: bytes) -> AsyncIterator[str]:
         pdf_reader = PyPDF2.PdfReader(io.BytesIO(content))
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-        return text.strip()
+        page_count = len(pdf_reader.pages)
+
+        if self.max_workers <= 1 or page_count < settings.PDF_PARALLEL_MIN_PAGES:
+            for page in pdf_reader.pages:
+                # Parsing is CPU-bound; keep it off the event loop between pages.
+                yield await asyncio.to_thread(page.extract_text)
+            return
+
+        # Large PDFs: split into one contiguous page range per worker process,
+        # so each worker receives and parses the document once, then yield
+        # the pages back in document order.
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        ranges = min(self.max_workers, page_count)
+        bounds = [page_count * i // ranges for i in range(ranges + 1)]
+        futures = [
+            loop.run_in_executor(executor, _extract_page_range, content, start, end)
+            for start, end in zip(bounds, bounds[1:])
+        ]
+        try:
+            for future in futures:
+                for page_text in await future:
+                    yield page_text
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
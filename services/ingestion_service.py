@@ -0,0 +1,439 @@
+from typing import Dict, List, Optional, Tuple
+import asyncio
+from sqlalchemy.orm import Session
+from config.settings import settings
+from models import FileModel
+from schemas import (
+    ChunkingMethod, EmbeddingModel, IngestionStage, StageStatus,
+    FileUploadResponse, FileUpdateResponse, BatchUploadResponse, BatchUploadFailure
+)
+from services.file_service import FileService
+from services.chunking_service import ChunkingService, ChunkSpan
+from services.embedding_service import EmbeddingService
+from services.vector_service import VectorService
+from utils.hashing import content_hash
+
+
+class IngestionService:
+    """Runs the extract -> chunk -> embed -> store -> save pipeline for one document.
+
+    Shared by the synchronous upload endpoint and the background job workers so
+    both paths produce identical results. Extraction, chunking and embedding are
+    pipelined: pages are chunked as they are parsed and full chunk batches are
+    embedded while later pages are still being extracted. When a job is passed
+    in, per-stage progress is reported on it as the pipeline advances.
+    """
+
+    def __init__(
+        self,
+        file_service: FileService,
+        chunking_service: ChunkingService,
+        embedding_service: EmbeddingService,
+        vector_service: VectorService,
+    ):
+        self.file_service = file_service
+        self.chunking_service = chunking_service
+        self.embedding_service = embedding_service
+        self.vector_service = vector_service
+
+    def find_duplicate(
+        self,
+        content: bytes,
+        chunking_method: ChunkingMethod,
+        embedding_model: EmbeddingModel,
+        db: Session,
+    ) -> Optional[FileModel]:
+        """Return the stored file with identical content and processing settings, if any."""
+        return db.query(FileModel).filter(
+            FileModel.content_hash == content_hash(content),
+            FileModel.chunking_method == chunking_method,
+            FileModel.embedding_model == embedding_model,
+        ).first()
+
+    async def ingest(
+        self,
+        content: bytes,
+        filename: str,
+        chunking_method: ChunkingMethod,
+        embedding_model: EmbeddingModel,
+        db: Session,
+        job=None,
+    ) -> FileModel:
+        pieces: List[str] = []
+        chunks: List[str] = []
+        spans: List[ChunkSpan] = []
+        embed_tasks: List[asyncio.Task] = []
+        embed_slots = asyncio.Semaphore(settings.INGESTION_EMBED_CONCURRENCY)
+        embedded_count = 0
+
+        async def text_stream():
+            async for piece in self.file_service.iter_pages(content, filename):
+                pieces.append(piece)
+                self._report(job, IngestionStage.EXTRACTING, StageStatus.RUNNING, completed=len(pieces))
+                yield piece
+            self._report(job, IngestionStage.EXTRACTING, StageStatus.DONE)
+
+        async def embed_batch(batch: List[str]) -> List[Optional[List[float]]]:
+            nonlocal embedded_count
+            async with embed_slots:
+                embeddings = await self._embed_new_chunks(batch, embedding_model)
+            embedded_count += len(embeddings)
+            self._report(job, IngestionStage.EMBEDDING, StageStatus.RUNNING, completed=embedded_count)
+            return embeddings
+
+        # Chunk batches are handed to the embedder as soon as they are final,
+        # so embedding overlaps with extraction of the remaining pages.
+        # In fused mode the chunker already returns pooled chunk embeddings.
+        batch_size = settings.EMBEDDING_BATCH_SIZE
+        fused = self._use_fused_embeddings(chunking_method, embedding_model)
+        pending: List[str] = []
+        try:
+            async for chunk_batch, span_batch in self.chunking_service.iter_chunks(
+                text_stream(), chunking_method, with_embeddings=fused
+            ):
+                chunks.extend(chunk_batch)
+                spans.extend(span_batch)
+                self._report(job, IngestionStage.CHUNKING, StageStatus.RUNNING, completed=len(chunks))
+                if fused:
+                    continue
+                pending.extend(chunk_batch)
+                while len(pending) >= batch_size:
+                    embed_tasks.append(asyncio.create_task(embed_batch(pending[:batch_size])))
+                    pending = pending[batch_size:]
+            if pending:
+                embed_tasks.append(asyncio.create_task(embed_batch(pending)))
+
+            raw_text = "".join(pieces)
+            text = raw_text.strip()
+            if not text or not chunks:
+                raise ValueError("No text content found in file")
+            self._report(job, IngestionStage.CHUNKING, StageStatus.DONE, total=len(chunks))
+
+            self._report(job, IngestionStage.EMBEDDING, StageStatus.RUNNING, total=len(chunks))
+            batches = await asyncio.gather(*embed_tasks)
+        except BaseException:
+            for task in embed_tasks:
+                task.cancel()
+            raise
+        if fused:
+            embeddings = [span.embedding.tolist() for span in spans]
+        else:
+            embeddings = [embedding for batch in batches for embedding in batch]
+        self._report(job, IngestionStage.EMBEDDING, StageStatus.DONE, completed=len(embeddings))
+
+        # Span offsets are relative to the unstripped stream; align them with
+        # the stored original_text.
+        leading = len(raw_text) - len(raw_text.lstrip())
+        spans = [span.shifted(-leading) for span in spans]
+
+        self._report(job, IngestionStage.STORING, StageStatus.RUNNING, total=len(chunks))
+        vector_ids = await self.vector_service.store_embeddings(
+            embeddings, chunks, filename, chunking_method, embedding_model
+        )
+        self._report(job, IngestionStage.STORING, StageStatus.DONE, completed=len(vector_ids))
+
+        self._report(job, IngestionStage.SAVING, StageStatus.RUNNING)
+        file_record = FileModel(
+            filename=filename,
+            content_hash=content_hash(content),
+            original_text=text,
+            chunking_method=chunking_method,
+            embedding_model=embedding_model,
+            chunk_count=len(chunks),
+            vector_ids=vector_ids
+        )
+
+        db.add(file_record)
+        db.commit()
+        db.refresh(file_record)
+        await self.vector_service.assign_file(
+            vector_ids, file_record.id, filename, embedding_model, chunking_method, spans
+        )
+        self._report(job, IngestionStage.SAVING, StageStatus.DONE, completed=1, total=1)
+
+        return file_record
+
+    def find_latest_by_filename(self, filename: str, db: Session) -> Optional[FileModel]:
+        return db.query(FileModel).filter(
+            FileModel.filename == filename
+        ).order_by(FileModel.id.desc()).first()
+
+    async def reingest(
+        self,
+        file_record: FileModel,
+        content: bytes,
+        filename: str,
+        chunking_method: ChunkingMethod,
+        embedding_model: EmbeddingModel,
+        db: Session,
+    ) -> FileUpdateResponse:
+        """Replace a stored document with new content, touching only changed chunks.
+
+        The new text is re-chunked and each chunk's content-derived point id is
+        compared with the ids already stored for the file: chunks that already
+        exist are kept as they are, only new chunks are embedded and upserted,
+        and points that disappeared (and are not shared with another file) are
+        deleted. The record is updated in place and its version incremented.
+        """
+        new_hash = content_hash(content)
+        old_ids = list(file_record.vector_ids or [])
+        old_model = file_record.embedding_model
+        if (
+            new_hash == file_record.content_hash
+            and chunking_method == file_record.chunking_method
+            and embedding_model == file_record.embedding_model
+        ):
+            return self._update_response(file_record, "File unchanged", 0, 0, len(set(old_ids)))
+
+        text = await self.file_service.extract_text(content, filename)
+        if not text.strip():
+            raise ValueError("No text content found in file")
+        fused = self._use_fused_embeddings(chunking_method, embedding_model)
+        spans = await self.chunking_service.chunk_spans(text, chunking_method, with_embeddings=fused)
+        chunks = [span.text(text) for span in spans]
+
+        new_ids = self.vector_service.chunk_point_ids(chunks, embedding_model)
+        old_id_set = set(old_ids)
+        new_id_set = set(new_ids)
+
+        if fused:
+            embeddings = [span.embedding.tolist() for span in spans]
+        else:
+            embeddings = await self._embed_new_chunks(chunks, embedding_model)
+        await self.vector_service.store_embeddings(
+            embeddings, chunks, filename, chunking_method, embedding_model
+        )
+
+        # Shared chunks (see content-hash dedup) may still back other files:
+        # only points owned by this file alone are deleted. Points without
+        # recorded owners predate content-hash ids, so they were never shared
+        # and belong to this record alone.
+        dropped = old_id_set - new_id_set
+        owners = await self.vector_service.point_owners(list(dropped), old_model)
+        removed = {point_id for point_id, file_ids in owners.items() if file_ids <= {file_record.id}}
+        await self.vector_service.delete_points(list(removed), old_model)
+        await self.vector_service.unassign_file(list(dropped - removed), file_record.id, old_model)
+        # Also renames the file and moves its chunk positions and offsets on
+        # the chunks it kept.
+        await self.vector_service.assign_file(
+            new_ids, file_record.id, filename, embedding_model, chunking_method, spans
+        )
+
+        file_record.filename = filename
+        file_record.content_hash = new_hash
+        file_record.original_text = text
+        file_record.chunking_method = chunking_method
+        file_record.embedding_model = embedding_model
+        file_record.chunk_count = len(chunks)
+        file_record.vector_ids = new_ids
+        file_record.version = (file_record.version or 1) + 1
+        db.commit()
+        db.refresh(file_record)
+
+        return self._update_response(
+            file_record,
+            "File updated successfully",
+            chunks_added=len(new_id_set - old_id_set),
+            chunks_removed=len(removed),
+            chunks_unchanged=len(new_id_set & old_id_set),
+        )
+
+    @staticmethod
+    def _update_response(
+        file_record: FileModel,
+        message: str,
+        chunks_added: int,
+        chunks_removed: int,
+        chunks_unchanged: int,
+    ) -> FileUpdateResponse:
+        return FileUpdateResponse(
+            file_id=file_record.id,
+            filename=file_record.filename,
+            chunk_count=file_record.chunk_count,
+            chunking_method=file_record.chunking_method,
+            embedding_model=file_record.embedding_model,
+            message=message,
+            version=file_record.version,
+            chunks_added=chunks_added,
+            chunks_removed=chunks_removed,
+            chunks_unchanged=chunks_unchanged,
+        )
+
+    async def ingest_batch(
+        self,
+        files: List[Tuple[str, bytes]],
+        chunking_method: ChunkingMethod,
+        embedding_model: EmbeddingModel,
+        db: Session,
+    ) -> BatchUploadResponse:
+        """Ingest many (filename, content) pairs with shared embedding batches.
+
+        Chunks from all files are packed into full EMBEDDING_BATCH_SIZE
+        requests, vectors go out in one bulk upsert and all FileModel rows are
+        written in a single commit. Files already stored (or repeated within
+        the batch) resolve to the existing record. A file that fails
+        extraction or chunking is reported in `failed` without aborting the
+        rest of the batch.
+        """
+        fused = self._use_fused_embeddings(chunking_method, embedding_model)
+
+        async def prepare(filename: str, content: bytes) -> Tuple[str, List[ChunkSpan]]:
+            text = await self.file_service.extract_text(content, filename)
+            if not text.strip():
+                raise ValueError("No text content found in file")
+            spans = await self.chunking_service.chunk_spans(text, chunking_method, with_embeddings=fused)
+            return text, spans
+
+        # Skip files whose content is already stored, or repeated in this batch.
+        hashes = [content_hash(content) for _, content in files]
+        known = {
+            record.content_hash: record
+            for record in db.query(FileModel).filter(
+                FileModel.content_hash.in_(set(hashes)),
+                FileModel.chunking_method == chunking_method,
+                FileModel.embedding_model == embedding_model,
+            )
+        }
+        to_process: Dict[str, Tuple[str, bytes]] = {}
+        for (filename, content), file_hash in zip(files, hashes):
+            if file_hash not in known and file_hash not in to_process:
+                to_process[file_hash] = (filename, content)
+
+        prepared = await asyncio.gather(
+            *(prepare(filename, content) for filename, content in to_process.values()),
+            return_exceptions=True
+        )
+
+        documents: List[Tuple[str, str, str, List[str], List[ChunkSpan]]] = []
+        failed_hashes: Dict[str, str] = {}
+        for file_hash, (filename, _), result in zip(to_process.keys(), to_process.values(), prepared):
+            if isinstance(result, Exception):
+                failed_hashes[file_hash] = str(result)
+            else:
+                text, spans = result
+                documents.append((file_hash, filename, text, [span.text(text) for span in spans], spans))
+
+        all_chunks = [chunk for _, _, _, chunks, _ in documents for chunk in chunks]
+        if fused:
+            embeddings = [span.embedding.tolist() for _, _, _, _, spans in documents for span in spans]
+        else:
+            embeddings = await self._embed_new_chunks(all_chunks, embedding_model)
+
+        stored = []
+        offset = 0
+        for _, filename, _, chunks, _ in documents:
+            stored.append((embeddings[offset:offset + len(chunks)], chunks, filename))
+            offset += len(chunks)
+        vector_id_lists = await self.vector_service.store_embeddings_bulk(
+            stored, chunking_method, embedding_model
+        )
+
+        file_records = [
+            FileModel(
+                filename=filename,
+                content_hash=file_hash,
+                original_text=text,
+                chunking_method=chunking_method,
+                embedding_model=embedding_model,
+                chunk_count=len(chunks),
+                vector_ids=vector_ids
+            )
+            for (file_hash, filename, text, chunks, _), vector_ids in zip(documents, vector_id_lists)
+        ]
+        db.add_all(file_records)
+        db.flush()
+        results = {file_hash: record for file_hash, record in known.items()}
+        results.update({record.content_hash: record for record in file_records})
+        new_hashes = {record.content_hash for record in file_records}
+        db.commit()
+        await self.vector_service.assign_files(
+            [
+                (record.vector_ids, record.id, record.filename, chunking_method, spans)
+                for record, (_, _, _, _, spans) in zip(file_records, documents)
+            ],
+            embedding_model
+        )
+
+        uploaded: List[FileUploadResponse] = []
+        failed: List[BatchUploadFailure] = []
+        for (filename, _), file_hash in zip(files, hashes):
+            if file_hash in failed_hashes:
+                failed.append(BatchUploadFailure(filename=filename, error=failed_hashes[file_hash]))
+                continue
+            if file_hash in new_hashes:
+                new_hashes.discard(file_hash)
+                message = "File uploaded and processed successfully"
+            else:
+                message = "File already processed, returning existing record"
+            record = results[file_hash]
+            uploaded.append(FileUploadResponse(
+                file_id=record.id,
+                filename=filename,
+                chunk_count=record.chunk_count,
+                chunking_method=chunking_method,
+                embedding_model=embedding_model,
+                message=message,
+                version=record.version
+            ))
+
+        return BatchUploadResponse(
+            files=uploaded,
+            failed=failed,
+            total_chunks=len(all_chunks)
+        )
+
+    @staticmethod
+    def _use_fused_embeddings(chunking_method: ChunkingMethod, embedding_model: EmbeddingModel) -> bool:
+        """Semantic chunking already encodes every sentence with the local
+        SentenceTransformer; when that is also the target embedding model, the
+        chunk embeddings are pooled from those sentence embeddings."""
+        return (
+            settings.FUSED_SEMANTIC_EMBEDDINGS
+            and chunking_method == ChunkingMethod.SEMANTIC
+            and embedding_model == EmbeddingModel.SENTENCE_TRANSFORMER
+        )
+
+    async def _embed_new_chunks(
+        self,
+        chunks: List[str],
+        embedding_model: EmbeddingModel
+    ) -> List[Optional[List[float]]]:
+        """Embed only chunks not already stored for this model.
+
+        Returns one entry per chunk: its embedding, or None when the vector
+        store already holds that content (see VectorService.store_embeddings).
+        Repeated chunks within `chunks` are embedded once.
+        """
+        point_ids = self.vector_service.chunk_point_ids(chunks, embedding_model)
+        known = await self.vector_service.find_existing_ids(point_ids, embedding_model)
+
+        positions: Dict[str, int] = {}
+        to_embed: List[str] = []
+        for chunk, point_id in zip(chunks, point_ids):
+            if point_id not in known and point_id not in positions:
+                positions[point_id] = len(to_embed)
+                to_embed.append(chunk)
+
+        new_embeddings = await self._embed_in_batches(to_embed, embedding_model)
+        return [
+            new_embeddings[positions[point_id]] if point_id in positions else None
+            for point_id in point_ids
+        ]
+
+    async def _embed_in_batches(self, chunks: List[str], embedding_model: EmbeddingModel) -> List[List[float]]:
+        batch_size = settings.EMBEDDING_BATCH_SIZE
+        embed_slots = asyncio.Semaphore(settings.INGESTION_EMBED_CONCURRENCY)
+
+        async def embed_batch(batch: List[str]) -> List[List[float]]:
+            async with embed_slots:
+                return await self.embedding_service.generate_embeddings(batch, embedding_model)
+
+        batches = await asyncio.gather(
+            *(embed_batch(chunks[i:i + batch_size]) for i in range(0, len(chunks), batch_size))
+        )
+        return [embedding for batch in batches for embedding in batch]
+
+    @staticmethod
+    def _report(job, stage: IngestionStage, status: StageStatus, completed: Optional[int] = None, total: Optional[int] = None):
+        if job is not None:
+            job.report(stage, status, completed=completed, total=total)
@@ -0,0 +1,149 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from collections import OrderedDict
+from datetime import datetime, timezone
+import asyncio
+import traceback
+import uuid
+from config.settings import settings
+from schemas import (
+    ChunkingMethod, EmbeddingModel, IngestionStage, JobStatus,
+    JobStatusResponse, StageProgress, StageStatus
+)
+
+
+class IngestionJob:
+    def __init__(self, filename: str, chunking_method: ChunkingMethod, embedding_model: EmbeddingModel):
+        self.job_id = str(uuid.uuid4())
+        self.filename = filename
+        self.chunking_method = chunking_method
+        self.embedding_model = embedding_model
+        self.status = JobStatus.QUEUED
+        self.current_stage: Optional[IngestionStage] = None
+        self.stages: Dict[IngestionStage, StageProgress] = {
+            stage: StageProgress() for stage in IngestionStage
+        }
+        self.file_id: Optional[int] = None
+        self.chunk_count: Optional[int] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.now(timezone.utc)
+        self.updated_at = self.created_at
+
+    def report(
+        self,
+        stage: IngestionStage,
+        status: StageStatus,
+        completed: Optional[int] = None,
+        total: Optional[int] = None,
+    ):
+        progress = self.stages[stage]
+        progress.status = status
+        if completed is not None:
+            progress.completed = completed
+        if total is not None:
+            progress.total = total
+        if status == StageStatus.RUNNING:
+            self.current_stage = stage
+        self.updated_at = datetime.now(timezone.utc)
+
+    def to_response(self) -> JobStatusResponse:
+        return JobStatusResponse(
+            job_id=self.job_id,
+            filename=self.filename,
+            status=self.status,
+            current_stage=self.current_stage,
+            stages={stage: progress.model_copy() for stage, progress in self.stages.items()},
+            chunking_method=self.chunking_method,
+            embedding_model=self.embedding_model,
+            file_id=self.file_id,
+            chunk_count=self.chunk_count,
+            error=self.error,
+            created_at=self.created_at,
+            updated_at=self.updated_at,
+        )
+
+
+JobHandler = Callable[..., Awaitable[Any]]
+
+
+class JobService:
+    """In-process ingestion queue drained by a fixed number of worker tasks.
+
+    The number of workers bounds how many documents are processed at once;
+    the queue size bounds how many uploads may wait (and how many raw file
+    payloads are held in memory). Job state lives in this process only.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = settings.INGESTION_MAX_CONCURRENCY,
+        max_queue_size: int = settings.INGESTION_QUEUE_SIZE,
+        retention: int = settings.INGESTION_JOB_RETENTION,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue_size = max_queue_size
+        self.retention = retention
+        self.jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._handler: Optional[JobHandler] = None
+
+    async def start(self, handler: JobHandler):
+        """Spawn the worker tasks. `handler(job, **payload)` runs one job."""
+        if self._workers:
+            return
+        self._handler = handler
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._workers = [
+            asyncio.create_task(self._worker(i)) for i in range(self.max_concurrency)
+        ]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, job: IngestionJob, **payload) -> IngestionJob:
+        """Enqueue a job. Raises asyncio.QueueFull when the backlog is at capacity."""
+        if self._queue is None:
+            raise RuntimeError("JobService has not been started")
+        self._queue.put_nowait((job, payload))
+        self.jobs[job.job_id] = job
+        self._prune()
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self.jobs.get(job_id)
+
+    async def _worker(self, worker_id: int):
+        while True:
+            job, payload = await self._queue.get()
+            job.status = JobStatus.RUNNING
+            job.updated_at = datetime.now(timezone.utc)
+            try:
+                await self._handler(job, **payload)
+                job.status = JobStatus.COMPLETED
+            except asyncio.CancelledError:
+                job.status = JobStatus.FAILED
+                job.error = "Job cancelled"
+                raise
+            except Exception as e:
+                print(f"[ERROR] Ingestion job {job.job_id} failed on worker {worker_id}: {e}")
+                traceback.print_exc()
+                job.status = JobStatus.FAILED
+                job.error = str(e)
+            finally:
+                job.updated_at = datetime.now(timezone.utc)
+                self._queue.task_done()
+
+    def _prune(self):
+        # Drop the oldest finished jobs once we hold more than `retention`.
+        excess = len(self.jobs) - self.retention
+        if excess <= 0:
+            return
+        for job_id in list(self.jobs.keys()):
+            if excess <= 0:
+                break
+            if self.jobs[job_id].status in (JobStatus.COMPLETED, JobStatus.FAILED):
+                del self.jobs[job_id]
+                excess -= 1
@@ -0,0 +1,660 @@
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+import asyncio
+import json
+import os
+import numpy as np
+from config.settings import settings
+from schemas import SimilarityAlgorithm
+from services.vector_store import VectorStore, VectorRecord, SearchHit, payload_matches, payload_values
+from services.vector_quantization import quantize, approximate_scores, top_candidates
+
+# A collection is compacted once it carries more dead rows (tombstones, or
+# superseded row journal entries) than live ones, and at least this many.
+COMPACT_MIN_ROWS = 1024
+
+
+def _grown(array: np.ndarray, capacity: int) -> np.ndarray:
+    grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+def _mapped(path: str, dtype, shape: Tuple[int, ...]) -> np.memmap:
+    """A writable memmap of `shape` over `path`, extending the file as needed."""
+    nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    with open(path, "ab") as f:
+        if f.tell() < nbytes:
+            f.truncate(nbytes)
+    return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+
+def _generation_files(directory: str, generation: int) -> Dict[str, str]:
+    return {
+        kind: os.path.join(directory, f"{kind}-{generation}.{extension}")
+        for kind, extension in (("vectors", "f32"), ("norms", "f32"), ("codes", "bin"), ("rows", "jsonl"))
+    }
+
+
+class _LocalCollection:
+    """Vectors of one collection as rows of a contiguous float32 matrix.
+
+    Rows are appended and grown by doubling; a deleted row is tombstoned
+    (its id set to None, cleared in the `live` mask) until the collection is
+    compacted, so row numbers stay stable for the HNSW labels. Row norms are
+    kept alongside for cosine search, and for a quantized collection also
+    the compressed `codes` of every row.
+
+    With a `directory`, the vectors, norms and codes are memmaps over that
+    generation's row files, so rows are written in place and growing the
+    matrix extends the files instead of copying it. Rows whose id or payload
+    changed since the last flush are listed in `dirty_rows`.
+
+    Indexed payload fields (see index_field) keep a row mask per value, so a
+    filter is a few boolean ORs and ANDs instead of a pass over the payloads.
+    """
+
+    def __init__(self, size: int, quantization: str = "none", directory: Optional[str] = None, generation: int = 0):
+        self.size = size
+        self.quantization = quantization
+        self.directory = directory
+        self.generation = generation
+        self.vectors = np.zeros((0, size), dtype=np.float32)
+        self.norms = np.zeros(0, dtype=np.float32)
+        self.codes = quantize(self.vectors, quantization)
+        self.live = np.zeros(0, dtype=bool)
+        self.value_masks: Dict[str, Dict[Any, np.ndarray]] = {}
+        self.ids: List[Optional[str]] = []
+        self.payloads: List[Optional[Dict[str, Any]]] = []
+        self.rows: Dict[str, int] = {}
+        self.hnsw = None
+        self.dirty_rows: Set[int] = set()
+        self.journal_entries = 0
+        # Bumped on every mutation, so a persisted graph can be matched
+        # against the vectors it was built from.
+        self.version = 0
+
+    @property
+    def used(self) -> int:
+        return len(self.ids)
+
+    def index_field(self, field: str):
+        if field in self.value_masks:
+            return
+        self.value_masks[field] = {}
+        for row, payload in enumerate(self.payloads):
+            if payload is not None:
+                self._set_values(field, row, payload.get(field), True)
+
+    def _index_payload(self, row: int, payload: Dict[str, Any], present: bool):
+        for field in self.value_masks:
+            self._set_values(field, row, payload.get(field), present)
+
+    def _set_values(self, field: str, row: int, value: Any, present: bool):
+        masks = self.value_masks[field]
+        for item in payload_values(value):
+            mask = masks.get(item)
+            if mask is None:
+                if not present:
+                    continue
+                mask = masks[item] = np.zeros(len(self.live), dtype=bool)
+            mask[row] = present
+
+    def live_mask(self, filters: Optional[Dict[str, Any]] = None) -> np.ndarray:
+        """Rows that hold a point and, with `filters`, whose payload matches."""
+        mask = self.live[:self.used]
+        for field, expected in (filters or {}).items():
+            masks = self.value_masks.get(field)
+            if masks is None:
+                matches = np.fromiter(
+                    (p is not None and payload_matches(p, {field: expected}) for p in self.payloads),
+                    dtype=bool, count=self.used,
+                )
+            else:
+                matches = np.zeros(self.used, dtype=bool)
+                wanted = expected if isinstance(expected, (list, tuple, set)) else [expected]
+                for value in wanted:
+                    value_mask = masks.get(value)
+                    if value_mask is not None:
+                        matches |= value_mask[:self.used]
+            mask = mask & matches
+        return mask
+
+    def set_payload(self, row: int, payload: Dict[str, Any]):
+        self._index_payload(row, self.payloads[row], False)
+        self.payloads[row] = payload
+        self._index_payload(row, payload, True)
+        self._touch(row)
+
+    def _touch(self, row: int):
+        if self.directory is not None:
+            self.dirty_rows.add(row)
+
+    def map_files(self, capacity: int):
+        """Point vectors, norms and codes at this generation's row files."""
+        files = _generation_files(self.directory, self.generation)
+        self.vectors = _mapped(files["vectors"], np.float32, (capacity, self.size))
+        self.norms = _mapped(files["norms"], np.float32, (capacity,))
+        if self.codes is not None:
+            self.codes = _mapped(files["codes"], self.codes.dtype, (capacity,) + self.codes.shape[1:])
+
+    def _resize(self, capacity: int):
+        if self.directory is not None:
+            self.map_files(capacity)
+        else:
+            self.vectors = _grown(self.vectors[:self.used], capacity)
+            self.norms = _grown(self.norms[:self.used], capacity)
+            if self.codes is not None:
+                self.codes = _grown(self.codes[:self.used], capacity)
+        self.live = _grown(self.live[:self.used], capacity)
+        for masks in self.value_masks.values():
+            for value, mask in masks.items():
+                masks[value] = _grown(mask[:self.used], capacity)
+
+    def upsert(self, records: List[VectorRecord]) -> List[int]:
+        new = sum(1 for r in records if r.id not in self.rows)
+        if self.used + new > len(self.vectors):
+            self._resize(max(self.used + new, 2 * len(self.vectors), 64))
+
+        touched = []
+        for record in records:
+            row = self.rows.get(record.id)
+            if row is None:
+                row = self.used
+                self.rows[record.id] = row
+                self.ids.append(record.id)
+                self.payloads.append(record.payload)
+                self.live[row] = True
+                self._index_payload(row, record.payload, True)
+                self._touch(row)
+            else:
+                self.set_payload(row, record.payload)
+            self.vectors[row] = record.vector
+            self.norms[row] = np.linalg.norm(self.vectors[row])
+            touched.append(row)
+
+        if self.codes is not None:
+            self.codes[touched] = quantize(self.vectors[touched], self.quantization)
+
+        if self.hnsw is not None:
+            if self.used > self.hnsw.get_max_elements():
+                self.hnsw.resize_index(max(self.used, 2 * self.hnsw.get_max_elements()))
+            self.hnsw.add_items(self.vectors[touched], np.asarray(touched))
+        return touched
+
+    def delete(self, ids: List[str]):
+        for point_id in ids:
+            row = self.rows.pop(point_id, None)
+            if row is None:
+                continue
+            self._index_payload(row, self.payloads[row], False)
+            self.ids[row] = None
+            self.payloads[row] = None
+            self.live[row] = False
+            self._touch(row)
+            if self.hnsw is not None:
+                self.hnsw.mark_deleted(row)
+
+    def needs_compaction(self) -> bool:
+        dead = self.used - len(self.rows)
+        if self.directory is not None:
+            dead = max(dead, self.journal_entries - len(self.rows))
+        return dead >= max(COMPACT_MIN_ROWS, len(self.rows))
+
+    def compact(self, keep: np.ndarray, generation: Optional[int] = None):
+        """Keep only the `keep` rows, renumbered from 0. In-memory
+        collections copy them; a persisted one switches to `generation`,
+        whose row files must already hold them. The graph is dropped, as its
+        labels are row numbers."""
+        ids = [self.ids[row] for row in keep]
+        payloads = [self.payloads[row] for row in keep]
+        if self.directory is not None:
+            self.generation = generation
+            self.map_files(max(len(keep), 64))
+        else:
+            self.vectors = self.vectors[keep]
+            self.norms = self.norms[keep]
+            if self.codes is not None:
+                self.codes = self.codes[keep]
+        self.ids, self.payloads = ids, payloads
+        self.rows = {point_id: row for row, point_id in enumerate(ids)}
+        self.live = np.zeros(len(self.vectors), dtype=bool)
+        self.live[:len(ids)] = True
+        for field in list(self.value_masks):
+            del self.value_masks[field]
+            self.index_field(field)
+        self.hnsw = None
+        self.dirty_rows = set()
+        self.journal_entries = len(ids)
+        self.version += 1
+
+    def build_hnsw(self):
+        import hnswlib
+
+        index = hnswlib.Index(space="cosine", dim=self.size)
+        index.init_index(
+            max_elements=max(self.used, 1),
+            ef_construction=settings.HNSW_EF_CONSTRUCTION,
+            M=settings.HNSW_M,
+        )
+        live = np.flatnonzero(self.live_mask())
+        if len(live):
+            index.add_items(self.vectors[live], live)
+        self.hnsw = index
+
+    def exact_search(
+        self,
+        queries: np.ndarray,
+        limit: int,
+        algorithm: SimilarityAlgorithm,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[List[tuple]]:
+        """Top-`limit` (row, score) pairs for each row of `queries`."""
+        limit = min(limit, len(self.rows))
+        if limit <= 0:
+            return [[] for _ in queries]
+        live = self.live_mask(filters)
+
+        if self.codes is None:
+            # One matrix product scores every query against every row.
+            scores = self._scores(self.vectors[:self.used], self.norms[:self.used], queries, algorithm)
+            scores[:, ~live] = -np.inf
+            rows = np.arange(self.used)
+            return [self._top(rows, query_scores, limit) for query_scores in scores]
+
+        results = []
+        for query in queries:
+            # Shortlist on the compressed codes, rescore with the originals.
+            approximate = approximate_scores(self.codes[:self.used], query, self.quantization)
+            approximate[~live] = -np.inf
+            rows = top_candidates(approximate, int(np.ceil(limit * settings.QUANTIZATION_OVERSAMPLING)))
+            rows = rows[np.isfinite(approximate[rows])]
+            scores = self._scores(self.vectors[rows], self.norms[rows], query[None, :], algorithm)[0]
+            results.append(self._top(rows, scores, limit))
+        return results
+
+    @staticmethod
+    def _scores(
+        vectors: np.ndarray, norms: np.ndarray, queries: np.ndarray, algorithm: SimilarityAlgorithm
+    ) -> np.ndarray:
+        dots = queries @ vectors.T
+        if algorithm == SimilarityAlgorithm.EUCLIDEAN:
+            squared = norms[None, :] ** 2 + np.einsum("ij,ij->i", queries, queries)[:, None] - 2 * dots
+            return 1.0 / (1.0 + np.sqrt(np.maximum(squared, 0.0)))
+        return dots / np.maximum(np.linalg.norm(queries, axis=1)[:, None] * norms[None, :], 1e-12)
+
+    @staticmethod
+    def _top(rows: np.ndarray, scores: np.ndarray, limit: int) -> List[tuple]:
+        top = top_candidates(scores, limit)
+        top = top[np.argsort(-scores[top])]
+        return [(int(rows[i]), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    def hnsw_search(self, queries: np.ndarray, limit: int) -> List[List[tuple]]:
+        limit = min(limit, len(self.rows))
+        if limit <= 0:
+            return [[] for _ in queries]
+        self.hnsw.set_ef(max(settings.HNSW_EF_SEARCH, limit))
+        labels, distances = self.hnsw.knn_query(queries, k=limit)
+        return [
+            [(int(row), 1.0 - float(distance)) for row, distance in zip(row_labels, row_distances)]
+            for row_labels, row_distances in zip(labels, distances)
+        ]
+
+
+class LocalVectorStore(VectorStore):
+    """In-process vector store: exact NumPy top-k, with an HNSW graph
+    (hnswlib) for cosine search once a collection reaches
+    LOCAL_HNSW_MIN_POINTS. Euclidean search never uses the graph. Quantized
+    collections skip it as well: they shortlist candidates on int8 or binary
+    codes and rescore them with the float32 vectors.
+
+    With `path`, each collection lives under `path/<name>/`:
+    - `vectors-<g>.f32`, `norms-<g>.f32` and `codes-<g>.bin`: raw row
+      files, memory-mapped, so a restart reads neither the matrix nor
+      recomputes norms and codes. Pages are read on first use, and the
+      originals of a quantized collection stay on disk apart from the
+      rescored rows, as with Qdrant's on_disk vectors.
+    - `rows-<g>.jsonl`: an append-only journal of (row, id, payload)
+      entries, replayed on load.
+    - `meta.json`: the row count, generation <g> and version.
+    - `hnsw.bin`.
+    Mutations only mark a collection dirty. LOCAL_VECTOR_STORE_FLUSH_SECONDS
+    later, a worker thread syncs the mapped pages, appends the journal
+    entries of the changed rows and rewrites the small meta.json. A write
+    costs the size of the change, not the size of the collection. Rows
+    updated in place are not crash-atomic. Deleted rows are tombstoned.
+    Once dead rows and superseded journal entries outnumber the live rows,
+    the next flush compacts the collection into a new generation and then
+    removes the old files. The graph is written when built and on close().
+    A graph older than the vectors is dropped on load and rebuilt on the
+    next search.
+
+    Without `path` everything stays in RAM, and quantization only speeds up
+    the scan: the float32 originals are kept next to the codes.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.collections: Dict[str, _LocalCollection] = {}
+        self._dirty: Set[str] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        if path:
+            os.makedirs(path, exist_ok=True)
+            for name in sorted(os.listdir(path)):
+                if os.path.exists(os.path.join(path, name, "meta.json")):
+                    self.collections[name] = self._load(name)
+
+    async def list_collections(self) -> Set[str]:
+        return set(self.collections)
+
+    async def create_collection(self, name: str, size: int, quantization: str = "none"):
+        if name not in self.collections:
+            directory = None
+            if self.path:
+                directory = self._collection_dir(name)
+                os.makedirs(directory, exist_ok=True)
+            self.collections[name] = _LocalCollection(size, quantization, directory)
+            self._mark_dirty(name)
+
+    async def count(self, name: str) -> int:
+        collection = self.collections.get(name)
+        return len(collection.rows) if collection else 0
+
+    async def retrieve_ids(self, name: str, ids: List[str]) -> Set[str]:
+        collection = self.collections.get(name)
+        if collection is None:
+            return set()
+        return {point_id for point_id in ids if point_id in collection.rows}
+
+    async def retrieve_payloads(self, name: str, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        collection = self.collections.get(name)
+        if collection is None:
+            return {}
+        return {point_id: collection.payloads[collection.rows[point_id]] for point_id in ids if point_id in collection.rows}
+
+    async def set_payload(self, name: str, ids: List[str], payload: Dict[str, Any]):
+        collection = self.collections.get(name)
+        if collection is None:
+            return
+        for point_id in ids:
+            row = collection.rows.get(point_id)
+            if row is not None:
+                collection.set_payload(row, {**collection.payloads[row], **payload})
+        self._mark_dirty(name)
+
+    async def create_payload_index(self, name: str, field: str, field_type: str):
+        collection = self.collections.get(name)
+        if collection is not None:
+            collection.index_field(field)
+
+    async def upsert(self, name: str, records: List[VectorRecord]):
+        if not records:
+            return
+        self.collections[name].upsert(records)
+        self._mark_dirty(name)
+
+    async def delete(self, name: str, ids: List[str]):
+        collection = self.collections.get(name)
+        if collection is None:
+            return
+        collection.delete(ids)
+        if collection.directory is None and collection.needs_compaction():
+            collection.compact(np.flatnonzero(collection.live_mask()))
+        self._mark_dirty(name)
+
+    async def scroll(self, name: str, batch_size: int = 1000) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        collection = self.collections.get(name)
+        if collection is None:
+            return
+        for point_id, payload in zip(list(collection.ids), list(collection.payloads)):
+            if point_id is not None:
+                yield point_id, payload
+
+    async def search(
+        self,
+        name: str,
+        vector: List[float],
+        limit: int,
+        algorithm: SimilarityAlgorithm = SimilarityAlgorithm.COSINE,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[SearchHit]:
+        return (await self.search_batch(name, [vector], limit, algorithm, filters))[0]
+
+    async def search_batch(
+        self,
+        name: str,
+        vectors: List[List[float]],
+        limit: int,
+        algorithm: SimilarityAlgorithm = SimilarityAlgorithm.COSINE,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[List[SearchHit]]:
+        collection = self.collections.get(name)
+        if collection is None:
+            return [[] for _ in vectors]
+        queries = np.asarray(vectors, dtype=np.float32)
+
+        # The graph holds full float32 vectors, so quantized collections skip
+        # it; filtered searches scan the matching rows exactly.
+        use_hnsw = (
+            algorithm == SimilarityAlgorithm.COSINE
+            and collection.codes is None
+            and not filters
+            and len(collection.rows) >= settings.LOCAL_HNSW_MIN_POINTS
+        )
+        if use_hnsw:
+            if collection.hnsw is None:
+                collection.build_hnsw()
+                self._save_hnsw(name)
+            results = collection.hnsw_search(queries, limit)
+        else:
+            results = collection.exact_search(queries, limit, algorithm, filters)
+
+        return [
+            [SearchHit(collection.ids[row], score, collection.payloads[row]) for row, score in rows]
+            for rows in results
+        ]
+
+    async def flush(self):
+        """Write every collection changed since the last flush."""
+        async with self._flush_lock:
+            dirty, self._dirty = self._dirty, set()
+            for name in sorted(dirty):
+                collection = self.collections[name]
+                if collection.needs_compaction() and await self._compact(name):
+                    continue
+                # Snapshot on the event loop; payload dicts are replaced,
+                # never mutated, so the entries can be serialized later.
+                rows, collection.dirty_rows = collection.dirty_rows, set()
+                entries = [(row, collection.ids[row], collection.payloads[row]) for row in sorted(rows)]
+                arrays = [a for a in (collection.vectors, collection.norms, collection.codes) if isinstance(a, np.memmap)]
+                try:
+                    await asyncio.to_thread(
+                        self._write, name, collection.generation, arrays, entries, self._meta(collection)
+                    )
+                    collection.journal_entries += len(entries)
+                except Exception as e:
+                    collection.dirty_rows |= rows
+                    print(f"[ERROR] Failed to persist local collection {name}: {e}")
+
+    async def _compact(self, name: str) -> bool:
+        """Rewrite the live rows of a collection as its next generation.
+
+        The rows are copied in a worker thread. The new generation is
+        swapped in only if the collection did not change meanwhile, and
+        meta.json is switched to it before the old files are removed.
+        """
+        collection = self.collections[name]
+        version, generation = collection.version, collection.generation + 1
+        keep = np.flatnonzero(collection.live_mask())
+        try:
+            await asyncio.to_thread(
+                self._write_generation, name, generation, keep,
+                collection.vectors, collection.norms, collection.codes, collection.ids, collection.payloads,
+            )
+        except Exception as e:
+            print(f"[ERROR] Failed to compact local collection {name}: {e}")
+            return False
+        if collection.version != version:
+            self._remove_generation(name, generation)
+            return False
+
+        old_generation = collection.generation
+        collection.compact(keep, generation)
+        try:
+            await asyncio.to_thread(self._write_meta, name, self._meta(collection, rows=len(keep)))
+        except Exception as e:
+            print(f"[ERROR] Failed to persist local collection {name}: {e}")
+            return True
+        self._remove_generation(name, old_generation)
+        for file_name in ("hnsw.bin", "hnsw.json"):
+            try:
+                os.remove(os.path.join(self._collection_dir(name), file_name))
+            except FileNotFoundError:
+                pass
+        return True
+
+    async def close(self):
+        await self.flush()
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+        for name in self.collections:
+            self._save_hnsw(name)
+
+    def _collection_dir(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _mark_dirty(self, name: str):
+        self.collections[name].version += 1
+        if not self.path:
+            return
+        self._dirty.add(name)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def _flush_later(self):
+        while self._dirty:
+            await asyncio.sleep(settings.LOCAL_VECTOR_STORE_FLUSH_SECONDS)
+            await self.flush()
+
+    @staticmethod
+    def _meta(collection: _LocalCollection, rows: Optional[int] = None) -> Dict[str, Any]:
+        return {
+            "size": collection.size,
+            "quantization": collection.quantization,
+            "version": collection.version,
+            "generation": collection.generation,
+            "rows": collection.used if rows is None else rows,
+        }
+
+    def _write(self, name: str, generation: int, arrays: List[np.memmap], entries: List[tuple], meta: Dict[str, Any]):
+        # Rows and journal entries are made durable before meta.json counts
+        # them, so a crash leaves the previous row count in place.
+        for array in arrays:
+            array.flush()
+        if entries:
+            with open(_generation_files(self._collection_dir(name), generation)["rows"], "a") as f:
+                f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+                f.flush()
+                os.fsync(f.fileno())
+        self._write_meta(name, meta)
+
+    def _write_meta(self, name: str, meta: Dict[str, Any]):
+        directory = self._collection_dir(name)
+        meta_tmp = os.path.join(directory, "meta.json.tmp")
+        with open(meta_tmp, "w") as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(meta_tmp, os.path.join(directory, "meta.json"))
+
+    def _write_generation(
+        self,
+        name: str,
+        generation: int,
+        keep: np.ndarray,
+        vectors: np.ndarray,
+        norms: np.ndarray,
+        codes: Optional[np.ndarray],
+        ids: List[Optional[str]],
+        payloads: List[Optional[Dict[str, Any]]],
+    ):
+        files = _generation_files(self._collection_dir(name), generation)
+        arrays = [("vectors", vectors), ("norms", norms)] + ([("codes", codes)] if codes is not None else [])
+        for kind, array in arrays:
+            with open(files[kind], "wb") as f:
+                np.ascontiguousarray(array[keep]).tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+        with open(files["rows"], "w") as f:
+            for new_row, row in enumerate(keep):
+                f.write(json.dumps((new_row, ids[row], payloads[row])) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _remove_generation(self, name: str, generation: int):
+        for file_path in _generation_files(self._collection_dir(name), generation).values():
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+
+    def _save_hnsw(self, name: str):
+        collection = self.collections[name]
+        if not self.path or collection.hnsw is None:
+            return
+        directory = self._collection_dir(name)
+        os.makedirs(directory, exist_ok=True)
+        collection.hnsw.save_index(os.path.join(directory, "hnsw.bin"))
+        with open(os.path.join(directory, "hnsw.json"), "w") as f:
+            json.dump({"version": collection.version}, f)
+
+    def _load(self, name: str) -> _LocalCollection:
+        directory = self._collection_dir(name)
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+
+        collection = _LocalCollection(
+            meta["size"], meta.get("quantization", "none"), directory, meta.get("generation", 0)
+        )
+        used = meta.get("rows", 0)
+        collection.ids = [None] * used
+        collection.payloads = [None] * used
+        files = _generation_files(directory, collection.generation)
+        if os.path.exists(files["rows"]):
+            with open(files["rows"]) as f:
+                for line in f:
+                    try:
+                        row, point_id, payload = json.loads(line)
+                    except ValueError:
+                        # A torn last entry from a crash mid-append.
+                        continue
+                    collection.journal_entries += 1
+                    if row < used:
+                        collection.ids[row] = point_id
+                        collection.payloads[row] = payload
+        collection.rows = {point_id: row for row, point_id in enumerate(collection.ids) if point_id is not None}
+
+        stored = os.path.getsize(files["vectors"]) // (4 * collection.size) if os.path.exists(files["vectors"]) else 0
+        capacity = max(stored, used)
+        if capacity:
+            collection.map_files(capacity)
+        collection.live = np.zeros(capacity, dtype=bool)
+        collection.live[:used] = [point_id is not None for point_id in collection.ids]
+
+        collection.version = meta.get("version", 0)
+        hnsw_path = os.path.join(directory, "hnsw.bin")
+        if os.path.exists(hnsw_path) and self._hnsw_version(directory) == collection.version:
+            import hnswlib
+
+            index = hnswlib.Index(space="cosine", dim=collection.size)
+            index.load_index(hnsw_path, max_elements=max(collection.used, 1))
+            collection.hnsw = index
+        return collection
+
+    @staticmethod
+    def _hnsw_version(directory: str) -> Optional[int]:
+        try:
+            with open(os.path.join(directory, "hnsw.json")) as f:
+                return json.load(f).get("version")
+        except (OSError, ValueError):
+            return None
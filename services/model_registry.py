@@ -0,0 +1,105 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+import os
+import threading
+import numpy as np
+from sentence_transformers import SentenceTransformer
+from config.settings import settings
+
+
+def _load_onnx_model(model_name: str, device: str, quantization: str) -> SentenceTransformer:
+    """Load `model_name` on the ONNX Runtime backend.
+
+    With `quantization`, the int8 dynamically quantized graph for that CPU
+    profile is used: the published `onnx/model_qint8_<profile>.onnx` if the
+    model repo ships one, otherwise it is exported once into
+    ONNX_EXPORT_DIR and loaded from there on later starts.
+    """
+    if not quantization:
+        return SentenceTransformer(model_name, device=device, backend="onnx")
+
+    file_name = f"onnx/model_qint8_{quantization}.onnx"
+    export_dir = os.path.join(settings.ONNX_EXPORT_DIR, model_name.replace("/", "__"))
+    if os.path.exists(os.path.join(export_dir, file_name)):
+        return SentenceTransformer(export_dir, device=device, backend="onnx", model_kwargs={"file_name": file_name})
+
+    try:
+        return SentenceTransformer(model_name, device=device, backend="onnx", model_kwargs={"file_name": file_name})
+    except Exception as e:
+        print(f"[WARN] No published {file_name} for {model_name} ({e}); quantizing locally...")
+
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    model = SentenceTransformer(model_name, device=device, backend="onnx")
+    model.save(export_dir)
+    export_dynamic_quantized_onnx_model(model, quantization, export_dir)
+    return SentenceTransformer(export_dir, device=device, backend="onnx", model_kwargs={"file_name": file_name})
+
+
+class ModelRegistry:
+    """Process-wide cache of SentenceTransformer models.
+
+    Each (model name, device, backend) is loaded once, on first use or during
+    `warm_up`, and the same instance is shared by every service. The backend
+    is "torch" (PyTorch) or "onnx" (ONNX Runtime, optionally int8 quantized
+    per ONNX_QUANTIZATION).
+    """
+
+    def __init__(self):
+        self._models: Dict[Tuple[str, str, str], SentenceTransformer] = {}
+        self._lock = threading.Lock()
+
+    def get_sentence_transformer(
+        self,
+        model_name: str = settings.SENTENCE_TRANSFORMER_MODEL,
+        device: str = settings.SENTENCE_TRANSFORMER_DEVICE,
+        backend: str = settings.SENTENCE_TRANSFORMER_BACKEND,
+    ) -> SentenceTransformer:
+        key = (model_name, device, backend)
+        model = self._models.get(key)
+        if model is None:
+            with self._lock:
+                model = self._models.get(key)
+                if model is None:
+                    print(f"Loading SentenceTransformer {model_name} on {device} ({backend})...")
+                    if backend == "torch":
+                        model = SentenceTransformer(model_name, device=device)
+                    elif backend == "onnx":
+                        model = _load_onnx_model(model_name, device, settings.ONNX_QUANTIZATION)
+                    else:
+                        raise ValueError(f"Unsupported SentenceTransformer backend: {backend}")
+                    self._models[key] = model
+        return model
+
+    def warm_up(self, model_names: Optional[Iterable[str]] = None):
+        for model_name in model_names or [settings.SENTENCE_TRANSFORMER_MODEL]:
+            self.get_sentence_transformer(model_name)
+
+    def loaded_models(self) -> Dict[str, str]:
+        return {name: f"{device}/{backend}" for name, device, backend in self._models}
+
+
+def backend_parity(
+    texts: List[str],
+    backend: str = "onnx",
+    reference_backend: str = "torch",
+    model_name: str = settings.SENTENCE_TRANSFORMER_MODEL,
+    registry: Optional[ModelRegistry] = None,
+) -> Dict[str, float]:
+    """Cosine similarity between the embeddings two backends produce for `texts`.
+
+    Run this after switching SENTENCE_TRANSFORMER_BACKEND or ONNX_QUANTIZATION
+    (vectors already stored were made by the old backend); a min_cosine well
+    above 0.99 means existing vectors remain comparable with new queries.
+    """
+    registry = registry or model_registry
+    reference = registry.get_sentence_transformer(model_name, backend=reference_backend).encode(
+        texts, convert_to_numpy=True, normalize_embeddings=True
+    )
+    candidate = registry.get_sentence_transformer(model_name, backend=backend).encode(
+        texts, convert_to_numpy=True, normalize_embeddings=True
+    )
+    cosines = np.einsum("ij,ij->i", reference, candidate)
+    return {"min_cosine": float(cosines.min()), "mean_cosine": float(cosines.mean())}
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,207 @@
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+import asyncio
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, PointIdsList,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+    BinaryQuantization, BinaryQuantizationConfig,
+    SearchParams, QuantizationSearchParams, QueryRequest,
+    Filter, FieldCondition, MatchValue, MatchAny, PayloadSchemaType,
+    SetPayload, SetPayloadOperation,
+)
+from config.settings import settings
+from schemas import SimilarityAlgorithm
+from services.vector_store import VectorStore, VectorRecord, SearchHit, cosine_to_euclidean_score
+
+
+class QdrantVectorStore(VectorStore):
+    """Collections in a Qdrant server (or an in-process ":memory:" client).
+
+    One AsyncQdrantClient is shared per store, so all requests reuse its
+    connection pool (QDRANT_POOL_SIZE connections; gRPC with
+    QDRANT_PREFER_GRPC).
+
+    Collections use cosine distance, and Qdrant stores cosine vectors
+    unit-normalized, so Euclidean search ranks like cosine. Its scores are
+    derived from the cosine ones.
+
+    Quantized collections keep the compressed vectors in RAM and the
+    originals on disk; searches oversample on the compressed vectors and
+    rescore with the originals.
+
+    Upserts are split into QDRANT_UPSERT_BATCH_SIZE-point requests, with up
+    to QDRANT_UPSERT_PARALLELISM in flight, so large documents neither build
+    one huge request nor wait on each batch in turn.
+    """
+
+    def __init__(self, url: str, client: AsyncQdrantClient = None):
+        if client is None:
+            if url == ":memory:":
+                client = AsyncQdrantClient(location=":memory:")
+            else:
+                client = AsyncQdrantClient(
+                    url=url,
+                    prefer_grpc=settings.QDRANT_PREFER_GRPC,
+                    pool_size=settings.QDRANT_POOL_SIZE,
+                    timeout=settings.QDRANT_TIMEOUT,
+                )
+        self.client = client
+
+    async def list_collections(self) -> Set[str]:
+        return {c.name for c in (await self.client.get_collections()).collections}
+
+    async def create_collection(self, name: str, size: int, quantization: str = "none"):
+        if not await self.client.collection_exists(name):
+            await self.client.create_collection(
+                collection_name=name,
+                vectors_config=VectorParams(size=size, distance=Distance.COSINE, on_disk=quantization != "none"),
+                quantization_config=self._quantization_config(quantization)
+            )
+
+    @staticmethod
+    def _quantization_config(quantization: str):
+        if quantization == "scalar":
+            return ScalarQuantization(
+                scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+            )
+        elif quantization == "binary":
+            return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+        elif quantization == "none":
+            return None
+        raise ValueError(f"Unsupported vector quantization: {quantization}")
+
+    async def count(self, name: str) -> int:
+        return (await self.client.count(name, exact=False)).count
+
+    async def retrieve_ids(self, name: str, ids: List[str]) -> Set[str]:
+        records = await self.client.retrieve(
+            collection_name=name,
+            ids=list(set(ids)),
+            with_payload=False,
+            with_vectors=False
+        )
+        return {str(record.id) for record in records}
+
+    async def retrieve_payloads(self, name: str, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        records = await self.client.retrieve(
+            collection_name=name,
+            ids=list(set(ids)),
+            with_payload=True,
+            with_vectors=False
+        )
+        return {str(record.id): record.payload for record in records}
+
+    async def upsert(self, name: str, records: List[VectorRecord]):
+        batch_size = settings.QDRANT_UPSERT_BATCH_SIZE
+        slots = asyncio.Semaphore(settings.QDRANT_UPSERT_PARALLELISM)
+
+        async def send(batch: List[VectorRecord]):
+            async with slots:
+                await self.client.upsert(
+                    collection_name=name,
+                    points=[PointStruct(id=r.id, vector=r.vector, payload=r.payload) for r in batch]
+                )
+
+        await asyncio.gather(*(send(records[i:i + batch_size]) for i in range(0, len(records), batch_size)))
+
+    async def set_payload(self, name: str, ids: List[str], payload: Dict[str, Any]):
+        await self.client.set_payload(collection_name=name, payload=payload, points=ids)
+
+    async def set_payloads(self, name: str, updates: List[Tuple[List[str], Dict[str, Any]]]):
+        operations = [SetPayloadOperation(set_payload=SetPayload(payload=payload, points=ids)) for ids, payload in updates]
+        batch_size = settings.QDRANT_UPSERT_BATCH_SIZE
+        for i in range(0, len(operations), batch_size):
+            await self.client.batch_update_points(collection_name=name, update_operations=operations[i:i + batch_size])
+
+    async def create_payload_index(self, name: str, field: str, field_type: str):
+        await self.client.create_payload_index(
+            collection_name=name,
+            field_name=field,
+            field_schema=PayloadSchemaType(field_type)
+        )
+
+    async def delete(self, name: str, ids: List[str]):
+        await self.client.delete(
+            collection_name=name,
+            points_selector=PointIdsList(points=ids)
+        )
+
+    async def scroll(self, name: str, batch_size: int = 1000) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        offset = None
+        while True:
+            points, offset = await self.client.scroll(
+                collection_name=name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False
+            )
+            for point in points:
+                yield str(point.id), point.payload
+            if offset is None:
+                break
+
+    async def search(
+        self,
+        name: str,
+        vector: List[float],
+        limit: int,
+        algorithm: SimilarityAlgorithm = SimilarityAlgorithm.COSINE,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[SearchHit]:
+        response = await self.client.query_points(
+            collection_name=name,
+            query=vector,
+            limit=limit,
+            query_filter=self._filter(filters),
+            search_params=self._search_params(),
+            with_payload=True
+        )
+        return self._hits(response.points, algorithm)
+
+    async def search_batch(
+        self,
+        name: str,
+        vectors: List[List[float]],
+        limit: int,
+        algorithm: SimilarityAlgorithm = SimilarityAlgorithm.COSINE,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[List[SearchHit]]:
+        query_filter = self._filter(filters)
+        responses = await self.client.query_batch_points(
+            collection_name=name,
+            requests=[
+                QueryRequest(
+                    query=vector, limit=limit, filter=query_filter, params=self._search_params(), with_payload=True
+                )
+                for vector in vectors
+            ]
+        )
+        return [self._hits(response.points, algorithm) for response in responses]
+
+    @staticmethod
+    def _filter(filters: Optional[Dict[str, Any]]) -> Optional[Filter]:
+        if not filters:
+            return None
+        conditions = []
+        for field, value in filters.items():
+            if isinstance(value, (list, tuple, set)):
+                conditions.append(FieldCondition(key=field, match=MatchAny(any=list(value))))
+            else:
+                conditions.append(FieldCondition(key=field, match=MatchValue(value=value)))
+        return Filter(must=conditions)
+
+    @staticmethod
+    def _search_params() -> SearchParams:
+        return SearchParams(
+            quantization=QuantizationSearchParams(rescore=True, oversampling=settings.QUANTIZATION_OVERSAMPLING)
+        )
+
+    @staticmethod
+    def _hits(points, algorithm: SimilarityAlgorithm) -> List[SearchHit]:
+        if algorithm == SimilarityAlgorithm.EUCLIDEAN:
+            return [SearchHit(str(p.id), cosine_to_euclidean_score(p.score), p.payload) for p in points]
+        return [SearchHit(str(p.id), p.score, p.payload) for p in points]
+
+    async def close(self):
+        await self.client.close()
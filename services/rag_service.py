@@ -1,26 +1,98 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
+from contextvars import ContextVar
 import json
+import re
 import uuid
 from datetime import datetime
 from langchain.agents import Tool, AgentExecutor, create_react_agent
 from langchain.prompts import PromptTemplate
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.memory import ConversationBufferWindowMemory
 from langchain_community.utilities import PythonREPL
-from services.vector_service import VectorService
+from services.vector_service import VectorService, HIT_FILENAME_LIMIT
 from services.embedding_service import EmbeddingService
-from schemas import EmbeddingModel, SimilarityAlgorithm, LLMModel
+from schemas import EmbeddingModel, SimilarityAlgorithm, LLMModel, SearchMode, QueryMode
+from services.bm25_index import reciprocal_rank_fusion
+from services.answer_cache import AnswerCache
+from config.settings import settings
 import redis
+import redis.asyncio as aioredis
 import os
 import asyncio
 
+MAX_SEARCH_QUERIES = 5
+FINAL_ANSWER_MARKER = "Final Answer:"
+
+# Signs that a question needs the agent's tools rather than one retrieval:
+# arithmetic, references to the earlier conversation, comparisons.
+_AGENT_HINTS = re.compile(
+    r"\b(calculate|compute|sum|total|average|mean|percent(age)?|how many|compare|comparison|difference"
+    r"|versus|vs|earlier|previous(ly)?|you said|last time|step by step)\b"
+    r"|\d\s*[-+*/^%]\s*\d",
+    re.IGNORECASE,
+)
+
+
+def choose_query_mode(query: str) -> QueryMode:
+    """Route a question for QueryMode.AUTO: plain document lookups go to the
+    direct path, questions that look multi-step (agent hints above, several
+    questions at once, or very long) go to the agent."""
+    if _AGENT_HINTS.search(query) or query.count("?") > 1 or len(query.split()) > 40:
+        return QueryMode.AGENT
+    return QueryMode.DIRECT
+
+
+class QueryContext:
+    """Per-query state read and written by the agent's tools.
+
+    The agent executors and tools are shared by every request, so this lives
+    in a context variable rather than on RAGService: each process_query call
+    (and the tool calls it makes) sees only its own context.
+    """
+    __slots__ = ("session_id", "similarity_algorithm", "search_mode", "filters", "sources")
+
+    def __init__(
+        self,
+        session_id: str,
+        similarity_algorithm: SimilarityAlgorithm = SimilarityAlgorithm.COSINE,
+        search_mode: SearchMode = SearchMode.DENSE,
+        filters: Optional[Dict[str, Any]] = None,
+    ):
+        self.session_id = session_id
+        self.similarity_algorithm = similarity_algorithm
+        self.search_mode = search_mode
+        self.filters = filters
+        self.sources: List[str] = []
+
+
+_query_context: ContextVar[Optional[QueryContext]] = ContextVar("query_context", default=None)
+
+
+def current_query_context() -> QueryContext:
+    context = _query_context.get()
+    if context is None:
+        raise RuntimeError("No query in progress; tools must be called through RAGService.process_query")
+    return context
+
 
 class RAGService:
-    def __init__(self):
-        self.vector_service = VectorService()
-        self.embedding_service = EmbeddingService()
+    def __init__(
+        self,
+        vector_service: VectorService = None,
+        embedding_service: EmbeddingService = None,
+        answer_cache: AnswerCache = None,
+    ):
+        self.vector_service = vector_service or VectorService()
+        self.embedding_service = embedding_service or EmbeddingService()
+        if answer_cache is None and settings.ANSWER_CACHE_ENABLED:
+            answer_cache = AnswerCache(aioredis.from_url(settings.REDIS_URL))
+        self.answer_cache = answer_cache
+        if answer_cache is not None:
+            # Cached answers are stale once documents are stored or removed.
+            self.vector_service.change_listeners.append(answer_cache.invalidate)
         self.redis_client = redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379"))
         self.python_repl = PythonREPL()
+        self._llms: Dict[LLMModel, Any] = {}
+        self._agents: Dict[LLMModel, AgentExecutor] = {}
 
         self.tools = [
             Tool(
@@ -31,7 +103,8 @@ class RAGService:
                     "Search for relevant documents based on a query. "
                     "This tool is useful for finding information within documents such as CVs, "
                     "project descriptions, technical papers, or any other textual data. "
-                    "Input should be a search query string relevant to the document content."
+                    "Input should be a search query string relevant to the document content. "
+                    "To look up several things at once, put one query per line."
                 ),
             ),
             Tool(
@@ -78,6 +151,21 @@ class RAGService:
             ],
         )
 
+        self.direct_prompt = PromptTemplate(
+            template="""Answer the question using the documents below. If they do not contain the answer, say so.
+                    Documents:
+                    {context}
+                    Previous conversation history:
+                    {chat_history}
+                    Question: {input}
+                    Answer:""",
+            input_variables=[
+                "input",
+                "context",
+                "chat_history",
+            ],
+        )
+
     async def process_query(
         self,
         query: str,
@@ -85,118 +173,374 @@ class RAGService:
         use_memory: bool = True,
         similarity_algorithm: SimilarityAlgorithm = SimilarityAlgorithm.COSINE,
         llm_model: LLMModel = LLMModel.GEMINI_FLASH_LARGE,
+        search_mode: SearchMode = SearchMode.DENSE,
+        filters: Dict[str, Any] = None,
+        mode: QueryMode = QueryMode.AGENT,
     ) -> Dict[str, Any]:
+        """Answer `query` with the ReAct agent (QueryMode.AGENT), or with one
+        retrieval and a single LLM call (QueryMode.DIRECT); QueryMode.AUTO
+        picks one with choose_query_mode. A direct query whose retrieval
+        fails is answered by the agent instead.
+
+        A question close enough to one answered before with the same
+        settings is answered from the answer cache without any LLM call.
+        """
 
         if not session_id:
             session_id = str(uuid.uuid4())
+        if mode == QueryMode.AUTO:
+            mode = choose_query_mode(query)
 
-        self.current_session_id = session_id
-        self.current_similarity_algorithm = similarity_algorithm
-
-        # LLM
-        llm = ChatGoogleGenerativeAI(
-            model=llm_model.value,
-            temperature=0,
-            google_api_key=os.getenv("GEMINI_API_KEY"),
-        )
+        inputs = self._prompt_inputs(query, session_id, use_memory)
         print(
-            f"Using LLM: {llm.model} "
+            f"Using LLM: {llm_model.value} "
             f"| session: {session_id} "
-            f"| similarity: {similarity_algorithm.value}"
+            f"| similarity: {similarity_algorithm.value} "
+            f"| mode: {mode.value}"
         )
 
-        # Memory
-        memory = None
-        if use_memory:
-            memory = ConversationBufferWindowMemory(
-                k=5,
-                memory_key="chat_history",
-                return_messages=True,
-            )
-            history = self._load_conversation_history(session_id)
-            for entry in history:
-                memory.save_context(
-                    {"input": entry["input"]},
-                    {"output": entry["output"]},
-                )
-
-        # Agent
-        agent_final_prompt = PromptTemplate(
-            template=self.agent_prompt.template,
-            input_variables=[
-                "input",
-                "agent_scratchpad",
-                "chat_history",
-            ]
-        )
-
-        agent = create_react_agent(
-            llm,
-            self.tools,
-            agent_final_prompt
-        )
-        agent_executor = AgentExecutor(
-            agent=agent,
-            tools=self.tools,
-            memory=memory,
-            verbose=True,
-            handle_parsing_errors=True,
-            max_iterations=5,
-            early_stopping_method="force",
-        )
+        scope = self._answer_scope(llm_model, similarity_algorithm, search_mode, filters, mode)
+        embedding, cached = await self._cached_answer(query, inputs, scope)
+        if cached is not None:
+            if use_memory:
+                self._save_conversation_history(session_id, query, cached["answer"])
+            return {
+                "answer": cached["answer"],
+                "sources": cached["sources"],
+                "session_id": session_id,
+            }
 
+        context = QueryContext(session_id, similarity_algorithm, search_mode, filters)
+        token = _query_context.set(context)
         try:
-            result = await agent_executor.ainvoke({"input": query})
+            documents = await self._direct_context(query) if mode == QueryMode.DIRECT else None
+            if documents is not None:
+                prompt = self.direct_prompt.format(context=documents, **inputs)
+                answer = (await self._get_llm(llm_model).ainvoke(prompt)).content
+            else:
+                answer = (await self._get_agent(llm_model).ainvoke(inputs))["output"]
         except Exception as e:
-            print(f"[ERROR] Error processing query in AgentExecutor: {e}")
+            print(f"[ERROR] Error processing query in {mode.value} mode: {e}")
             raise
+        finally:
+            _query_context.reset(token)
 
         # Persist conversation
         if use_memory:
-            self._save_conversation_history(session_id, query, result["output"])
+            self._save_conversation_history(session_id, query, answer)
+        await self._cache_answer(scope, query, embedding, answer, context.sources)
 
         return {
-            "answer": result["output"],
-            "sources": getattr(self, "_last_sources", []),
+            "answer": answer,
+            "sources": context.sources,
             "session_id": session_id,
         }
 
-    async def _search_documents(self, query: str) -> str:
+    async def stream_query(
+        self,
+        query: str,
+        session_id: str = None,
+        use_memory: bool = True,
+        similarity_algorithm: SimilarityAlgorithm = SimilarityAlgorithm.COSINE,
+        llm_model: LLMModel = LLMModel.GEMINI_FLASH_LARGE,
+        search_mode: SearchMode = SearchMode.DENSE,
+        filters: Dict[str, Any] = None,
+        mode: QueryMode = QueryMode.AGENT,
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Answer like process_query, yielding (event, data) pairs as it goes:
+
+        - ``tool``: a tool call is starting (tool name and input)
+        - ``sources``: the sources found by a document search
+        - ``token``: a piece of the final answer, as the LLM generates it
+        - ``answer``: the complete answer, sources and session id, once the
+          exchange has been saved to conversation memory
+        """
+        if not session_id:
+            session_id = str(uuid.uuid4())
+        if mode == QueryMode.AUTO:
+            mode = choose_query_mode(query)
+
+        inputs = self._prompt_inputs(query, session_id, use_memory)
+
+        scope = self._answer_scope(llm_model, similarity_algorithm, search_mode, filters, mode)
+        embedding, cached = await self._cached_answer(query, inputs, scope)
+        if cached is not None:
+            if use_memory:
+                self._save_conversation_history(session_id, query, cached["answer"])
+            yield "sources", {"sources": cached["sources"]}
+            yield "token", {"text": cached["answer"]}
+            yield "answer", {"answer": cached["answer"], "sources": cached["sources"], "session_id": session_id}
+            return
+
+        context = QueryContext(session_id, similarity_algorithm, search_mode, filters)
+        token = _query_context.set(context)
+        try:
+            documents = await self._direct_context(query) if mode == QueryMode.DIRECT else None
+            if documents is not None:
+                prompt = self.direct_prompt.format(context=documents, **inputs)
+                yield "sources", {"sources": context.sources}
+                answer = ""
+                async for chunk in self._get_llm(llm_model).astream(prompt):
+                    if isinstance(chunk.content, str) and chunk.content:
+                        answer += chunk.content
+                        yield "token", {"text": chunk.content}
+            else:
+                async for event, data in self._stream_agent(self._get_agent(llm_model), inputs, context):
+                    if event == "answer":
+                        answer = data
+                    else:
+                        yield event, data
+        except Exception as e:
+            print(f"[ERROR] Error streaming query in {mode.value} mode: {e}")
+            raise
+        finally:
+            _query_context.reset(token)
+
+        if use_memory and answer is not None:
+            self._save_conversation_history(session_id, query, answer)
+        if answer is not None:
+            await self._cache_answer(scope, query, embedding, answer, context.sources)
 
+        yield "answer", {"answer": answer, "sources": context.sources, "session_id": session_id}
+
+    @staticmethod
+    async def _stream_agent(
+        agent_executor: AgentExecutor,
+        inputs: Dict[str, str],
+        context: QueryContext,
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        # Yields the tool, sources and token events of an agent run, then
+        # ("answer", final output).
+        # The ReAct LLM writes its reasoning before the answer, so the
+        # text of each LLM run is only streamed from the final answer
+        # marker on.
+        generated: Dict[str, str] = {}
+        streamed: Dict[str, int] = {}
+        answer = None
+        async for event in agent_executor.astream_events(inputs, version="v2"):
+            kind = event["event"]
+            if kind == "on_chat_model_stream":
+                text = event["data"]["chunk"].content
+                if not isinstance(text, str) or not text:
+                    continue
+                run_id = event["run_id"]
+                generated[run_id] = generated.get(run_id, "") + text
+                marker = generated[run_id].find(FINAL_ANSWER_MARKER)
+                if marker < 0:
+                    continue
+                answer_text = generated[run_id][marker + len(FINAL_ANSWER_MARKER):].lstrip()
+                if len(answer_text) > streamed.get(run_id, 0):
+                    yield "token", {"text": answer_text[streamed.get(run_id, 0):]}
+                    streamed[run_id] = len(answer_text)
+            elif kind == "on_chain_stream" and not event.get("parent_ids"):
+                # The executor's own steps: tool calls chosen by the
+                # agent, their results, and the final output.
+                chunk = event["data"]["chunk"]
+                for action in chunk.get("actions", []):
+                    yield "tool", {"tool": action.tool, "input": action.tool_input}
+                for step in chunk.get("steps", []):
+                    if step.action.tool == "document_search":
+                        yield "sources", {"sources": context.sources}
+                if "output" in chunk:
+                    answer = chunk["output"]
+        yield "answer", answer
+
+    @staticmethod
+    def _answer_scope(
+        llm_model: LLMModel,
+        similarity_algorithm: SimilarityAlgorithm,
+        search_mode: SearchMode,
+        filters: Optional[Dict[str, Any]],
+        mode: QueryMode,
+    ) -> str:
+        return AnswerCache.make_scope(
+            llm_model=llm_model.value,
+            similarity_algorithm=similarity_algorithm.value,
+            search_mode=search_mode.value,
+            filters=filters,
+            mode=mode.value,
+        )
+
+    async def _cached_answer(
+        self, query: str, inputs: Dict[str, str], scope: str
+    ) -> Tuple[Optional[List[float]], Optional[Dict[str, Any]]]:
+        # Returns the query embedding (None when the cache is not used) and
+        # the cached answer, if any. An answer given with conversation
+        # history may depend on it, so only standalone questions are cached.
+        if self.answer_cache is None or inputs["chat_history"]:
+            return None, None
         try:
-            embeddings = await self.embedding_service.generate_embeddings(
-                [query], EmbeddingModel.GEMINI
+            [embedding] = await self.embedding_service.generate_embeddings(
+                [query], EmbeddingModel(settings.ANSWER_CACHE_EMBEDDING_MODEL)
             )
-            query_embedding = embeddings[0]
+        except Exception as e:
+            print(f"[WARN] Answer cache skipped, query embedding failed: {e}")
+            return None, None
+        cached = await self.answer_cache.get(scope, embedding)
+        if cached is not None:
+            print(f"Answer cache hit (similarity {cached['similarity']:.3f}): {cached['query']}")
+        return embedding, cached
+
+    async def _cache_answer(
+        self, scope: str, query: str, embedding: Optional[List[float]], answer: str, sources: List[str]
+    ):
+        # Only answers grounded in retrieved documents are cached, not ones
+        # where the search failed or the agent gave up.
+        if embedding is not None and sources:
+            await self.answer_cache.set(scope, query, embedding, answer, sources)
 
-            results = self.vector_service.search_similar(
-                query_embedding,
-                limit=5,
-                algorithm=getattr(self, "current_similarity_algorithm", SimilarityAlgorithm.COSINE),
+    def answer_cache_stats(self) -> Dict[str, float]:
+        return self.answer_cache.stats() if self.answer_cache is not None else {}
+
+    def _prompt_inputs(self, query: str, session_id: str, use_memory: bool) -> Dict[str, str]:
+        # Memory: the last exchanges are passed as input, so the pooled
+        # executors and clients themselves hold no per-session state.
+        chat_history = ""
+        if use_memory:
+            chat_history = self._format_chat_history(self._load_conversation_history(session_id))
+        return {"input": query, "chat_history": chat_history}
+
+    def _get_agent(self, llm_model: LLMModel) -> AgentExecutor:
+        """The agent executor for `llm_model`, built on first use and reused
+        by every later request, along with its LLM client and connections."""
+        agent_executor = self._agents.get(llm_model)
+        if agent_executor is None:
+            agent = create_react_agent(self._get_llm(llm_model), self.tools, self.agent_prompt)
+            agent_executor = AgentExecutor(
+                agent=agent,
+                tools=self.tools,
+                verbose=True,
+                handle_parsing_errors=True,
+                max_iterations=5,
+                early_stopping_method="force",
             )
+            self._agents[llm_model] = agent_executor
+        return agent_executor
 
-            self._last_sources = [
-                f"{r['filename']} (chunk {r['chunk_index']})" for r in results
-            ]
+    def _get_llm(self, llm_model: LLMModel):
+        llm = self._llms.get(llm_model)
+        if llm is None:
+            llm = self._llms[llm_model] = self._create_llm(llm_model)
+        return llm
 
-            if not results:
-                return "No matching documents found."
+    @staticmethod
+    def _create_llm(llm_model: LLMModel):
+        if llm_model == LLMModel.OPENAI_GPT_3_5_TURBO:
+            try:
+                from langchain_openai import ChatOpenAI
+            except ImportError:
+                raise ValueError(f"{llm_model.value} requires the langchain-openai package")
+            return ChatOpenAI(model=llm_model.value, temperature=0, api_key=os.getenv("OPENAI_API_KEY"))
+        return ChatGoogleGenerativeAI(
+            model=llm_model.value,
+            temperature=0,
+            google_api_key=os.getenv("GEMINI_API_KEY"),
+        )
+
+    def warm_up(self, llm_model: LLMModel = LLMModel.GEMINI_FLASH_LARGE):
+        self._get_agent(llm_model)
+
+    @staticmethod
+    def _format_chat_history(history: List[Dict], window: int = 5) -> str:
+        lines = []
+        for entry in history[-window:]:
+            lines.append(f"Human: {entry['input']}")
+            lines.append(f"AI: {entry['output']}")
+        return "\n".join(lines)
+
+    async def _search_documents(self, query: str) -> str:
+        # Several queries (one per line) are embedded together and sent as
+        # one batch search per collection.
+        queries = [line.strip() for line in query.splitlines() if line.strip()][:MAX_SEARCH_QUERIES]
+        if not queries:
+            return "No matching documents found."
+        return await self._retrieve_or_error(queries)
 
+    async def _direct_context(self, query: str) -> Optional[str]:
+        # The retrieved context for a direct answer, or None when retrieval
+        # fails: an error message is nothing to answer from, so the query
+        # goes to the agent, which can retry the search.
+        try:
+            return await self._retrieve([query])
+        except Exception as e:
+            print(f"[WARN] Direct retrieval failed, falling back to agent mode: {e}")
+            return None
+
+    async def _retrieve_or_error(self, queries: List[str]) -> str:
+        # A failed search is reported to the LLM as the context, like any
+        # tool error, rather than failing the whole query.
+        try:
+            return await self._retrieve(queries)
+        except Exception as e:
+            print(f"[ERROR] Error searching documents: {e}")
+            return f"Error searching documents: {e}"
+
+    async def _retrieve(self, queries: List[str]) -> str:
+        # Top chunks for each query, searched as the current query context
+        # asks, formatted for the LLM; their sources are recorded in the
+        # context.
+        context = current_query_context()
+        search_mode, filters = context.search_mode, context.filters
+        if search_mode == SearchMode.LEXICAL:
+            results_per_query = await self.vector_service.search_lexical(queries, limit=5, filters=filters)
+        else:
+            results_per_query = await self._dense_search(queries, context)
+            if search_mode == SearchMode.HYBRID:
+                lexical = await self.vector_service.search_lexical(queries, limit=5, filters=filters)
+                results_per_query = [
+                    reciprocal_rank_fusion([dense, sparse], limit=5, k=settings.RRF_K)
+                    for dense, sparse in zip(results_per_query, lexical)
+                ]
+
+        context.sources = list(dict.fromkeys(
+            f"{location['filename']} (chunk {location['chunk_index']})"
+            for results in results_per_query
+            for r in results
+            for location in r["locations"][:HIT_FILENAME_LIMIT]
+        ))
+
+        if not context.sources:
+            return "No matching documents found."
+
+        sections = []
+        for search_query, results in zip(queries, results_per_query):
             formatted = [
                 f"Document: {r['filename']}\n"
                 f"Relevance: {r['score']:.3f}\n"
                 f"Content: {r['text'][:500]}..."
                 for r in results
-            ]
-            return "\n---\n".join(formatted)
+            ] or ["No matching documents found."]
+            section = "\n---\n".join(formatted)
+            sections.append(f"Results for: {search_query}\n{section}" if len(queries) > 1 else section)
+        return "\n===\n".join(sections)
 
-        except Exception as e:
-            print(f"[ERROR] Error searching documents: {e}")
-            return f"Error searching documents: {e}"
+    async def _dense_search(self, queries: List[str], context: QueryContext) -> List[List[Dict[str, Any]]]:
+        # Each model's collection is searched with queries embedded by that
+        # same model; the hits are merged by rank fusion. A model whose query
+        # embedding fails is skipped, so hybrid search degrades to BM25.
+        models = await self.vector_service.available_models()
+        embeddings = await asyncio.gather(*(
+            self.embedding_service.generate_embeddings(queries, model) for model in models
+        ), return_exceptions=True)
+        query_embeddings = {}
+        for model, embedding in zip(models, embeddings):
+            if isinstance(embedding, Exception):
+                print(f"[WARN] Skipping {model.value} collection, query embedding failed: {embedding}")
+            else:
+                query_embeddings[model] = embedding
+
+        if not query_embeddings:
+            return [[] for _ in queries]
+        return await self.vector_service.search_models(
+            query_embeddings,
+            limit=5,
+            algorithm=context.similarity_algorithm,
+            filters=context.filters,
+        )
 
     async def _search_memory(self, query: str) -> str:
         try:
-            history = self._load_conversation_history(self.current_session_id)
+            history = self._load_conversation_history(current_query_context().session_id)
             if not history:
                 return "No previous conversation found."
 
@@ -1,82 +1,537 @@
-from typing import List, Dict, Any
+from typing import Awaitable, Callable, List, Dict, Any, Optional, Set, Tuple
+import asyncio
+import json
+import time
 import uuid
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
+from config.settings import settings
 from schemas import ChunkingMethod, EmbeddingModel, SimilarityAlgorithm
-import os
-from services.embedding_service import EmbeddingService
+from services.chunking_service import ChunkSpan
+from services.vector_store import (
+    VectorStore, VectorRecord, PAYLOAD_INDEXES, payload_matches, payload_values, create_vector_store
+)
+from services.bm25_index import BM25Index, reciprocal_rank_fusion
+from utils.hashing import chunk_hash
+
+# Point ids are derived from (embedding model, chunk hash), so identical chunks
+# map to the same point and are embedded and stored only once.
+CHUNK_ID_NAMESPACE = uuid.UUID("5b0b5e7e-3f0c-4c7b-9a55-6f1d2c9f4a10")
+
+# Payload fields that differ between the files sharing a chunk.
+OWNER_FIELDS = ("file_id", "filename", "chunking_method")
+
+# Files named in a search hit's `filename`; a chunk shared by many files
+# reads "a.txt, b.txt, c.txt and 12 more".
+HIT_FILENAME_LIMIT = 3
+
+# Payload fields the BM25 index keeps per chunk, for filters and de-duplication.
+LEXICAL_FIELDS = tuple(PAYLOAD_INDEXES) + ("chunk_hash",)
+
+# How long available_models() trusts its cached list before counting the
+# collections again, so points stored by other workers are picked up.
+AVAILABLE_MODELS_TTL_SECONDS = 60.0
 
 class VectorService:
-    def __init__(self):
-        self.client = QdrantClient(url=os.getenv("QDRANT_URL", "http://localhost:6333"))
+    """Chunk vectors, one collection per embedding model, in a VectorStore
+    (Qdrant or the in-process LocalVectorStore, per VECTOR_STORE_BACKEND).
+
+    Models produce vectors of different sizes that are not comparable, so each
+    gets its own collection, created on demand with the dimension of the
+    first vectors stored in it. Gemini keeps the original
+    `document_embeddings` collection.
+
+    Every stored chunk is also added to an in-memory BM25 index (when
+    LEXICAL_INDEX_ENABLED), kept in step with upserts and deletes and rebuilt
+    from the stored payloads at startup, for keyword search without an
+    embedding call. The index belongs to this process: with several workers,
+    each sees only its own changes until it restarts, so lexical and hybrid
+    search expect a single worker.
+
+    Coroutines in `change_listeners` are awaited whenever stored chunks or
+    their file assignments change, for caches derived from the corpus.
+    """
+
+    def __init__(self, store: VectorStore = None, lexical_index: BM25Index = None):
+        self.store = store or create_vector_store()
         self.collection_name = "document_embeddings"
-    
+        self._collections: Set[str] = set()
+        self._collections_lock = asyncio.Lock()
+        if lexical_index is None and settings.LEXICAL_INDEX_ENABLED:
+            lexical_index = BM25Index()
+        self.lexical_index = lexical_index
+        self.change_listeners: List[Callable[[], Awaitable[None]]] = []
+        self._available_models: Optional[List[EmbeddingModel]] = None
+        self._available_models_at = 0.0
+
     async def initialize(self):
         try:
-            collections = self.client.get_collections()
-            collection_exists = any(c.name == self.collection_name for c in collections.collections)
-            if not collection_exists:
-                self.client.create_collection(
-                    collection_name=self.collection_name,
-                    vectors_config=VectorParams(size=768, distance=Distance.COSINE)
-                )
+            self._collections = await self.store.list_collections()
+            await self._ensure_collection(EmbeddingModel.GEMINI, 768)
+            for model in EmbeddingModel:
+                if self.collection_for(model) in self._collections:
+                    await self._create_payload_indexes(self.collection_for(model))
+            if self.lexical_index is not None:
+                await self._rebuild_lexical_index()
         except Exception as e:
-            print(f"Error initializing Qdrant: {e}")
-    
+            print(f"Error initializing vector store: {e}")
+
+    async def _rebuild_lexical_index(self):
+        for model in EmbeddingModel:
+            collection_name = self.collection_for(model)
+            if collection_name not in self._collections:
+                continue
+            async for point_id, payload in self.store.scroll(collection_name):
+                self.lexical_index.add(point_id, payload.get("text", ""), self._lexical_payload(payload))
+        print(f"Lexical index built with {len(self.lexical_index)} chunks")
+
+    async def close(self):
+        await self.store.close()
+
+    def collection_for(self, embedding_model: EmbeddingModel) -> str:
+        if embedding_model == EmbeddingModel.GEMINI:
+            return self.collection_name
+        return f"{self.collection_name}_{embedding_model.value.replace('-', '_')}"
+
+    async def available_models(self) -> List[EmbeddingModel]:
+        """Embedding models whose collection exists and holds vectors.
+
+        The list is cached: upserts add their model to it, deletes drop it so
+        it is recounted, and it is refreshed after
+        AVAILABLE_MODELS_TTL_SECONDS.
+        """
+        if (
+            self._available_models is None
+            or time.monotonic() - self._available_models_at > AVAILABLE_MODELS_TTL_SECONDS
+        ):
+            models = []
+            for model in EmbeddingModel:
+                collection_name = self.collection_for(model)
+                if collection_name in self._collections and await self.store.count(collection_name):
+                    models.append(model)
+            self._available_models = models
+            self._available_models_at = time.monotonic()
+        return list(self._available_models)
+
+    def _mark_available(self, embedding_model: EmbeddingModel):
+        if self._available_models is not None and embedding_model not in self._available_models:
+            available = set(self._available_models) | {embedding_model}
+            self._available_models = [model for model in EmbeddingModel if model in available]
+
+    async def _ensure_collection(self, embedding_model: EmbeddingModel, size: int) -> str:
+        name = self.collection_for(embedding_model)
+        if name in self._collections:
+            return name
+        async with self._collections_lock:
+            if name not in self._collections:
+                print(f"Creating collection {name} ({size} dims, quantization: {settings.VECTOR_QUANTIZATION})")
+                await self.store.create_collection(name, size, settings.VECTOR_QUANTIZATION)
+                await self._create_payload_indexes(name)
+                self._collections.add(name)
+        return name
+
+    async def _create_payload_indexes(self, collection_name: str):
+        for field, field_type in PAYLOAD_INDEXES.items():
+            await self.store.create_payload_index(collection_name, field, field_type)
+
+    @staticmethod
+    def _check_filters(filters: Optional[Dict[str, Any]]):
+        unknown = set(filters or {}) - set(PAYLOAD_INDEXES)
+        if unknown:
+            raise ValueError(f"Unsupported filter fields: {sorted(unknown)} (allowed: {sorted(PAYLOAD_INDEXES)})")
+
+    async def assign_file(
+        self,
+        point_ids: List[str],
+        file_id: int,
+        filename: str,
+        embedding_model: EmbeddingModel,
+        chunking_method: ChunkingMethod,
+        spans: Optional[List[ChunkSpan]] = None,
+    ):
+        """Record the file as an owner of each point, with the chunk's position
+        in that file.
+
+        A chunk shared by several files (see content-hash dedup) lists all of
+        them in its `file_id`, `filename` and `chunking_method` payload
+        fields, so a filter on any of them finds every chunk of that
+        document, and keeps each file's chunk index (and, with `spans`, its
+        source offsets and token count) in `file_chunks`. Assigning a file
+        again replaces its name and positions.
+        """
+        await self.assign_files([(point_ids, file_id, filename, chunking_method, spans)], embedding_model)
+
+    async def assign_files(
+        self,
+        assignments: List[Tuple[List[str], int, str, ChunkingMethod, Optional[List[ChunkSpan]]]],
+        embedding_model: EmbeddingModel,
+    ):
+        """assign_file for several (point_ids, file_id, filename,
+        chunking_method, spans) at once: one payload read and one batch of
+        payload updates for all of them, and one change notification."""
+        entries: Dict[str, Dict[int, Dict[str, Any]]] = {}
+        for point_ids, file_id, filename, chunking_method, spans in assignments:
+            for i, point_id in enumerate(point_ids):
+                owners = entries.setdefault(point_id, {})
+                if file_id in owners:
+                    continue
+                entry = owners[file_id] = {
+                    "filename": filename, "chunk_index": i, "chunking_method": chunking_method.value
+                }
+                if spans is not None:
+                    entry["start_offset"] = spans[i].start
+                    entry["end_offset"] = spans[i].end
+                    if spans[i].token_count is not None:
+                        entry["token_count"] = spans[i].token_count
+        await self._update_owners(
+            list(entries), embedding_model, lambda point_id, owners: {**owners, **entries[point_id]}
+        )
+
+    async def unassign_file(self, point_ids: List[str], file_id: int, embedding_model: EmbeddingModel):
+        await self._update_owners(
+            point_ids,
+            embedding_model,
+            lambda point_id, owners: {k: v for k, v in owners.items() if k != file_id}
+        )
+
+    async def point_owners(self, point_ids: List[str], embedding_model: EmbeddingModel) -> Dict[str, Set[int]]:
+        """The file ids recorded on each stored point in `point_ids`."""
+        collection_name = self.collection_for(embedding_model)
+        if not point_ids or collection_name not in self._collections:
+            return {}
+        payloads = await self.store.retrieve_payloads(collection_name, point_ids)
+        return {point_id: set(payload.get("file_id") or []) for point_id, payload in payloads.items()}
+
+    @staticmethod
+    def _owners(payload: Dict[str, Any]) -> Dict[int, Dict[str, Any]]:
+        """Each owning file's entry on a point: its filename and the chunk's
+        position in that file."""
+        names = payload.get("file_names") or {}
+        chunks = payload.get("file_chunks") or {}
+        return {
+            file_id: {**chunks.get(str(file_id), {}), "filename": names.get(str(file_id))}
+            for file_id in payload_values(payload.get("file_id"))
+        }
+
+    @staticmethod
+    def _owner_payload(owners: Dict[int, Dict[str, Any]], payload: Dict[str, Any]) -> Dict[str, Any]:
+        # Points stored before owners were tracked only carry their first
+        # file's name and chunking method, which are kept until an owner
+        # replaces them.
+        filenames = sorted({owner["filename"] for owner in owners.values() if owner.get("filename")})
+        methods = sorted({owner["chunking_method"] for owner in owners.values() if owner.get("chunking_method")})
+        return {
+            "file_id": sorted(owners),
+            "filename": filenames or payload_values(payload.get("filename")),
+            "chunking_method": methods or payload_values(payload.get("chunking_method")),
+            "file_names": {str(file_id): owner.get("filename") for file_id, owner in owners.items()},
+            "file_chunks": {
+                str(file_id): {key: value for key, value in owner.items() if key != "filename"}
+                for file_id, owner in owners.items()
+            },
+        }
+
+    async def _update_owners(self, point_ids: List[str], embedding_model: EmbeddingModel, change):
+        """Replace the owners of each point with `change(point_id, owners)`."""
+        collection_name = self.collection_for(embedding_model)
+        if not point_ids or collection_name not in self._collections:
+            return
+        payloads = await self.store.retrieve_payloads(collection_name, point_ids)
+
+        # Points ending up with the same owner payload share one update, and
+        # all updates go to the store together.
+        groups: Dict[str, Tuple[List[str], Dict[str, Any]]] = {}
+        for point_id, payload in payloads.items():
+            updated = self._owner_payload(change(point_id, self._owners(payload)), payload)
+            if any(payload.get(field) != value for field, value in updated.items()):
+                key = json.dumps(updated, sort_keys=True)
+                groups.setdefault(key, ([], updated))[0].append(point_id)
+
+        if not groups:
+            return
+        await self.store.set_payloads(collection_name, list(groups.values()))
+        if self.lexical_index is not None:
+            for ids, updated in groups.values():
+                for point_id in ids:
+                    self.lexical_index.update_payload(point_id, self._lexical_payload(updated))
+        await self._corpus_changed()
+
+    @staticmethod
+    def chunk_point_id(chunk: str, embedding_model: EmbeddingModel) -> str:
+        return str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{embedding_model.value}:{chunk_hash(chunk)}"))
+
+    def chunk_point_ids(self, chunks: List[str], embedding_model: EmbeddingModel) -> List[str]:
+        return [self.chunk_point_id(chunk, embedding_model) for chunk in chunks]
+
+    async def find_existing_ids(self, point_ids: List[str], embedding_model: EmbeddingModel) -> Set[str]:
+        """Return the subset of `point_ids` already stored in the model's collection."""
+        collection_name = self.collection_for(embedding_model)
+        if not point_ids or collection_name not in self._collections:
+            return set()
+        return await self.store.retrieve_ids(collection_name, point_ids)
+
     async def store_embeddings(
         self,
-        embeddings: List[List[float]],
+        embeddings: List[Optional[List[float]]],
         chunks: List[str],
         filename: str,
         chunking_method: ChunkingMethod,
         embedding_model: EmbeddingModel
     ) -> List[str]:
-        points = []
-        vector_ids = []
-        for i, (embedding, chunk) in enumerate(zip(embeddings, chunks)):
-            point_id = str(uuid.uuid4())
-            vector_ids.append(point_id)
-            
-            point = PointStruct(
-                id=point_id,
-                vector=embedding,
-                payload={
-                    "text": chunk,
-                    "filename": filename,
-                    "chunk_index": i,
-                    "chunking_method": chunking_method,
-                    "embedding_model": embedding_model
-                }
-            )
-            points.append(point)
-        
-        self.client.upsert(
-            collection_name=self.collection_name,
-            points=points
+        """Store chunk vectors and return one vector id per chunk.
+
+        Chunks whose content is already stored for this embedding model reuse
+        the existing point; their embedding may be passed as None. Where a
+        chunk sits in each file is recorded by assign_file.
+        """
+        vector_ids = self.chunk_point_ids(chunks, embedding_model)
+        existing = await self.find_existing_ids(vector_ids, embedding_model)
+        points = self._build_points(
+            embeddings, chunks, vector_ids, existing, set(), filename, chunking_method, embedding_model
         )
         
+        if points:
+            collection_name = await self._ensure_collection(embedding_model, len(points[0].vector))
+            await self.store.upsert(collection_name, points)
+            self._mark_available(embedding_model)
+            self._index_lexical(points)
+            await self._corpus_changed()
+        
         return vector_ids
+
+    async def store_embeddings_bulk(
+        self,
+        documents: List[Tuple[List[Optional[List[float]]], List[str], str]],
+        chunking_method: ChunkingMethod,
+        embedding_model: EmbeddingModel
+    ) -> List[List[str]]:
+        """Store several documents' (embeddings, chunks, filename) in one upsert.
+
+        Returns the vector ids of each document, in input order.
+        """
+        id_lists = [self.chunk_point_ids(chunks, embedding_model) for _, chunks, _ in documents]
+        existing = await self.find_existing_ids([pid for ids in id_lists for pid in ids], embedding_model)
+        seen: Set[str] = set()
+        all_points = []
+        for (embeddings, chunks, filename), vector_ids in zip(documents, id_lists):
+            all_points.extend(self._build_points(
+                embeddings, chunks, vector_ids, existing, seen, filename, chunking_method, embedding_model
+            ))
+
+        if all_points:
+            collection_name = await self._ensure_collection(embedding_model, len(all_points[0].vector))
+            await self.store.upsert(collection_name, all_points)
+            self._mark_available(embedding_model)
+            self._index_lexical(all_points)
+            await self._corpus_changed()
+
+        return id_lists
+
+    async def delete_points(self, point_ids: List[str], embedding_model: EmbeddingModel):
+        collection_name = self.collection_for(embedding_model)
+        if not point_ids or collection_name not in self._collections:
+            return
+        removed = {}
+        if self.lexical_index is not None:
+            removed = await self.store.retrieve_payloads(collection_name, point_ids)
+        await self.store.delete(collection_name, point_ids)
+        self._available_models = None
+        for point_id, payload in removed.items():
+            self.lexical_index.remove(point_id, payload.get("text", ""))
+        await self._corpus_changed()
+
+    async def _corpus_changed(self):
+        for listener in self.change_listeners:
+            await listener()
+
+    def _index_lexical(self, points: List[VectorRecord]):
+        if self.lexical_index is not None:
+            self.lexical_index.add_many(
+                (point.id, point.payload["text"], self._lexical_payload(point.payload)) for point in points
+            )
+
+    @staticmethod
+    def _lexical_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {field: payload[field] for field in LEXICAL_FIELDS if field in payload}
+
+    def _build_points(
+        self,
+        embeddings: List[Optional[List[float]]],
+        chunks: List[str],
+        vector_ids: List[str],
+        existing: Set[str],
+        seen: Set[str],
+        filename: str,
+        chunking_method: ChunkingMethod,
+        embedding_model: EmbeddingModel
+    ) -> List[VectorRecord]:
+        points = []
+        for i, (embedding, chunk, point_id) in enumerate(zip(embeddings, chunks, vector_ids)):
+            if point_id in existing or point_id in seen:
+                continue
+            if embedding is None:
+                raise ValueError(f"Missing embedding for new chunk {i} of {filename}")
+            seen.add(point_id)
+            
+            payload = {
+                "text": chunk,
+                "filename": [filename],
+                "chunk_index": i,
+                "chunk_hash": chunk_hash(chunk),
+                "chunking_method": chunking_method,
+                "embedding_model": embedding_model
+            }
+            points.append(VectorRecord(point_id, embedding, payload))
+        
+        return points
     
-    def search_similar(
+    async def search_similar(
         self,
         query_embedding: List[float],
+        embedding_model: EmbeddingModel = EmbeddingModel.GEMINI,
         limit: int = 5,
-        algorithm: SimilarityAlgorithm = SimilarityAlgorithm.COSINE
+        algorithm: SimilarityAlgorithm = SimilarityAlgorithm.COSINE,
+        filters: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, Any]]:
+        """Nearest chunks to `query_embedding`. `filters` restricts the search
+        to chunks whose payload matches, e.g. {"filename": "cv.pdf"} or
+        {"file_id": [3, 4]}; only the indexed fields in PAYLOAD_INDEXES are
+        accepted."""
+        return (await self.search_batch([query_embedding], embedding_model, limit, algorithm, filters))[0]
 
-        results = self.client.search(
-            collection_name=self.collection_name,
-            query_vector=query_embedding,
-            limit=limit
-        )
+    async def search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        embedding_model: EmbeddingModel = EmbeddingModel.GEMINI,
+        limit: int = 5,
+        algorithm: SimilarityAlgorithm = SimilarityAlgorithm.COSINE,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """Search several query vectors of one model in a single round trip;
+        returns one hit list per query."""
+        self._check_filters(filters)
+        collection_name = self.collection_for(embedding_model)
+        if collection_name not in self._collections or not query_embeddings:
+            return [[] for _ in query_embeddings]
+
+        batches = await self.store.search_batch(collection_name, query_embeddings, limit, algorithm, filters)
         
+        return [
+            [self._hit(result.id, result.score, result.payload, filters) for result in results]
+            for results in batches
+        ]
+
+    async def search_models(
+        self,
+        query_embeddings: Dict[EmbeddingModel, List[List[float]]],
+        limit: int = 5,
+        algorithm: SimilarityAlgorithm = SimilarityAlgorithm.COSINE,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """Run the same queries against several models' collections.
+
+        `query_embeddings` maps each model to its embeddings of the queries,
+        in the same query order for every model. Each collection gets one
+        batch search, and all collections are searched concurrently. Returns
+        one list per query.
+
+        Similarity scores of different models are not comparable, so with
+        several models each query's hits are merged by reciprocal rank
+        fusion; a chunk found by more than one model counts once, ranked
+        higher. With a single model the hits keep their similarity scores.
+        """
+        results = await asyncio.gather(*(
+            self.search_batch(embeddings, model, limit, algorithm, filters)
+            for model, embeddings in query_embeddings.items()
+        ))
+        if len(results) == 1:
+            return results[0]
+        return [
+            reciprocal_rank_fusion(list(per_query), limit=limit, k=settings.RRF_K)
+            for per_query in zip(*results)
+        ]
+
+    async def search_lexical(
+        self,
+        queries: List[str],
+        limit: int = 5,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """BM25 search over every stored chunk; one hit list per query.
+
+        Scoring runs in a worker thread with no embedding call; the hits'
+        text and owners are then read from the store. A chunk stored under
+        several embedding models is returned once.
+        """
+        self._check_filters(filters)
+        if self.lexical_index is None:
+            return [[] for _ in queries]
+        predicate = (lambda payload: payload_matches(payload, filters)) if filters else None
+        ranked = await asyncio.to_thread(
+            lambda: [self.lexical_index.search(query, limit * len(EmbeddingModel), predicate) for query in queries]
+        )
+
+        per_query = []
+        wanted: Dict[str, List[str]] = {}
+        for results in ranked:
+            hits, seen = [], set()
+            for point_id, score, payload in results:
+                key = payload.get("chunk_hash") or point_id
+                if key not in seen and len(hits) < limit:
+                    seen.add(key)
+                    hits.append((point_id, score))
+                    model = EmbeddingModel(payload["embedding_model"])
+                    wanted.setdefault(self.collection_for(model), []).append(point_id)
+            per_query.append(hits)
+
+        payloads: Dict[str, Dict[str, Any]] = {}
+        for collection_name, ids in wanted.items():
+            payloads.update(await self.store.retrieve_payloads(collection_name, ids))
+        return [
+            [self._hit(point_id, score, payloads[point_id], filters) for point_id, score in hits if point_id in payloads]
+            for hits in per_query
+        ]
+
+    @classmethod
+    def _hit(
+        cls, point_id: str, score: float, payload: Dict[str, Any], filters: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """A search result. `locations` lists the chunk's (file_id, filename,
+        chunk_index) in each file it belongs to, or only in the files a file
+        filter selected; `filename` and `chunk_index` summarise them, naming
+        at most HIT_FILENAME_LIMIT files."""
+        locations = cls._locations(payload, filters)
+        names = list(dict.fromkeys(location["filename"] for location in locations if location["filename"]))
+        filename = ", ".join(names[:HIT_FILENAME_LIMIT])
+        if len(names) > HIT_FILENAME_LIMIT:
+            filename += f" and {len(names) - HIT_FILENAME_LIMIT} more"
+        return {
+            "id": point_id,
+            "score": score,
+            "text": payload["text"],
+            "filename": filename,
+            "chunk_index": locations[0]["chunk_index"] if locations else payload.get("chunk_index"),
+            "locations": locations,
+            "chunk_hash": payload.get("chunk_hash"),
+            "embedding_model": payload.get("embedding_model")
+        }
+
+    @classmethod
+    def _locations(cls, payload: Dict[str, Any], filters: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        owners = cls._owners(payload)
+        if not owners:
+            return [
+                {"file_id": None, "filename": name, "chunk_index": payload.get("chunk_index")}
+                for name in payload_values(payload.get("filename"))
+            ]
+        owner_filters = {field: value for field, value in (filters or {}).items() if field in OWNER_FIELDS}
+        selected = {
+            file_id: owner for file_id, owner in owners.items()
+            if payload_matches({**owner, "file_id": file_id}, owner_filters)
+        } or owners
         return [
             {
-                "id": result.id,
-                "score": result.score,
-                "text": result.payload["text"],
-                "filename": result.payload["filename"],
-                "chunk_index": result.payload["chunk_index"]
+                "file_id": file_id,
+                "filename": owner.get("filename"),
+                "chunk_index": owner.get("chunk_index", payload.get("chunk_index")),
             }
-            for result in results
-        ]
\ No newline at end of file
+            for file_id, owner in selected.items()
+        ]
@@ -0,0 +1,151 @@
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+import math
+from config.settings import settings
+from schemas import SimilarityAlgorithm
+
+
+class VectorRecord:
+    __slots__ = ("id", "vector", "payload")
+
+    def __init__(self, id: str, vector: List[float], payload: Dict[str, Any]):
+        self.id = id
+        self.vector = vector
+        self.payload = payload
+
+
+class SearchHit:
+    """A search result. `score` is higher-is-better for every algorithm:
+    cosine similarity, or 1 / (1 + distance) for Euclidean search."""
+    __slots__ = ("id", "score", "payload")
+
+    def __init__(self, id: str, score: float, payload: Dict[str, Any]):
+        self.id = id
+        self.score = score
+        self.payload = payload
+
+
+def euclidean_score(distance: float) -> float:
+    return 1.0 / (1.0 + distance)
+
+
+def cosine_to_euclidean_score(cosine: float) -> float:
+    """Euclidean score between unit vectors with the given cosine similarity."""
+    return euclidean_score(math.sqrt(max(0.0, 2.0 - 2.0 * cosine)))
+
+
+# Payload fields VectorService indexes and accepts in search filters, with
+# their index type.
+PAYLOAD_INDEXES = {
+    "filename": "keyword",
+    "file_id": "integer",
+    "embedding_model": "keyword",
+    "chunking_method": "keyword",
+}
+
+
+def payload_values(value: Any) -> List[Any]:
+    """A payload field as a list: list fields as they are, a scalar as one item."""
+    if value is None:
+        return []
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def payload_matches(payload: Dict[str, Any], filters: Optional[Dict[str, Any]]) -> bool:
+    """Whether `payload` satisfies every filter. A filter value may be a list
+    (match any of them); a payload value may be a list (any element counts)."""
+    for field, expected in (filters or {}).items():
+        wanted = set(expected) if isinstance(expected, (list, tuple, set)) else {expected}
+        actual = payload.get(field)
+        values = set(actual) if isinstance(actual, (list, tuple)) else {actual}
+        if not wanted & values:
+            return False
+    return True
+
+
+class VectorStore(ABC):
+    """Storage and nearest-neighbour search for VectorService collections."""
+
+    @abstractmethod
+    async def list_collections(self) -> Set[str]:
+        ...
+
+    @abstractmethod
+    async def create_collection(self, name: str, size: int, quantization: str = "none"):
+        """Create a collection; `quantization` is none, scalar or binary."""
+
+    @abstractmethod
+    async def count(self, name: str) -> int:
+        ...
+
+    @abstractmethod
+    async def retrieve_ids(self, name: str, ids: List[str]) -> Set[str]:
+        """Return the subset of `ids` stored in the collection."""
+
+    @abstractmethod
+    async def retrieve_payloads(self, name: str, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def upsert(self, name: str, records: List[VectorRecord]):
+        ...
+
+    @abstractmethod
+    async def set_payload(self, name: str, ids: List[str], payload: Dict[str, Any]):
+        """Merge `payload` into the payload of every point in `ids`."""
+
+    async def set_payloads(self, name: str, updates: List[Tuple[List[str], Dict[str, Any]]]):
+        """Apply several (ids, payload) set_payload updates; stores override
+        this to send them in one request."""
+        for ids, payload in updates:
+            await self.set_payload(name, ids, payload)
+
+    async def create_payload_index(self, name: str, field: str, field_type: str):
+        """Index a payload field for filtered search, where the store supports it."""
+
+    @abstractmethod
+    async def delete(self, name: str, ids: List[str]):
+        ...
+
+    @abstractmethod
+    async def search(
+        self,
+        name: str,
+        vector: List[float],
+        limit: int,
+        algorithm: SimilarityAlgorithm = SimilarityAlgorithm.COSINE,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[SearchHit]:
+        """Nearest points to `vector` whose payload matches `filters`
+        (see payload_matches)."""
+
+    @abstractmethod
+    def scroll(self, name: str, batch_size: int = 1000) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Iterate over every (id, payload) in the collection."""
+
+    async def search_batch(
+        self,
+        name: str,
+        vectors: List[List[float]],
+        limit: int,
+        algorithm: SimilarityAlgorithm = SimilarityAlgorithm.COSINE,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[List[SearchHit]]:
+        """Search several query vectors at once; stores override this to
+        answer them in one round trip or one vectorized pass."""
+        return [await self.search(name, vector, limit, algorithm, filters) for vector in vectors]
+
+    async def close(self):
+        pass
+
+
+def create_vector_store(backend: Optional[str] = None) -> VectorStore:
+    backend = backend or settings.VECTOR_STORE_BACKEND
+    if backend == "qdrant":
+        from services.qdrant_store import QdrantVectorStore
+        return QdrantVectorStore(settings.QDRANT_URL)
+    elif backend == "local":
+        from services.local_vector_store import LocalVectorStore
+        return LocalVectorStore(settings.LOCAL_VECTOR_STORE_PATH or None)
+    else:
+        raise ValueError(f"Unsupported vector store backend: {backend}")
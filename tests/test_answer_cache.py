@@ -0,0 +1,81 @@
+import pytest
+from services.answer_cache import AnswerCache
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def lpush(self, key, value):
+        self.commands.append(lambda: self.redis.lists.setdefault(key, []).insert(0, value))
+
+    def ltrim(self, key, start, end):
+        self.commands.append(lambda: self.redis.lists.__setitem__(key, self.redis.lists[key][start:end + 1]))
+
+    def expire(self, key, seconds):
+        self.commands.append(lambda: self.redis.expiry.__setitem__(key, seconds))
+
+    async def execute(self):
+        for command in self.commands:
+            command()
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+        self.lists = {}
+        self.expiry = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def incr(self, key):
+        self.values[key] = int(self.values.get(key, 0)) + 1
+        return self.values[key]
+
+    async def lrange(self, key, start, end):
+        return list(self.lists.get(key, []))
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+class TestAnswerCache:
+    def setup_method(self):
+        self.redis = FakeRedis()
+        self.cache = AnswerCache(self.redis, threshold=0.9, ttl_seconds=60, max_entries=2)
+        self.scope = AnswerCache.make_scope(llm_model="gemini-2.5-flash", similarity_algorithm="cosine")
+
+    @pytest.mark.asyncio
+    async def test_near_duplicate_queries_hit(self):
+        await self.cache.set(self.scope, "what are Alice's skills", [1.0, 0.0, 0.1], "Python", ["cv.pdf (chunk 0)"])
+
+        hit = await self.cache.get(self.scope, [0.98, 0.0, 0.12])
+        assert hit["answer"] == "Python" and hit["sources"] == ["cv.pdf (chunk 0)"]
+        assert hit["similarity"] > 0.9
+        assert await self.cache.get(self.scope, [0.0, 1.0, 0.0]) is None
+        assert self.cache.stats()["hits"] == 1 and self.cache.stats()["misses"] == 1
+        assert all(seconds == 60 for seconds in self.redis.expiry.values())
+
+    @pytest.mark.asyncio
+    async def test_scopes_are_separate(self):
+        await self.cache.set(self.scope, "q", [1.0, 0.0], "a", ["s"])
+        other = AnswerCache.make_scope(llm_model="gemini-2.5-flash", similarity_algorithm="euclidean")
+        assert await self.cache.get(other, [1.0, 0.0]) is None
+
+    @pytest.mark.asyncio
+    async def test_invalidate_drops_cached_answers(self):
+        await self.cache.set(self.scope, "q", [1.0, 0.0], "a", ["s"])
+        await self.cache.invalidate()
+        assert await self.cache.get(self.scope, [1.0, 0.0]) is None
+
+    @pytest.mark.asyncio
+    async def test_entries_per_scope_are_bounded(self):
+        for i, vector in enumerate([[1.0, 0.0], [0.0, 1.0], [-1.0, 0.0]]):
+            await self.cache.set(self.scope, f"q{i}", vector, f"a{i}", ["s"])
+        assert await self.cache.get(self.scope, [1.0, 0.0]) is None
+        assert (await self.cache.get(self.scope, [-1.0, 0.0]))["answer"] == "a2"
@@ -0,0 +1,78 @@
+import random
+import pytest
+from schemas import ChunkingMethod, EmbeddingModel
+from services.bm25_index import BM25Index, reciprocal_rank_fusion
+from services.local_vector_store import LocalVectorStore
+from services.vector_service import VectorService
+
+
+class TestBM25Index:
+    def setup_method(self):
+        self.index = BM25Index()
+        self.index.add("a", "Senior Python developer at Acme Corp", {"filename": "a.pdf"})
+        self.index.add("b", "Java engineer, previously at Globex", {"filename": "b.pdf"})
+        self.index.add("c", "Python and Java trainer", {"filename": "c.pdf"})
+
+    def test_ranks_by_term_match(self):
+        hits = self.index.search("acme python", limit=3)
+
+        assert [doc_id for doc_id, _, _ in hits] == ["a", "c"]
+        assert hits[0][2]["filename"] == "a.pdf"
+
+    def test_remove_and_replace_update_postings(self):
+        self.index.remove("a", "Senior Python developer at Acme Corp")
+        self.index.remove("b", "Java engineer, previously at Globex")
+        self.index.add("b", "Rust developer at Initech", {})
+
+        assert self.index.search("acme") == []
+        assert self.index.search("globex") == []
+        assert [doc_id for doc_id, _, _ in self.index.search("initech")] == ["b"]
+        assert len(self.index) == 2
+
+    def test_pruned_search_matches_exhaustive_scores(self):
+        rng = random.Random(0)
+        words = ["python", "java", "the", "and", "team", "lead", "acme", "globex", "rust", "data"]
+        index = BM25Index()
+        for i in range(300):
+            index.add(str(i), " ".join(rng.choices(words, weights=range(10, 0, -1), k=30)), {"n": i % 2})
+        query = "globex rust the and"
+
+        hits = index.search(query, limit=10, predicate=lambda payload: payload["n"] == 0)
+        exhaustive = index.search(query, limit=300)
+
+        expected = [(doc_id, score) for doc_id, score, payload in exhaustive if payload["n"] == 0][:10]
+        assert [(doc_id, pytest.approx(score)) for doc_id, score, _ in hits] == expected
+
+    def test_reciprocal_rank_fusion_merges_by_chunk(self):
+        dense = [{"id": "d1", "chunk_hash": "x", "score": 0.9}, {"id": "d2", "chunk_hash": "y", "score": 0.8}]
+        lexical = [{"id": "l1", "chunk_hash": "y", "score": 7.0}, {"id": "l2", "chunk_hash": "z", "score": 3.0}]
+
+        fused = reciprocal_rank_fusion([dense, lexical], limit=3, k=60)
+
+        assert [hit["chunk_hash"] for hit in fused] == ["y", "x", "z"]
+        assert fused[0]["score"] == pytest.approx(1 / 62 + 1 / 61)
+
+
+class TestLexicalSearchInVectorService:
+    @pytest.mark.asyncio
+    async def test_index_follows_store_and_rebuilds(self, tmp_path):
+        service = VectorService(LocalVectorStore(str(tmp_path)), BM25Index())
+        await service.initialize()
+        chunks = ["Worked at Acme on payments", "Led the Globex data team"]
+        for model, size in ((EmbeddingModel.SENTENCE_TRANSFORMER, 3), (EmbeddingModel.OPENAI, 4)):
+            vectors = [[1.0] + [0.0] * (size - 1), [0.0, 1.0] + [0.0] * (size - 2)]
+            await service.store_embeddings(vectors, chunks, "cv.pdf", ChunkingMethod.CUSTOM, model)
+
+        [acme] = await service.search_lexical(["acme"])
+        assert [hit["text"] for hit in acme] == ["Worked at Acme on payments"]
+        assert all("text" not in payload for payload in service.lexical_index.payloads.values())
+
+        globex_ids = service.chunk_point_ids(chunks[1:], EmbeddingModel.OPENAI)
+        await service.delete_points(globex_ids, EmbeddingModel.OPENAI)
+        await service.close()
+        restarted = VectorService(LocalVectorStore(str(tmp_path)), BM25Index())
+        await restarted.initialize()
+
+        [globex] = await restarted.search_lexical(["globex"])
+        assert [hit["embedding_model"] for hit in globex] == ["sentence-transformer"]
+        assert len(restarted.lexical_index) == 3
@@ -1,6 +1,8 @@
 import pytest
 import asyncio
-from services.chunking_service import ChunkingService
+import numpy as np
+from services.chunking_service import ChunkingService, get_tokenizer, semantic_breakpoints
+from services.model_registry import model_registry
 from schemas import ChunkingMethod
 
 class TestChunkingService:
@@ -33,4 +35,89 @@ class TestChunkingService:
     async def test_custom_chunking(self):
         chunks = await self.service.chunk_text(self.sample_text, ChunkingMethod.CUSTOM)
         assert len(chunks) > 0
-        assert all(isinstance(chunk, str) for chunk in chunks)
\ No newline at end of file
+        assert all(isinstance(chunk, str) for chunk in chunks)
+    
+    @pytest.mark.asyncio
+    async def test_iter_chunks_streams_batches(self):
+        text = "\n\n".join(
+            f"Paragraph {i} talks about a candidate and the projects they delivered." for i in range(40)
+        )
+
+        async def pieces():
+            for start in range(0, len(text), 300):
+                yield text[start:start + 300]
+
+        batches = [batch async for batch in self.service.iter_chunks(pieces(), ChunkingMethod.CUSTOM, window_size=1000)]
+        streamed = [chunk for chunks, _ in batches for chunk in chunks]
+        spans = [span for _, spans in batches for span in spans]
+        assert len(batches) > 1
+        assert streamed == await self.service.chunk_text(text, ChunkingMethod.CUSTOM)
+        assert [span.text(text) for span in spans] == streamed
+
+    @pytest.mark.asyncio
+    async def test_chunk_spans_index_source_text(self):
+        for method in (ChunkingMethod.RECURSIVE, ChunkingMethod.CUSTOM, ChunkingMethod.TOKEN):
+            spans = await self.service.chunk_spans(self.sample_text, method)
+            chunks = await self.service.chunk_text(self.sample_text, method)
+            assert [self.sample_text[s.start:s.end] for s in spans] == chunks
+
+    @pytest.mark.asyncio
+    async def test_token_chunking_respects_token_limit(self):
+        text = " ".join(f"Skill number {i} is listed." for i in range(500))
+        spans = await self.service._token_chunking(text, max_tokens=50, overlap_tokens=5)
+        assert len(spans) > 1
+        assert all(0 < span.token_count <= 50 for span in spans)
+        assert spans[0].start == 0 and spans[-1].end == len(text)
+
+    def test_tokenizer_load_failure_is_not_cached(self, monkeypatch):
+        class Model:
+            tokenizer = object()
+
+        def unavailable():
+            raise OSError("offline")
+
+        monkeypatch.setattr(model_registry, "get_sentence_transformer", unavailable)
+        assert get_tokenizer()("two words")["offset_mapping"] == [(0, 3), (4, 9)]
+        monkeypatch.setattr(model_registry, "get_sentence_transformer", lambda: Model())
+        assert get_tokenizer() is Model.tokenizer
+
+class TestSemanticBreakpoints:
+    def setup_method(self):
+        topic_a = np.array([1.0, 0.0, 0.0])
+        topic_b = np.array([0.0, 1.0, 0.0])
+        self.embeddings = np.stack([topic_a, topic_a * 2, topic_a, topic_b, topic_b * 3, topic_a])
+
+    def test_threshold_breakpoints(self):
+        assert semantic_breakpoints(self.embeddings, mode="threshold", threshold=0.7).tolist() == [3, 5]
+
+    def test_percentile_breakpoints(self):
+        assert semantic_breakpoints(self.embeddings, mode="percentile", percentile=50).tolist() == [3, 5]
+
+    def test_window_breakpoints(self):
+        assert semantic_breakpoints(self.embeddings, mode="window", threshold=0.7, window=2).tolist() == [3, 5]
+
+    def test_single_sentence_has_no_breakpoints(self):
+        assert semantic_breakpoints(self.embeddings[:1]).size == 0
+
+class FakeSentenceEncoder:
+    """Maps sentences mentioning Python to one direction and the rest to another."""
+
+    def encode(self, sentences, **kwargs):
+        return np.array([[1.0, 0.0] if "Python" in s else [0.0, 1.0] for s in sentences], dtype=np.float32)
+
+class TestFusedSemanticChunking:
+    def setup_method(self):
+        self.service = ChunkingService()
+        self.text = "Knows Python well. Wrote Python tools. Enjoys hiking. Likes climbing."
+
+    @pytest.mark.asyncio
+    async def test_semantic_spans_carry_pooled_embeddings(self, monkeypatch):
+        monkeypatch.setattr(model_registry, "get_sentence_transformer", lambda *args, **kwargs: FakeSentenceEncoder())
+
+        spans = await self.service.chunk_spans(self.text, ChunkingMethod.SEMANTIC, with_embeddings=True)
+
+        assert [span.text(self.text) for span in spans] == [
+            "Knows Python well. Wrote Python tools", "Enjoys hiking. Likes climbing"
+        ]
+        assert np.allclose(spans[0].embedding, [1.0, 0.0])
+        assert np.allclose(spans[1].embedding, [0.0, 1.0])
@@ -0,0 +1,65 @@
+import pytest
+import numpy as np
+from services.embedding_cache import EmbeddingCache
+
+class FakePipeline:
+    def __init__(self, store):
+        self.store = store
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def set(self, key, value, ex=None):
+        self.commands.append((key, value, ex))
+
+    async def execute(self):
+        for key, value, ex in self.commands:
+            self.store[key] = (value, ex)
+
+class FakeRedis:
+    def __init__(self):
+        self.store = {}
+
+    async def mget(self, keys):
+        return [self.store[key][0] if key in self.store else None for key in keys]
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self.store)
+
+class TestEmbeddingCache:
+    def setup_method(self):
+        self.redis = FakeRedis()
+        self.cache = EmbeddingCache(self.redis, max_bytes=1024, ttl_seconds=60)
+
+    @pytest.mark.asyncio
+    async def test_memory_and_redis_tiers(self):
+        await self.cache.set_many("model-a", ["hello world"], [[0.5, 0.25]])
+        cached = await self.cache.get_many("model-a", ["hello   world", "unknown"])
+
+        assert np.allclose(cached[0], [0.5, 0.25])
+        assert cached[1] is None
+        assert all(ex == 60 for _, ex in self.redis.store.values())
+
+        cold = EmbeddingCache(self.redis)
+        assert np.allclose((await cold.get_many("model-a", ["hello world"]))[0], [0.5, 0.25])
+        assert cold.stats()["redis_hits"] == 1
+        assert self.cache.stats()["memory_hits"] == 1 and self.cache.stats()["misses"] == 1
+
+    @pytest.mark.asyncio
+    async def test_keys_are_scoped_by_model(self):
+        await self.cache.set_many("model-a", ["text"], [[1.0]])
+        assert (await self.cache.get_many("model-b", ["text"]))[0] is None
+
+    @pytest.mark.asyncio
+    async def test_memory_tier_is_bounded_by_bytes(self):
+        cache = EmbeddingCache(None, max_bytes=3 * 4 * 4)
+        await cache.set_many("m", ["a", "b", "c", "d"], [[1.0] * 4] * 4)
+
+        cached = await cache.get_many("m", ["a", "b", "c", "d"])
+        assert cached[0] is None
+        assert all(c is not None for c in cached[1:])
+        assert cache.stats()["memory_bytes"] <= 48
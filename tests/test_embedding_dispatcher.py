@@ -0,0 +1,79 @@
+import pytest
+import asyncio
+import random
+from services.embedding_dispatcher import EmbeddingDispatcher
+
+class RateLimited(Exception):
+    status_code = 429
+
+class FakeProvider:
+    """Local stand-in for a remote embedding API."""
+
+    def __init__(self, fail_first=0, error=RateLimited):
+        self.calls = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.fail_first = fail_first
+        self.error = error
+
+    async def embed(self, batch):
+        self.calls += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(random.uniform(0, 0.01))
+            if self.calls <= self.fail_first:
+                raise self.error("slow down")
+            return [[float(text)] for text in batch]
+        finally:
+            self.in_flight -= 1
+
+class TestEmbeddingDispatcher:
+    def setup_method(self):
+        self.delays = []
+
+        async def record_sleep(delay):
+            self.delays.append(delay)
+
+        self.sleep = record_sleep
+        self.texts = [str(i) for i in range(500)]
+
+    @pytest.mark.asyncio
+    async def test_batches_run_concurrently_and_preserve_order(self):
+        provider = FakeProvider()
+        dispatcher = EmbeddingDispatcher(batch_size=100, max_in_flight=3, sleep=self.sleep)
+
+        embeddings = await dispatcher.dispatch(self.texts, provider.embed)
+
+        assert embeddings == [[float(i)] for i in range(500)]
+        assert provider.calls == 5
+        assert 1 < provider.peak_in_flight <= 3
+
+    @pytest.mark.asyncio
+    async def test_rate_limited_batches_are_retried(self):
+        provider = FakeProvider(fail_first=2)
+        dispatcher = EmbeddingDispatcher(batch_size=500, max_in_flight=1, max_retries=3, sleep=self.sleep)
+
+        embeddings = await dispatcher.dispatch(self.texts, provider.embed)
+
+        assert len(embeddings) == 500
+        assert provider.calls == 3
+        assert len(self.delays) == 2
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_max_retries(self):
+        provider = FakeProvider(fail_first=10)
+        dispatcher = EmbeddingDispatcher(batch_size=500, max_retries=2, sleep=self.sleep)
+
+        with pytest.raises(RateLimited):
+            await dispatcher.dispatch(self.texts, provider.embed)
+        assert provider.calls == 3
+
+    @pytest.mark.asyncio
+    async def test_non_retryable_errors_propagate(self):
+        provider = FakeProvider(fail_first=1, error=ValueError)
+        dispatcher = EmbeddingDispatcher(batch_size=500, sleep=self.sleep)
+
+        with pytest.raises(ValueError):
+            await dispatcher.dispatch(self.texts, provider.embed)
+        assert self.delays == []
@@ -0,0 +1,81 @@
+import asyncio
+import threading
+import time
+import numpy as np
+import pytest
+from services.encoder_service import MicroBatchEncoder
+
+
+class FakeModel:
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = []
+        self.threads = set()
+
+    def encode(self, texts, normalize_embeddings=False, **kwargs):
+        self.calls.append(list(texts))
+        self.threads.add(threading.get_ident())
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("encode failed")
+        return np.array([[float(len(text)), 1.0 if normalize_embeddings else 0.0] for text in texts])
+
+
+class TestMicroBatchEncoder:
+    def setup_method(self):
+        self.model = FakeModel()
+        self.encoder = MicroBatchEncoder(lambda: self.model, max_batch_size=64, max_wait_ms=20)
+
+    def teardown_method(self):
+        self.encoder.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_share_one_encode(self):
+        requests = [["a" * i, "b" * (i + 1)] for i in range(1, 9)]
+        results = await asyncio.gather(*(self.encoder.encode(texts) for texts in requests))
+
+        assert len(self.model.calls) == 1
+        assert len(self.model.calls[0]) == 16
+        for texts, rows in zip(requests, results):
+            assert rows[:, 0].tolist() == [len(text) for text in texts]
+
+    @pytest.mark.asyncio
+    async def test_normalize_flag_is_not_mixed_within_a_batch(self):
+        plain, normalized = await asyncio.gather(
+            self.encoder.encode(["x"]),
+            self.encoder.encode(["y"], normalize=True),
+        )
+
+        assert len(self.model.calls) == 2
+        assert plain[0, 1] == 0.0
+        assert normalized[0, 1] == 1.0
+
+    @pytest.mark.asyncio
+    async def test_inference_runs_off_the_event_loop(self):
+        self.model.delay = 0.2
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        await self.encoder.encode(["slow"])
+        task.cancel()
+
+        assert ticks >= 5
+        assert threading.get_ident() not in self.model.threads
+
+    @pytest.mark.asyncio
+    async def test_errors_reach_every_caller(self):
+        self.model.fail = True
+        results = await asyncio.gather(
+            self.encoder.encode(["a"]),
+            self.encoder.encode(["b"]),
+            return_exceptions=True,
+        )
+
+        assert all(isinstance(result, RuntimeError) for result in results)
@@ -0,0 +1,159 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, FileModel
+from schemas import ChunkingMethod, EmbeddingModel
+from services.chunking_service import ChunkingService, ChunkSpan
+from services.file_service import FileService
+from services.ingestion_service import IngestionService
+from services.local_vector_store import LocalVectorStore
+from services.vector_service import VectorService
+
+MODEL = EmbeddingModel.SENTENCE_TRANSFORMER
+METHOD = ChunkingMethod.CUSTOM
+
+
+class LineChunker:
+    """One chunk per non-empty line, without its surrounding whitespace."""
+
+    async def chunk_spans(self, text, method, with_embeddings=False):
+        spans, start = [], 0
+        for line in text.split("\n"):
+            if line.strip():
+                leading = len(line) - len(line.lstrip())
+                spans.append(ChunkSpan(start + leading, start + len(line.rstrip())))
+            start += len(line) + 1
+        return spans
+
+    iter_chunks = ChunkingService.iter_chunks
+
+
+class FakeEmbedder:
+    def __init__(self):
+        self.embedded = []
+
+    async def generate_embeddings(self, texts, model):
+        self.embedded.extend(texts)
+        return [[1.0, float(len(text)), float(sum(map(ord, text)) % 17)] for text in texts]
+
+
+class TestIngestionService:
+    def setup_method(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.db = sessionmaker(bind=engine)()
+        self.embedder = FakeEmbedder()
+        self.vector_service = VectorService(LocalVectorStore())
+        self.service = IngestionService(FileService(), LineChunker(), self.embedder, self.vector_service)
+
+    def payloads(self):
+        collection = self.vector_service.store.collections[self.vector_service.collection_for(MODEL)]
+        return {payload["text"]: payload for point_id, payload in zip(collection.ids, collection.payloads) if point_id}
+
+    @pytest.mark.asyncio
+    async def test_ingest_stores_chunks_with_owner_positions(self):
+        await self.vector_service.initialize()
+
+        record = await self.service.ingest(b"  first\nsecond\nfirst\n", "a.txt", METHOD, MODEL, self.db)
+
+        assert (record.chunk_count, record.version) == (3, 1)
+        assert record.original_text == "first\nsecond\nfirst"
+        assert sorted(self.embedder.embedded) == ["first", "second"]
+        payloads = self.payloads()
+        assert payloads["second"]["file_id"] == [record.id]
+        assert payloads["second"]["file_chunks"][str(record.id)]["start_offset"] == 6
+        assert payloads["first"]["file_chunks"][str(record.id)]["chunk_index"] == 0
+        assert self.service.find_duplicate(b"  first\nsecond\nfirst\n", METHOD, MODEL, self.db).id == record.id
+
+    @pytest.mark.asyncio
+    async def test_shared_chunks_are_embedded_once_and_owned_by_both_files(self):
+        await self.vector_service.initialize()
+        first = await self.service.ingest(b"shared\nonly a", "a.txt", METHOD, MODEL, self.db)
+        self.embedder.embedded.clear()
+
+        second = await self.service.ingest(b"only b\nshared", "b.txt", METHOD, MODEL, self.db)
+
+        assert self.embedder.embedded == ["only b"]
+        payloads = self.payloads()
+        assert payloads["shared"]["file_id"] == [first.id, second.id]
+        assert payloads["shared"]["file_names"] == {str(first.id): "a.txt", str(second.id): "b.txt"}
+        assert payloads["shared"]["file_chunks"][str(second.id)]["chunk_index"] == 1
+
+    @pytest.mark.asyncio
+    async def test_reingest_embeds_only_new_chunks_and_keeps_shared_ones(self):
+        await self.vector_service.initialize()
+        first = await self.service.ingest(b"shared\nkept\ndropped", "a.txt", METHOD, MODEL, self.db)
+        second = await self.service.ingest(b"shared\nother", "b.txt", METHOD, MODEL, self.db)
+        self.embedder.embedded.clear()
+
+        response = await self.service.reingest(first, b"kept\nadded", "a2.txt", METHOD, MODEL, self.db)
+
+        assert self.embedder.embedded == ["added"]
+        assert (response.chunks_added, response.chunks_removed, response.chunks_unchanged) == (1, 1, 1)
+        assert (response.version, response.filename, response.chunk_count) == (2, "a2.txt", 2)
+        payloads = self.payloads()
+        assert "dropped" not in payloads
+        assert payloads["shared"]["file_id"] == [second.id]
+        assert payloads["kept"]["file_names"] == {str(first.id): "a2.txt"}
+        assert payloads["kept"]["file_chunks"][str(first.id)]["chunk_index"] == 0
+
+        unchanged = await self.service.reingest(first, b"kept\nadded", "a2.txt", METHOD, MODEL, self.db)
+        assert (unchanged.message, unchanged.version, unchanged.chunks_unchanged) == ("File unchanged", 2, 2)
+
+    @pytest.mark.asyncio
+    async def test_reingest_deletes_ownerless_points_of_older_records(self):
+        await self.vector_service.initialize()
+        # Stored before file owners were recorded on the points
+        vector_ids = await self.vector_service.store_embeddings(
+            [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]], ["legacy", "kept"], "old.txt", METHOD, MODEL
+        )
+        record = FileModel(
+            filename="old.txt", content_hash="old", original_text="legacy\nkept",
+            chunking_method=METHOD, embedding_model=MODEL, chunk_count=2, vector_ids=vector_ids
+        )
+        self.db.add(record)
+        self.db.commit()
+
+        response = await self.service.reingest(record, b"kept", "old.txt", METHOD, MODEL, self.db)
+
+        assert (response.chunks_added, response.chunks_removed, response.chunks_unchanged) == (0, 1, 1)
+        payloads = self.payloads()
+        assert "legacy" not in payloads
+        assert payloads["kept"]["file_id"] == [record.id]
+
+    @pytest.mark.asyncio
+    async def test_ingest_batch_reuses_records_and_reports_failures(self):
+        changes = []
+
+        async def listener():
+            changes.append(True)
+
+        await self.vector_service.initialize()
+        existing = await self.service.ingest(b"old\nshared", "old.txt", METHOD, MODEL, self.db)
+        await self.service.reingest(existing, b"older\nshared", "old.txt", METHOD, MODEL, self.db)
+        self.vector_service.change_listeners.append(listener)
+        self.embedder.embedded.clear()
+
+        response = await self.service.ingest_batch([
+            ("a.txt", b"shared\nnew a"),
+            ("old.txt", b"older\nshared"),
+            ("b.txt", b"new b\nnew a"),
+            ("copy.txt", b"shared\nnew a"),
+            ("empty.txt", b"  \n"),
+        ], METHOD, MODEL, self.db)
+
+        assert sorted(self.embedder.embedded) == ["new a", "new b"]
+        assert len(changes) == 2  # one upsert, one owner assignment
+        assert [(f.filename, f.version, f.chunk_count) for f in response.files] == [
+            ("a.txt", 1, 2), ("old.txt", 2, 2), ("b.txt", 1, 2), ("copy.txt", 1, 2)
+        ]
+        assert response.files[1].file_id == existing.id
+        assert response.files[3].file_id == response.files[0].file_id
+        assert response.files[3].message == "File already processed, returning existing record"
+        assert [f.filename for f in response.failed] == ["empty.txt"]
+        assert response.total_chunks == 4
+        payloads = self.payloads()
+        a_id, b_id = response.files[0].file_id, response.files[2].file_id
+        assert payloads["new a"]["file_id"] == [a_id, b_id]
+        assert payloads["new a"]["file_chunks"][str(b_id)]["chunk_index"] == 1
+        assert payloads["shared"]["file_id"] == [existing.id, a_id]
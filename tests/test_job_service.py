@@ -0,0 +1,66 @@
+import pytest
+import asyncio
+from services.job_service import JobService, IngestionJob
+from schemas import ChunkingMethod, EmbeddingModel, IngestionStage, JobStatus, StageStatus
+
+class TestJobService:
+    def make_job(self, name="cv.txt"):
+        return IngestionJob(name, ChunkingMethod.RECURSIVE, EmbeddingModel.SENTENCE_TRANSFORMER)
+
+    @pytest.mark.asyncio
+    async def test_job_completes_with_stage_progress(self):
+        service = JobService(max_concurrency=1, max_queue_size=10)
+
+        async def handler(job, content):
+            job.report(IngestionStage.CHUNKING, StageStatus.DONE, completed=3, total=3)
+            job.chunk_count = len(content)
+
+        await service.start(handler)
+        job = service.submit(self.make_job(), content=b"abc")
+        await service._queue.join()
+        await service.stop()
+
+        assert service.get(job.job_id).status == JobStatus.COMPLETED
+        response = job.to_response()
+        assert response.chunk_count == 3
+        assert response.stages[IngestionStage.CHUNKING].status == StageStatus.DONE
+        assert response.stages[IngestionStage.EMBEDDING].status == StageStatus.PENDING
+
+    @pytest.mark.asyncio
+    async def test_concurrency_is_bounded_and_failures_recorded(self):
+        service = JobService(max_concurrency=2, max_queue_size=10)
+        running = 0
+        peak = 0
+
+        async def handler(job, fail):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            if fail:
+                raise ValueError("boom")
+
+        await service.start(handler)
+        jobs = [service.submit(self.make_job(f"{i}.txt"), fail=(i == 0)) for i in range(6)]
+        await service._queue.join()
+        await service.stop()
+
+        assert peak == 2
+        assert jobs[0].status == JobStatus.FAILED and jobs[0].error == "boom"
+        assert all(j.status == JobStatus.COMPLETED for j in jobs[1:])
+
+    @pytest.mark.asyncio
+    async def test_queue_full(self):
+        service = JobService(max_concurrency=1, max_queue_size=1)
+
+        async def handler(job):
+            await asyncio.sleep(1)
+
+        await service.start(handler)
+        service.submit(self.make_job())
+        await asyncio.sleep(0.01)  # let the worker pick up the first job
+        service.submit(self.make_job())
+        with pytest.raises(asyncio.QueueFull):
+            service.submit(self.make_job())
+        await service.stop()
@@ -0,0 +1,375 @@
+import os
+import numpy as np
+import pytest
+from config.settings import settings
+from schemas import ChunkingMethod, EmbeddingModel, SimilarityAlgorithm
+from services.chunking_service import ChunkSpan
+from services.local_vector_store import LocalVectorStore
+from services.vector_service import VectorService
+from services.vector_store import VectorRecord
+from services.vector_quantization import quantization_report
+
+
+def random_records(count: int, size: int = 16, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return [VectorRecord(f"id-{i}", rng.normal(size=size).tolist(), {"n": i}) for i in range(count)]
+
+
+class TestLocalVectorStore:
+    def setup_method(self):
+        self.store = LocalVectorStore()
+
+    @pytest.mark.asyncio
+    async def test_cosine_and_euclidean_rank_differently(self):
+        await self.store.create_collection("docs", 2)
+        await self.store.upsert("docs", [
+            VectorRecord("far-aligned", [10.0, 0.0], {}),
+            VectorRecord("near-skewed", [0.8, 0.6], {}),
+        ])
+
+        cosine = await self.store.search("docs", [1.0, 0.0], 2, SimilarityAlgorithm.COSINE)
+        euclidean = await self.store.search("docs", [1.0, 0.0], 2, SimilarityAlgorithm.EUCLIDEAN)
+
+        assert [hit.id for hit in cosine] == ["far-aligned", "near-skewed"]
+        assert cosine[0].score == pytest.approx(1.0)
+        assert [hit.id for hit in euclidean] == ["near-skewed", "far-aligned"]
+        assert euclidean[1].score == pytest.approx(1.0 / 10.0)
+
+    @pytest.mark.asyncio
+    async def test_upsert_replaces_and_delete_hides(self):
+        await self.store.create_collection("docs", 2)
+        await self.store.upsert("docs", [VectorRecord("a", [1.0, 0.0], {"v": 1}), VectorRecord("b", [0.0, 1.0], {})])
+        await self.store.upsert("docs", [VectorRecord("a", [0.0, 1.0], {"v": 2})])
+        await self.store.delete("docs", ["b"])
+
+        hits = await self.store.search("docs", [0.0, 1.0], 5)
+
+        assert [(hit.id, hit.payload) for hit in hits] == [("a", {"v": 2})]
+        assert await self.store.count("docs") == 1
+        assert await self.store.retrieve_ids("docs", ["a", "b"]) == {"a"}
+
+    @pytest.mark.asyncio
+    async def test_indexed_filters_follow_payload_changes(self):
+        await self.store.create_collection("docs", 16)
+        await self.store.create_payload_index("docs", "file_id", "integer")
+        records = random_records(100)
+        for record in records:
+            record.payload = {"file_id": [record.payload["n"] % 3]}
+        await self.store.upsert("docs", records)
+        await self.store.set_payload("docs", ["id-1"], {"file_id": [0, 1]})
+        await self.store.delete("docs", ["id-3"])
+
+        hits = await self.store.search("docs", records[0].vector, 100, filters={"file_id": [0]})
+
+        assert sorted(hit.id for hit in hits) == sorted(
+            f"id-{i}" for i in range(100) if (i % 3 == 0 and i != 3) or i == 1
+        )
+
+    @pytest.mark.asyncio
+    async def test_persists_and_reloads(self, tmp_path):
+        store = LocalVectorStore(str(tmp_path))
+        records = random_records(50)
+        await store.create_collection("docs", 16)
+        await store.upsert("docs", records)
+        await store.delete("docs", ["id-3"])
+        expected = await store.search("docs", records[7].vector, 3)
+        await store.close()
+
+        reloaded = LocalVectorStore(str(tmp_path))
+        hits = await reloaded.search("docs", records[7].vector, 3)
+
+        assert await reloaded.count("docs") == 49
+        assert [hit.id for hit in hits] == [hit.id for hit in expected]
+        assert hits[0].id == "id-7"
+        await reloaded.upsert("docs", [VectorRecord("new", records[3].vector, {})])
+        assert (await reloaded.search("docs", records[3].vector, 1))[0].id == "new"
+
+    @pytest.mark.asyncio
+    async def test_flushes_in_background_and_drops_stale_graph(self, tmp_path, monkeypatch):
+        pytest.importorskip("hnswlib")
+        monkeypatch.setattr(settings, "LOCAL_VECTOR_STORE_FLUSH_SECONDS", 0.0)
+        monkeypatch.setattr(settings, "LOCAL_HNSW_MIN_POINTS", 10)
+        store = LocalVectorStore(str(tmp_path))
+        records = random_records(50)
+        await store.create_collection("docs", 16)
+        await store.upsert("docs", records)
+        await store.search("docs", records[0].vector, 1)
+        await store.delete("docs", ["id-7"])
+        await store._flush_task
+
+        reloaded = LocalVectorStore(str(tmp_path))
+        hits = await reloaded.search("docs", records[7].vector, 3)
+
+        assert await reloaded.count("docs") == 49
+        assert len(hits) == 3 and None not in [hit.id for hit in hits]
+        assert "id-7" not in [hit.id for hit in hits]
+
+    @pytest.mark.asyncio
+    async def test_reload_maps_rows_and_flushes_only_changes(self, tmp_path):
+        store = LocalVectorStore(str(tmp_path))
+        records = random_records(50)
+        await store.create_collection("docs", 16, quantization="scalar")
+        await store.upsert("docs", records)
+        await store.flush()
+        await store.set_payload("docs", ["id-1"], {"n": -1})
+        await store.flush()
+        with open(tmp_path / "docs" / "rows-0.jsonl") as f:
+            assert len(f.readlines()) == 51
+        await store.close()
+
+        reloaded = LocalVectorStore(str(tmp_path))
+        collection = reloaded.collections["docs"]
+        assert isinstance(collection.vectors, np.memmap) and isinstance(collection.codes, np.memmap)
+        assert collection.payloads[1] == {"n": -1}
+        assert (await reloaded.search("docs", records[7].vector, 1))[0].id == "id-7"
+
+        await reloaded.upsert("docs", random_records(100, seed=1)[50:])
+        assert isinstance(collection.vectors, np.memmap) and len(collection.vectors) >= 100
+        assert (await reloaded.search("docs", records[7].vector, 1))[0].id == "id-7"
+
+    @pytest.mark.asyncio
+    async def test_compacts_tombstones(self, tmp_path, monkeypatch):
+        monkeypatch.setattr("services.local_vector_store.COMPACT_MIN_ROWS", 10)
+        store = LocalVectorStore(str(tmp_path))
+        records = random_records(50)
+        await store.create_collection("docs", 16)
+        await store.create_payload_index("docs", "n", "integer")
+        await store.upsert("docs", records)
+        await store.flush()
+        await store.delete("docs", [f"id-{i}" for i in range(40)])
+        await store.flush()
+
+        collection = store.collections["docs"]
+        assert collection.generation == 1 and collection.used == 10
+        assert sorted(os.listdir(tmp_path / "docs")) == [
+            "meta.json", "norms-1.f32", "rows-1.jsonl", "vectors-1.f32"
+        ]
+        hits = await store.search("docs", records[45].vector, 3, filters={"n": [44, 45]})
+        assert [hit.id for hit in hits] == ["id-45", "id-44"]
+        await store.close()
+
+        reloaded = LocalVectorStore(str(tmp_path))
+        assert await reloaded.count("docs") == 10
+        assert (await reloaded.search("docs", records[45].vector, 1))[0].id == "id-45"
+
+    @pytest.mark.asyncio
+    async def test_in_memory_collections_compact_on_delete(self, monkeypatch):
+        monkeypatch.setattr("services.local_vector_store.COMPACT_MIN_ROWS", 10)
+        records = random_records(50)
+        await self.store.create_collection("docs", 16)
+        await self.store.upsert("docs", records)
+        await self.store.delete("docs", [f"id-{i}" for i in range(30)])
+
+        assert self.store.collections["docs"].used == 20
+        assert (await self.store.search("docs", records[42].vector, 1))[0].id == "id-42"
+
+    @pytest.mark.asyncio
+    async def test_hnsw_index_for_large_collections(self, monkeypatch):
+        pytest.importorskip("hnswlib")
+        monkeypatch.setattr(settings, "LOCAL_HNSW_MIN_POINTS", 100)
+        records = random_records(500)
+        await self.store.create_collection("docs", 16)
+        await self.store.upsert("docs", records)
+
+        hits = await self.store.search("docs", records[42].vector, 5)
+        await self.store.delete("docs", ["id-42"])
+        after_delete = await self.store.search("docs", records[42].vector, 5)
+
+        assert self.store.collections["docs"].hnsw is not None
+        assert hits[0].id == "id-42"
+        assert "id-42" not in [hit.id for hit in after_delete]
+
+
+class TestVectorServiceWithLocalStore:
+    def setup_method(self):
+        self.service = VectorService(LocalVectorStore())
+
+    @pytest.mark.asyncio
+    async def test_models_get_separate_collections(self):
+        await self.service.initialize()
+        await self.service.store_embeddings(
+            [[1.0, 0.0, 0.0]], ["sentence"], "a.txt", ChunkingMethod.CUSTOM, EmbeddingModel.SENTENCE_TRANSFORMER
+        )
+        await self.service.store_embeddings(
+            [[0.0, 1.0, 0.0, 0.0]], ["openai"], "b.txt", ChunkingMethod.CUSTOM, EmbeddingModel.OPENAI
+        )
+
+        assert await self.service.available_models() == [EmbeddingModel.SENTENCE_TRANSFORMER, EmbeddingModel.OPENAI]
+        [hits] = await self.service.search_models({
+            EmbeddingModel.SENTENCE_TRANSFORMER: [[1.0, 0.0, 0.0]],
+            EmbeddingModel.OPENAI: [[0.0, 1.0, 0.0, 0.0]],
+        }, limit=2)
+        assert sorted(hit["filename"] for hit in hits) == ["a.txt", "b.txt"]
+
+    @pytest.mark.asyncio
+    async def test_models_are_merged_by_rank_fusion(self):
+        await self.service.initialize()
+        await self.service.store_embeddings(
+            [[1.0, 0.0], [0.9, 0.1]], ["only sentence", "shared"], "a.txt",
+            ChunkingMethod.CUSTOM, EmbeddingModel.SENTENCE_TRANSFORMER
+        )
+        await self.service.store_embeddings(
+            [[0.0, 1.0, 0.0], [0.0, 0.9, 0.1]], ["only openai", "shared"], "a.txt",
+            ChunkingMethod.CUSTOM, EmbeddingModel.OPENAI
+        )
+
+        [hits] = await self.service.search_models({
+            EmbeddingModel.SENTENCE_TRANSFORMER: [[1.0, 0.0]],
+            EmbeddingModel.OPENAI: [[0.0, 1.0, 0.0]],
+        }, limit=3)
+        assert hits[0]["text"] == "shared"
+        assert sorted(hit["text"] for hit in hits[1:]) == ["only openai", "only sentence"]
+
+        await self.service.delete_points(
+            self.service.chunk_point_ids(["only openai", "shared"], EmbeddingModel.OPENAI), EmbeddingModel.OPENAI
+        )
+        assert await self.service.available_models() == [EmbeddingModel.SENTENCE_TRANSFORMER]
+
+    @pytest.mark.asyncio
+    async def test_corpus_changes_notify_listeners(self):
+        changes = []
+
+        async def listener():
+            changes.append(True)
+
+        self.service.change_listeners.append(listener)
+        await self.service.initialize()
+        model = EmbeddingModel.SENTENCE_TRANSFORMER
+        ids = await self.service.store_embeddings([[1.0, 0.0]], ["text"], "a.txt", ChunkingMethod.CUSTOM, model)
+        await self.service.store_embeddings([None], ["text"], "b.txt", ChunkingMethod.CUSTOM, model)
+        assert len(changes) == 1
+        await self.service.assign_file(ids, 1, "a.txt", model, ChunkingMethod.CUSTOM)
+        await self.service.delete_points(ids, model)
+        assert len(changes) == 3
+
+
+class TestQuantizedSearch:
+    def setup_method(self):
+        rng = np.random.default_rng(1)
+        centers = rng.normal(size=(20, 64))
+        self.vectors = (centers[rng.integers(0, 20, 2000)] + 0.5 * rng.normal(size=(2000, 64))).astype(np.float32)
+        self.queries = self.vectors[:20] + 0.05 * rng.normal(size=(20, 64)).astype(np.float32)
+
+    @pytest.mark.asyncio
+    async def test_scalar_search_rescores_with_original_vectors(self):
+        store = LocalVectorStore()
+        await store.create_collection("exact", 64)
+        await store.create_collection("scalar", 64, quantization="scalar")
+        records = [VectorRecord(f"id-{i}", vector.tolist(), {}) for i, vector in enumerate(self.vectors)]
+        await store.upsert("exact", records)
+        await store.upsert("scalar", records)
+
+        for query in self.queries:
+            exact = await store.search("exact", query.tolist(), 5)
+            quantized = await store.search("scalar", query.tolist(), 5)
+            assert [hit.id for hit in quantized] == [hit.id for hit in exact]
+            assert [hit.score for hit in quantized] == pytest.approx([hit.score for hit in exact], abs=1e-5)
+
+    @pytest.mark.asyncio
+    async def test_persisted_originals_stay_memory_mapped(self, tmp_path):
+        store = LocalVectorStore(str(tmp_path))
+        await store.create_collection("scalar", 64, quantization="scalar")
+        records = [VectorRecord(f"id-{i}", vector.tolist(), {}) for i, vector in enumerate(self.vectors)]
+        await store.upsert("scalar", records[:1000])
+        await store.close()
+
+        reloaded = LocalVectorStore(str(tmp_path))
+        await reloaded.upsert("scalar", records[1000:])
+        collection = reloaded.collections["scalar"]
+
+        assert isinstance(collection.vectors, np.memmap)
+        assert collection.vectors.filename.endswith("vectors-0.f32")
+        assert (await reloaded.search("scalar", self.queries[0].tolist(), 1))[0].id == "id-0"
+
+    def test_recall_report(self):
+        report = quantization_report(self.vectors, self.queries, limit=10, oversampling=4.0)
+
+        assert report["scalar"]["recall"] >= 0.95
+        assert 0.0 < report["binary"]["recall"] <= 1.0
+        assert report["scalar"]["bytes_per_vector"] == 64
+        assert report["binary"]["bytes_per_vector"] == 8
+
+
+class TestFilteredSearch:
+    def setup_method(self):
+        self.service = VectorService(LocalVectorStore())
+
+    @pytest.mark.asyncio
+    async def test_file_ids_follow_shared_chunks_and_filter_search(self):
+        model = EmbeddingModel.SENTENCE_TRANSFORMER
+        await self.service.initialize()
+        first = await self.service.store_embeddings(
+            [[1.0, 0.0], [0.0, 1.0]], ["shared", "only first"], "a.txt", ChunkingMethod.CUSTOM, model
+        )
+        second = await self.service.store_embeddings(
+            [None, [0.7, 0.7]], ["shared", "only second"], "b.txt", ChunkingMethod.CUSTOM, model
+        )
+        await self.service.assign_file(first, 1, "a.txt", model, ChunkingMethod.CUSTOM)
+        await self.service.assign_file(second, 2, "b.txt", model, ChunkingMethod.CUSTOM)
+
+        hits = await self.service.search_similar([1.0, 0.0], model, limit=5, filters={"file_id": 2})
+        assert [hit["text"] for hit in hits] == ["shared", "only second"]
+        hits = await self.service.search_similar([1.0, 0.0], model, limit=5, filters={"filename": "b.txt"})
+        assert [(hit["text"], hit["filename"]) for hit in hits] == [("shared", "b.txt"), ("only second", "b.txt")]
+
+        assert await self.service.point_owners(first + ["missing"], model) == {first[0]: {1, 2}, first[1]: {1}}
+
+        await self.service.unassign_file(first[:1], 1, model)
+        hits = await self.service.search_similar([1.0, 0.0], model, limit=5, filters={"file_id": [1]})
+        assert [hit["text"] for hit in hits] == ["only first"]
+        [lexical] = await self.service.search_lexical(["only"], filters={"filename": "b.txt"})
+        assert [hit["text"] for hit in lexical] == ["only second"]
+        [merged] = await self.service.search_models({model: [[1.0, 0.0]]}, limit=5, filters={"filename": "a.txt"})
+        assert [hit["text"] for hit in merged] == ["only first"]
+
+        await self.service.assign_file(second, 2, "c.txt", model, ChunkingMethod.CUSTOM)
+        hits = await self.service.search_similar([1.0, 0.0], model, limit=5, filters={"filename": ["b.txt", "c.txt"]})
+        assert [(hit["text"], hit["filename"]) for hit in hits] == [("shared", "c.txt"), ("only second", "c.txt")]
+
+    @pytest.mark.asyncio
+    async def test_shared_chunks_keep_each_files_position_and_chunking_method(self):
+        model = EmbeddingModel.SENTENCE_TRANSFORMER
+        await self.service.initialize()
+        first = await self.service.store_embeddings(
+            [[0.0, 1.0], [1.0, 0.0]], ["intro", "shared"], "a.txt", ChunkingMethod.CUSTOM, model
+        )
+        second = await self.service.store_embeddings(
+            [[0.6, 0.8], None], ["other", "shared"], "b.txt", ChunkingMethod.RECURSIVE, model
+        )
+        await self.service.assign_file(first, 1, "a.txt", model, ChunkingMethod.CUSTOM)
+        await self.service.assign_file(second[::-1], 2, "b.txt", model, ChunkingMethod.RECURSIVE)
+
+        [hit] = await self.service.search_similar([1.0, 0.0], model, limit=1)
+        assert hit["filename"] == "a.txt, b.txt"
+        assert hit["locations"] == [
+            {"file_id": 1, "filename": "a.txt", "chunk_index": 1},
+            {"file_id": 2, "filename": "b.txt", "chunk_index": 0},
+        ]
+        [hit] = await self.service.search_similar([1.0, 0.0], model, limit=1, filters={"chunking_method": "recursive"})
+        assert (hit["text"], hit["filename"], hit["chunk_index"]) == ("shared", "b.txt", 0)
+
+        for file_id in range(3, 8):
+            await self.service.assign_file(first[1:], file_id, f"{file_id}.txt", model, ChunkingMethod.CUSTOM)
+        [hit] = await self.service.search_similar([1.0, 0.0], model, limit=1)
+        assert hit["filename"] == "a.txt, b.txt, 3.txt and 4 more"
+        assert len(hit["locations"]) == 7
+
+    @pytest.mark.asyncio
+    async def test_offsets_are_kept_per_file(self):
+        model = EmbeddingModel.SENTENCE_TRANSFORMER
+        await self.service.initialize()
+        ids = await self.service.store_embeddings([[1.0, 0.0]], ["shared"], "a.txt", ChunkingMethod.TOKEN, model)
+        await self.service.assign_file(ids, 1, "a.txt", model, ChunkingMethod.TOKEN, [ChunkSpan(0, 6, token_count=1)])
+        await self.service.assign_file(ids, 2, "b.txt", model, ChunkingMethod.CUSTOM, [ChunkSpan(10, 16)])
+
+        payloads = await self.service.store.retrieve_payloads(self.service.collection_for(model), ids)
+        assert payloads[ids[0]]["file_chunks"] == {
+            "1": {"chunk_index": 0, "chunking_method": "token", "start_offset": 0, "end_offset": 6, "token_count": 1},
+            "2": {"chunk_index": 0, "chunking_method": "custom", "start_offset": 10, "end_offset": 16},
+        }
+        assert "start_offset" not in payloads[ids[0]]
+
+    @pytest.mark.asyncio
+    async def test_rejects_unindexed_filter_fields(self):
+        with pytest.raises(ValueError):
+            await self.service.search_similar([1.0, 0.0], filters={"text": "x"})
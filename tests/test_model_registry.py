@@ -0,0 +1,63 @@
+import pytest
+from services import model_registry as registry_module
+from services.model_registry import ModelRegistry
+
+class TestModelRegistry:
+    def setup_method(self):
+        self.loads = []
+
+        def fake_sentence_transformer(name, device=None):
+            self.loads.append((name, device))
+            return object()
+
+        self.fake_sentence_transformer = fake_sentence_transformer
+
+    def test_model_is_loaded_once_and_shared(self, monkeypatch):
+        monkeypatch.setattr(registry_module, "SentenceTransformer", self.fake_sentence_transformer)
+        registry = ModelRegistry()
+
+        first = registry.get_sentence_transformer("all-MiniLM-L6-v2", "cpu")
+        second = registry.get_sentence_transformer("all-MiniLM-L6-v2", "cpu")
+
+        assert first is second
+        assert self.loads == [("all-MiniLM-L6-v2", "cpu")]
+
+    def test_warm_up_loads_eagerly(self, monkeypatch):
+        monkeypatch.setattr(registry_module, "SentenceTransformer", self.fake_sentence_transformer)
+        registry = ModelRegistry()
+
+        registry.warm_up(["model-a", "model-b"])
+
+        assert [name for name, _ in self.loads] == ["model-a", "model-b"]
+        assert set(registry.loaded_models()) == {"model-a", "model-b"}
+
+    def test_backends_are_cached_separately(self, monkeypatch):
+        monkeypatch.setattr(registry_module, "SentenceTransformer", self.fake_sentence_transformer)
+        monkeypatch.setattr(
+            registry_module, "_load_onnx_model",
+            lambda name, device, quantization: self.loads.append((name, "onnx")) or object(),
+        )
+        registry = ModelRegistry()
+
+        torch_model = registry.get_sentence_transformer("model-a", "cpu", backend="torch")
+        onnx_model = registry.get_sentence_transformer("model-a", "cpu", backend="onnx")
+
+        assert torch_model is not onnx_model
+        assert registry.get_sentence_transformer("model-a", "cpu", backend="onnx") is onnx_model
+        assert self.loads == [("model-a", "cpu"), ("model-a", "onnx")]
+
+    def test_onnx_backend_matches_torch(self):
+        pytest.importorskip("onnxruntime")
+        pytest.importorskip("optimum")
+        registry = ModelRegistry()
+        try:
+            registry.get_sentence_transformer(backend="torch")
+        except Exception as e:
+            pytest.skip(f"Model unavailable: {e}")
+
+        parity = registry_module.backend_parity(
+            ["Python developer with five years of experience.", "The interview is on Monday."],
+            registry=registry,
+        )
+
+        assert parity["min_cosine"] > 0.99
@@ -0,0 +1,156 @@
+import pytest
+from qdrant_client.models import PayloadSchemaType
+from config.settings import settings
+from schemas import ChunkingMethod, EmbeddingModel, SimilarityAlgorithm
+from services.qdrant_store import QdrantVectorStore
+from services.vector_service import VectorService
+from services.vector_store import VectorRecord
+
+
+def recording(calls, method):
+    async def record(*args, **kwargs):
+        calls.append(kwargs)
+        return await method(*args, **kwargs)
+    return record
+
+
+@pytest.mark.filterwarnings("ignore:Payload indexes have no effect", "ignore:Local mode performs exact")
+class TestVectorServiceWithQdrant:
+    def setup_method(self):
+        self.store = QdrantVectorStore(":memory:")
+        self.service = VectorService(self.store)
+        self.model = EmbeddingModel.SENTENCE_TRANSFORMER
+
+    @pytest.mark.asyncio
+    async def test_creates_payload_indexes_with_each_collection(self, monkeypatch):
+        calls = []
+        monkeypatch.setattr(
+            self.store.client, "create_payload_index", recording(calls, self.store.client.create_payload_index)
+        )
+        await self.service.initialize()
+        await self.service.store_embeddings([[1.0, 0.0]], ["text"], "a.txt", ChunkingMethod.CUSTOM, self.model)
+
+        indexed = {(call["collection_name"], call["field_name"], call["field_schema"]) for call in calls}
+        for collection_name in (self.service.collection_name, self.service.collection_for(self.model)):
+            assert {
+                (collection_name, "filename", PayloadSchemaType.KEYWORD),
+                (collection_name, "file_id", PayloadSchemaType.INTEGER),
+                (collection_name, "embedding_model", PayloadSchemaType.KEYWORD),
+                (collection_name, "chunking_method", PayloadSchemaType.KEYWORD),
+            } <= indexed
+
+    @pytest.mark.asyncio
+    async def test_upserts_in_parallel_chunks(self, monkeypatch):
+        monkeypatch.setattr(settings, "QDRANT_UPSERT_BATCH_SIZE", 3)
+        calls = []
+        monkeypatch.setattr(self.store.client, "upsert", recording(calls, self.store.client.upsert))
+        await self.service.initialize()
+        chunks = [f"chunk {i}" for i in range(10)]
+        embeddings = [[1.0, float(i)] for i in range(10)]
+
+        ids = await self.service.store_embeddings(embeddings, chunks, "a.txt", ChunkingMethod.CUSTOM, self.model)
+
+        assert sorted(len(call["points"]) for call in calls) == [1, 3, 3, 3]
+        assert await self.store.count(self.service.collection_for(self.model)) == 10
+        assert await self.service.find_existing_ids(ids, self.model) == set(ids)
+
+    @pytest.mark.asyncio
+    async def test_owners_are_set_in_batched_payload_updates(self, monkeypatch):
+        monkeypatch.setattr(settings, "QDRANT_UPSERT_BATCH_SIZE", 2)
+        calls = []
+        monkeypatch.setattr(
+            self.store.client, "batch_update_points", recording(calls, self.store.client.batch_update_points)
+        )
+        await self.service.initialize()
+        first = await self.service.store_embeddings(
+            [[1.0, 0.0], [0.0, 1.0]], ["shared", "only first"], "a.txt", ChunkingMethod.CUSTOM, self.model
+        )
+        second = await self.service.store_embeddings(
+            [None, [0.6, 0.8]], ["shared", "only second"], "b.txt", ChunkingMethod.CUSTOM, self.model
+        )
+        calls.clear()
+
+        await self.service.assign_files([
+            (first, 1, "a.txt", ChunkingMethod.CUSTOM, None),
+            (second, 2, "b.txt", ChunkingMethod.RECURSIVE, None),
+        ], self.model)
+
+        assert [len(call["update_operations"]) for call in calls] == [2, 1]
+        payloads = await self.store.retrieve_payloads(self.service.collection_for(self.model), first + second)
+        assert payloads[first[0]]["file_id"] == [1, 2]
+        assert payloads[first[0]]["chunking_method"] == ["custom", "recursive"]
+        assert payloads[first[1]]["filename"] == ["a.txt"]
+        assert payloads[second[1]]["file_names"] == {"2": "b.txt"}
+
+        await self.store.set_payload(self.service.collection_for(self.model), [second[1]], {"file_id": [3]})
+        assert (await self.store.retrieve_payloads(self.service.collection_for(self.model), [second[1]]))[
+            second[1]
+        ]["file_id"] == [3]
+
+    @pytest.mark.asyncio
+    async def test_filters_match_any_owner(self):
+        await self.service.initialize()
+        first = await self.service.store_embeddings(
+            [[1.0, 0.0], [0.0, 1.0]], ["shared", "only first"], "a.txt", ChunkingMethod.CUSTOM, self.model
+        )
+        second = await self.service.store_embeddings(
+            [None, [0.6, 0.8]], ["shared", "only second"], "b.txt", ChunkingMethod.CUSTOM, self.model
+        )
+        third = await self.service.store_embeddings(
+            [[-1.0, 0.0]], ["only third"], "c.txt", ChunkingMethod.CUSTOM, self.model
+        )
+        await self.service.assign_file(first, 1, "a.txt", self.model, ChunkingMethod.CUSTOM)
+        await self.service.assign_file(second, 2, "b.txt", self.model, ChunkingMethod.CUSTOM)
+        await self.service.assign_file(third, 3, "c.txt", self.model, ChunkingMethod.CUSTOM)
+
+        hits = await self.service.search_similar([1.0, 0.0], self.model, limit=5, filters={"file_id": [2, 3]})
+        assert [hit["text"] for hit in hits] == ["shared", "only second", "only third"]
+        assert hits[0]["locations"] == [{"file_id": 2, "filename": "b.txt", "chunk_index": 0}]
+        hits = await self.service.search_similar([1.0, 0.0], self.model, limit=5, filters={"filename": "a.txt"})
+        assert [hit["text"] for hit in hits] == ["shared", "only first"]
+        hits = await self.service.search_similar(
+            [1.0, 0.0], self.model, limit=5, filters={"filename": ["a.txt"], "file_id": 2}
+        )
+        assert [hit["text"] for hit in hits] == ["shared"]
+
+    @pytest.mark.asyncio
+    async def test_batch_search_sends_one_request_per_collection(self, monkeypatch):
+        calls = []
+        monkeypatch.setattr(
+            self.store.client, "query_batch_points", recording(calls, self.store.client.query_batch_points)
+        )
+        await self.service.initialize()
+        await self.service.store_embeddings(
+            [[1.0, 0.0], [0.0, 1.0]], ["east", "north"], "a.txt", ChunkingMethod.CUSTOM, self.model
+        )
+        await self.service.store_embeddings(
+            [[1.0, 0.0, 0.0], [0.0, 0.0, 1.0]], ["east", "up"], "a.txt", ChunkingMethod.CUSTOM, EmbeddingModel.OPENAI
+        )
+
+        [east, north] = await self.service.search_batch(
+            [[1.0, 0.1], [0.1, 1.0]], self.model, limit=1, algorithm=SimilarityAlgorithm.EUCLIDEAN
+        )
+        assert (east[0]["text"], north[0]["text"]) == ("east", "north")
+        assert 0.0 < east[0]["score"] <= 1.0
+        assert len(calls) == 1 and len(calls[0]["requests"]) == 2
+
+        calls.clear()
+        [merged_east, merged_up] = await self.service.search_models({
+            self.model: [[1.0, 0.0], [0.0, 1.0]],
+            EmbeddingModel.OPENAI: [[1.0, 0.0, 0.0], [0.0, 0.0, 1.0]],
+        }, limit=2)
+        assert len(calls) == 2
+        assert merged_east[0]["text"] == "east"
+        # "east" is second for both models, so rank fusion puts it first
+        assert merged_up[0]["text"] == "east"
+
+    @pytest.mark.asyncio
+    async def test_store_scrolls_and_deletes(self):
+        await self.store.create_collection("docs", 2)
+        records = [VectorRecord(VectorService.chunk_point_id(str(i), self.model), [1.0, i], {"n": i}) for i in range(5)]
+        await self.store.upsert("docs", records)
+        await self.store.delete("docs", [records[0].id])
+
+        scrolled = [point async for point in self.store.scroll("docs", batch_size=2)]
+        assert sorted(payload["n"] for _, payload in scrolled) == [1, 2, 3, 4]
+        assert await self.store.retrieve_ids("docs", [records[0].id, records[1].id]) == {records[1].id}
@@ -0,0 +1,139 @@
+import asyncio
+import pytest
+from langchain_core.language_models import FakeListChatModel
+from config.settings import settings
+from schemas import ChunkingMethod, EmbeddingModel, LLMModel, QueryMode, SearchMode
+from services.local_vector_store import LocalVectorStore
+from services.rag_service import RAGService, choose_query_mode, _query_context
+from services.vector_service import VectorService
+
+MODEL = EmbeddingModel.SENTENCE_TRANSFORMER
+SEARCH = "Thought: I should look this up\nAction: document_search\nAction Input: skills"
+ANSWER = "Thought: I now know the final answer\nFinal Answer: {}"
+
+
+class FakeEmbeddingService:
+    """Every query embeds to the same vector, after a pause that lets
+    concurrent queries interleave."""
+
+    async def generate_embeddings(self, texts, model):
+        await asyncio.sleep(0.01)
+        return [[1.0, 0.0] for _ in texts]
+
+
+class TestRAGService:
+    async def make_service(self, monkeypatch, responses):
+        monkeypatch.setattr(settings, "ANSWER_CACHE_ENABLED", False)
+        self.created = []
+
+        def create_llm(llm_model):
+            self.created.append(llm_model)
+            return FakeListChatModel(responses=responses[llm_model])
+
+        monkeypatch.setattr(RAGService, "_create_llm", staticmethod(create_llm))
+        vector_service = VectorService(LocalVectorStore())
+        await vector_service.initialize()
+        for file_id, (filename, text) in enumerate([("a.txt", "python"), ("b.txt", "rust"), ("c.txt", "go")], 1):
+            ids = await vector_service.store_embeddings(
+                [[1.0, 0.1 * file_id]], [text], filename, ChunkingMethod.CUSTOM, MODEL
+            )
+            await vector_service.assign_file(ids, file_id, filename, MODEL, ChunkingMethod.CUSTOM)
+        return RAGService(vector_service, FakeEmbeddingService())
+
+    @pytest.mark.asyncio
+    async def test_concurrent_queries_keep_their_own_context(self, monkeypatch):
+        models = list(LLMModel)
+        rag = await self.make_service(
+            monkeypatch, {model: [SEARCH, ANSWER.format(model.value)] for model in models}
+        )
+
+        results = await asyncio.gather(*(
+            rag.process_query("skills?", use_memory=False, llm_model=model, filters={"file_id": file_id})
+            for file_id, model in enumerate(models, 1)
+        ))
+
+        assert [result["answer"] for result in results] == [model.value for model in models]
+        assert [result["sources"] for result in results] == [
+            ["a.txt (chunk 0)"], ["b.txt (chunk 0)"], ["c.txt (chunk 0)"]
+        ]
+        assert len({result["session_id"] for result in results}) == 3
+        assert _query_context.get() is None
+
+    def test_choose_query_mode(self):
+        assert choose_query_mode("What does the CV say about Python?") == QueryMode.DIRECT
+        assert choose_query_mode("What is the total experience across both CVs?") == QueryMode.AGENT
+        assert choose_query_mode("What did you say earlier about Rust?") == QueryMode.AGENT
+        assert choose_query_mode("Who knows Go? Who knows Rust?") == QueryMode.AGENT
+        assert choose_query_mode("Is 3 * 4 in the document") == QueryMode.AGENT
+        assert choose_query_mode(" ".join(["word"] * 41)) == QueryMode.AGENT
+
+    @pytest.mark.asyncio
+    async def test_direct_mode_answers_with_one_llm_call(self, monkeypatch):
+        model = LLMModel.GEMINI_FLASH_LARGE
+        rag = await self.make_service(monkeypatch, {model: ["Rust, per b.txt"]})
+
+        result = await rag.process_query(
+            "Who knows Rust?", use_memory=False, search_mode=SearchMode.LEXICAL, mode=QueryMode.AUTO
+        )
+
+        assert result["answer"] == "Rust, per b.txt"
+        assert result["sources"] == ["b.txt (chunk 0)"]
+        assert model not in rag._agents
+
+    @pytest.mark.asyncio
+    async def test_direct_mode_falls_back_to_agent_when_retrieval_fails(self, monkeypatch):
+        model = LLMModel.GEMINI_FLASH_LARGE
+        rag = await self.make_service(monkeypatch, {model: [ANSWER.format("from the agent")]})
+
+        async def fail(*args, **kwargs):
+            raise ConnectionError("vector store down")
+
+        monkeypatch.setattr(rag.vector_service, "search_models", fail)
+        result = await rag.process_query("Who knows Rust?", use_memory=False, mode=QueryMode.DIRECT)
+
+        assert result["answer"] == "from the agent"
+        assert result["sources"] == []
+
+    @pytest.mark.asyncio
+    async def test_stream_events_arrive_in_order(self, monkeypatch):
+        model = LLMModel.GEMINI_FLASH_LARGE
+        rag = await self.make_service(monkeypatch, {model: [SEARCH, ANSWER.format("python and go")]})
+
+        events = [
+            (event, data)
+            async for event, data in rag.stream_query("skills?", use_memory=False, filters={"file_id": [1, 3]})
+        ]
+
+        kinds = [event for event, _ in events]
+        assert kinds[:2] == ["tool", "sources"]
+        assert set(kinds[2:-1]) == {"token"} and kinds[-1] == "answer"
+        assert events[0][1] == {"tool": "document_search", "input": "skills"}
+        assert events[1][1] == {"sources": ["a.txt (chunk 0)", "c.txt (chunk 0)"]}
+        assert "".join(data["text"] for event, data in events if event == "token") == "python and go"
+        assert events[-1][1]["answer"] == "python and go"
+        assert events[-1][1]["sources"] == ["a.txt (chunk 0)", "c.txt (chunk 0)"]
+
+    @pytest.mark.asyncio
+    async def test_direct_stream_sends_sources_before_tokens(self, monkeypatch):
+        model = LLMModel.GEMINI_FLASH_LARGE
+        rag = await self.make_service(monkeypatch, {model: ["Go"]})
+
+        events = [
+            event
+            async for event, _ in rag.stream_query("Who knows Go?", use_memory=False, mode=QueryMode.DIRECT)
+        ]
+
+        assert events == ["sources", "token", "token", "answer"]
+
+    @pytest.mark.asyncio
+    async def test_agents_are_built_once_per_model(self, monkeypatch):
+        rag = await self.make_service(monkeypatch, {model: [ANSWER.format("ok")] for model in LLMModel})
+
+        agent = rag._get_agent(LLMModel.GEMINI_FLASH_LARGE)
+        await rag.process_query("hello", use_memory=False, llm_model=LLMModel.GEMINI_FLASH_LARGE)
+        await rag.process_query("hello again", use_memory=False, llm_model=LLMModel.GEMINI_FLASH_LARGE)
+        other = rag._get_agent(LLMModel.GEMINI_FLASH_SMALL)
+
+        assert rag._get_agent(LLMModel.GEMINI_FLASH_LARGE) is agent
+        assert other is not agent
+        assert self.created == [LLMModel.GEMINI_FLASH_LARGE, LLMModel.GEMINI_FLASH_SMALL]
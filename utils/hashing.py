@@ -0,0 +1,10 @@
+import hashlib
+
+def content_hash(content: bytes) -> str:
+    """SHA-256 hex digest of raw file content."""
+    return hashlib.sha256(content).hexdigest()
+
+def chunk_hash(text: str) -> str:
+    """SHA-256 hex digest of a chunk with whitespace normalized, so chunks that
+    differ only in line breaks or indentation hash the same."""
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()